@@ -0,0 +1,28 @@
+"""
+Benchmarks of the covidplots pipeline on synthetic data (see synthetic).
+
+Each bench_* module compares one optimisation with the code it replaced;
+suite runs the data and plotting paths of a refresh at several scales and
+stores the results. Run them as modules from the repository root:
+
+> python -m benchmarks.suite /tmp/bench
+"""
+
+import os
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def child_env():
+    """
+    Environment for benchmark cases run in a fresh interpreter from another
+    directory: the package and the plotting scripts (imported as top level
+    modules, e.g. import grid_plots) are importable.
+    Returns:
+        env (dict): Environment variables.
+    """
+    env = dict(os.environ)
+    paths = [REPO_DIR, os.path.join(REPO_DIR, "covidplots")]
+    if env.get("PYTHONPATH"):
+        paths.append(env["PYTHONPATH"])
+    env["PYTHONPATH"] = os.pathsep.join(paths)
+    return env
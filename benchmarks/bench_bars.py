@@ -0,0 +1,108 @@
+"""
+Benchmark the daily bar renderers of bars.daily_bars: time to draw a grid
+of panels and save it, and the size of the saved file.
+
+The input is a grid_plot-like figure of synthetic daily counts, one panel
+per region (56 panels for the US states and territories) over 1143 days,
+saved as PDF (as grid_plots does) and as PNG at 200 dpi (as
+plot_by_region does). PNG output of each renderer is also compared pixel
+by pixel with that of ax.bar.
+
+Usage, from the repository root:
+> python -m benchmarks.bench_bars /tmp/bench_bars --repeat 3
+"""
+
+import argparse
+import os
+import time
+
+import matplotlib
+matplotlib.use('agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from covidplots import bars
+from benchmarks.synthetic import cumulative_series
+
+def make_daily(n_regions=56, n_days=1143, seed=0):
+    """
+    Daily new counts of a set of regions.
+    Args:
+        n_regions (int): Number of regions.
+        n_days (int): Number of days.
+        seed (int): Random seed.
+    Returns:
+        daily (:obj:`pandas.DataFrame`): One row per date, one column per region.
+    """
+    rng = np.random.default_rng(seed)
+    scale = rng.lognormal(5, 1.5, size=n_regions)
+    cumulative = cumulative_series(n_regions, n_days, scale, rng).T
+    dates = pd.date_range("2020-01-22", periods=n_days)
+    return pd.DataFrame(cumulative, index=dates).diff()
+
+def render(daily, renderer, filename, dpi=100):
+    """
+    Draw one panel per region and save the figure.
+    Args:
+        daily (:obj:`pandas.DataFrame`): Daily counts.
+        renderer (str): One of bars.RENDERERS.
+        filename (str): Output file, its extension sets the format.
+        dpi (int): Resolution of raster output.
+    Returns:
+        seconds (float): Time to draw and save.
+    """
+    t0 = time.perf_counter()
+    ncols = 8
+    nrows = -(-daily.shape[1] // ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(4 * ncols, 3 * nrows))
+    avg = daily.rolling(7, center=True).mean()
+    for col, ax in zip(daily.columns, axes.flatten()):
+        bars.daily_bars(ax, daily.index, daily[col], renderer=renderer,
+                        color="#e5aabc", zorder=5)
+        ax.plot(avg[col], c="crimson", lw=1, zorder=10)
+    fig.savefig(filename, dpi=dpi)
+    plt.close(fig)
+    return time.perf_counter() - t0
+
+def main(outdir, repeat=3, n_regions=56, n_days=1143):
+    os.makedirs(outdir, exist_ok=True)
+    daily = make_daily(n_regions, n_days)
+    print(f"{n_regions} panels x {n_days} days")
+    print(f"{'renderer':9s} {'format':6s} {'time':>8s} {'speedup':>8s} {'size':>10s} {'pixels differing':>17s}")
+    results = []
+    for fmt, dpi in [("pdf", 100), ("png", 200)]:
+        reference = None
+        for renderer in bars.RENDERERS:
+            filename = os.path.join(outdir, f"bars_{renderer}.{fmt}")
+            seconds = min(render(daily, renderer, filename, dpi) for i in range(repeat))
+            size = os.path.getsize(filename)
+            if renderer == "bar":
+                reference = seconds
+            differing = float("nan")
+            if fmt == "png":
+                image = plt.imread(filename)
+                if renderer == "bar":
+                    bar_image = image
+                else:
+                    # Share of pixels where any channel differs by more than 3/255
+                    differing = (np.abs(image - bar_image).max(axis=2) > 3 / 255).mean()
+            shown = "-" if np.isnan(differing) else f"{differing:.2%}"
+            print(f"{renderer:9s} {fmt:6s} {seconds:7.2f}s {reference/seconds:7.1f}x"
+                  f" {size/1e6:8.2f}MB {shown:>17s}")
+            results.append({"renderer": renderer, "format": fmt, "seconds": seconds,
+                            "bytes": size, "differing": differing})
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest="outdir",
+                        help="Directory to save figures to")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of runs per renderer, the fastest is reported")
+    parser.add_argument("--regions", type=int, default=56,
+                        help="Number of panels")
+    parser.add_argument("--days", type=int, default=1143,
+                        help="Number of days")
+    args = parser.parse_args()
+    main(args.outdir, args.repeat, args.regions, args.days)
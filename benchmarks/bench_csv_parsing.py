@@ -0,0 +1,84 @@
+"""
+Benchmark parsing of the JHU and OWID CSV files.
+
+Each case runs in a fresh interpreter, so that peak RSS is not polluted by
+earlier cases, with the parsed frame cache and incremental ingest turned
+off so that every run parses the whole file.
+
+Usage, from the repository root:
+> python -m benchmarks.bench_csv_parsing /tmp/bench --repeat 3
+
+The working directory is filled with synthetic data (see synthetic.py) if
+it does not contain any yet.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks import child_env
+from benchmarks.synthetic import make_workdir
+
+CASES = {"jhu-usa": ("read_data", "time_series_covid19_confirmed_US.csv", "usa"),
+         "jhu-world": ("read_data", "time_series_covid19_confirmed_global.csv", "world"),
+         "owid-usa": ("read_vaccine_data", "us_state_vaccinations.csv", "usa"),
+         "owid-world": ("read_vaccine_data", "vaccinations.csv", "world")}
+
+# Run in the child process: baseline RSS after imports, then one parse
+CHILD = """
+import json, resource, sys, time
+from covidplots import get_data
+reader, filename, region = sys.argv[1:4]
+kwargs = {"cache": False}
+if reader == "read_data":
+    kwargs["incremental"] = False
+base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+t0 = time.perf_counter()
+data, pops = getattr(get_data, reader)("covid_data/" + filename, region, **kwargs)
+elapsed = time.perf_counter() - t0
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "peak_mb": peak / 1024.,
+                  "delta_mb": (peak - base) / 1024., "shape": list(data.shape)}))
+"""
+
+def run_case(workdir, reader, filename, region):
+    """
+    Parse one file in a child process.
+    Args:
+        workdir (str): Directory containing covid_data/ and geo_pop_data/.
+        reader (str): Name of the get_data function to call.
+        filename (str): Name of the CSV file in covid_data/.
+        region (str): Region family, 'usa' or 'world'.
+    Returns:
+        result (dict): Parse time, peak RSS and RSS growth during the parse.
+    """
+    out = subprocess.run([sys.executable, "-c", CHILD, reader, filename, region],
+                         cwd=workdir, env=child_env(), check=True, capture_output=True,
+                         text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main(workdir, repeat=3):
+    if not os.path.exists(os.path.join(workdir, "covid_data")):
+        make_workdir(workdir)
+    print(f"{'case':<12} {'seconds':>8} {'peak MB':>8} {'delta MB':>9}  shape")
+    results = {}
+    for name, (reader, filename, region) in CASES.items():
+        runs = [run_case(workdir, reader, filename, region) for i in range(repeat)]
+        best = min(runs, key=lambda r: r["seconds"])
+        best["delta_mb"] = min(r["delta_mb"] for r in runs)
+        best["peak_mb"] = min(r["peak_mb"] for r in runs)
+        results[name] = best
+        print(f"{name:<12} {best['seconds']:8.3f} {best['peak_mb']:8.1f} "
+              f"{best['delta_mb']:9.1f}  {tuple(best['shape'])}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest="workdir",
+                        help="Directory with (or for) synthetic data")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of runs per case, the fastest is reported")
+    args = parser.parse_args()
+    main(args.workdir, args.repeat)
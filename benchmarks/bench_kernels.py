@@ -0,0 +1,109 @@
+"""
+Benchmark the kernels module against the pandas methods it replaces, and
+check that both give the same numbers.
+
+The input is a synthetic matrix the size of the JHU US county file (3340
+counties over 1143 days) of daily new counts, once as integers (as in
+new_cases) and once per 100,000 people (as in new_cases_per100k), with
+the first weeks of some counties missing.
+
+Usage, from the repository root:
+> python -m benchmarks.bench_kernels --repeat 5
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from covidplots import kernels
+from benchmarks.synthetic import cumulative_series
+
+def weekday_adjusted_pandas(df, window=7):
+    """ Reference weekday adjustment written with pandas groupby. """
+    ratios = df / df.rolling(window, center=True).mean()
+    ratios = ratios.replace([np.inf, -np.inf], np.nan)
+    factors = ratios.groupby(df.index.weekday).mean()
+    factors = factors.reindex(range(7))
+    factors = factors / factors.mean()
+    factors = factors.where(np.isfinite(factors) & (factors > 0), 1.)
+    return df / factors.loc[df.index.weekday].to_numpy()
+
+CASES = [
+    ("7d trailing, min_periods=2",
+     lambda df: df.rolling(7, min_periods=2).mean(),
+     lambda df: kernels.rolling_mean(df, 7, min_periods=2)),
+    ("7d centred, min_periods=2",
+     lambda df: df.rolling(7, center=True, min_periods=2).mean(),
+     lambda df: kernels.rolling_mean(df, 7, center=True, min_periods=2)),
+    ("28d trailing",
+     lambda df: df.rolling(28).mean(),
+     lambda df: kernels.rolling_mean(df, 28)),
+    ("EWMA span 7",
+     lambda df: df.ewm(span=7).mean(),
+     lambda df: kernels.ewma(df, span=7)),
+    ("weekday adjusted",
+     weekday_adjusted_pandas,
+     lambda df: kernels.weekday_adjusted(df, df.index)),
+]
+
+def make_matrix(n_counties=3340, n_days=1143, seed=0):
+    """
+    Daily new counts of a US-county-sized dataset.
+    Args:
+        n_counties (int): Number of regions.
+        n_days (int): Number of days.
+        seed (int): Random seed.
+    Returns:
+        counts (:obj:`pandas.DataFrame`): Integer daily counts, one row per date.
+        per_capita (:obj:`pandas.DataFrame`): The same per 100,000 people.
+    """
+    rng = np.random.default_rng(seed)
+    scale = rng.lognormal(1, 1.5, size=n_counties)
+    cumulative = cumulative_series(n_counties, n_days, scale, rng).T
+    dates = pd.date_range("2020-01-22", periods=n_days)
+    counts = pd.DataFrame(cumulative, index=dates).diff()
+    late = rng.integers(0, n_counties, size=n_counties // 10)
+    counts.iloc[:30, late] = np.nan
+    pops = rng.lognormal(10, 1.2, size=n_counties)
+    return counts, counts / pops * 100000
+
+def best_time(func, data, repeat):
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        result = func(data)
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+def main(repeat=5, n_counties=3340, n_days=1143):
+    counts, per_capita = make_matrix(n_counties, n_days)
+    print(f"{n_days} dates x {n_counties} regions")
+    print(f"{'kernel':28s} {'data':10s} {'pandas':>9s} {'kernels':>9s} {'speedup':>8s} {'max diff':>9s}")
+    results = []
+    for label, ref, new in CASES:
+        for dname, df in [("counts", counts), ("per100k", per_capita)]:
+            t_ref, expected = best_time(ref, df, repeat)
+            t_new, got = best_time(new, df, repeat)
+            np.testing.assert_array_equal(np.isnan(expected.to_numpy()),
+                                          np.isnan(got.to_numpy()))
+            np.testing.assert_allclose(got.to_numpy(), expected.to_numpy(),
+                                       rtol=1e-9, atol=1e-9)
+            diff = np.nanmax(np.abs(got.to_numpy() - expected.to_numpy()))
+            print(f"{label:28s} {dname:10s} {t_ref*1000:7.1f}ms {t_new*1000:7.1f}ms"
+                  f" {t_ref/t_new:7.1f}x {diff:9.1e}")
+            results.append({"kernel": label, "data": dname, "pandas": t_ref,
+                            "kernels": t_new, "max_diff": diff})
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of runs per implementation, the fastest is reported")
+    parser.add_argument("--counties", type=int, default=3340,
+                        help="Number of regions")
+    parser.add_argument("--days", type=int, default=1143,
+                        help="Number of days")
+    args = parser.parse_args()
+    main(args.repeat, args.counties, args.days)
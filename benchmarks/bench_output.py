@@ -0,0 +1,74 @@
+"""
+Compare output profiles: file size and write time of the same figure saved
+as before (vector PDF, 200 dpi PNG) and with each profile of output.py.
+
+The figure is a grid_plot-like grid of synthetic daily counts, 50 panels
+over 1143 days, drawn with the default bar renderer.
+
+Usage, from the repository root:
+> python -m benchmarks.bench_output /tmp/bench_output
+"""
+
+import argparse
+import os
+
+import matplotlib
+matplotlib.use('agg')
+import matplotlib.pyplot as plt
+
+from covidplots import bars, output
+from benchmarks.bench_bars import make_daily
+
+def make_figure(n_regions=50, n_days=1143):
+    """
+    Grid of daily bars and 7 day averages, one panel per region.
+    Args:
+        n_regions (int): Number of panels.
+        n_days (int): Number of days.
+    Returns:
+        fig (:obj:`matplotlib.figure.Figure`): Figure.
+    """
+    daily = make_daily(n_regions, n_days)
+    avg = daily.rolling(7, center=True).mean()
+    ncols = 10
+    nrows = -(-n_regions // ncols)
+    fig, axes = plt.subplots(nrows, ncols, figsize=(20, 9), sharex=True)
+    fig.subplots_adjust(wspace=0.35, hspace=0.35)
+    for col, ax in zip(daily.columns, axes.flatten()):
+        bars.daily_bars(ax, daily.index, daily[col], color="#e5aabc", zorder=5)
+        ax.plot(avg[col], c="crimson", lw=0.75, zorder=10)
+        ax.set_title(f"Region {col}", size="x-small")
+        ax.tick_params(labelsize="xx-small")
+    fig.suptitle("New daily cases")
+    return fig
+
+def main(outdir, n_regions=50, n_days=1143):
+    os.makedirs(outdir, exist_ok=True)
+    fig = make_figure(n_regions, n_days)
+    print(f"{n_regions} panels x {n_days} days")
+    runs = [("none", "grid.pdf", {}), ("none", "grid.png", {"dpi": 200})]
+    runs += [(name, "grid", {}) for name in output.PROFILES]
+    results = []
+    for profile, filename, kwargs in runs:
+        report = output.save_figure(fig, os.path.join(outdir, f"{profile}_{filename}"),
+                                    None if profile == "none" else profile,
+                                    bbox_inches="tight", **kwargs)
+        report["profile"] = profile
+        results.append(report)
+    print(f"\n{'profile':10s} {'format':6s} {'dpi':>4s} {'size':>9s} {'time':>7s} {'tries':>5s}")
+    for r in results:
+        print(f"{r['profile']:10s} {r['format']:6s} {r['dpi']:4.0f} {r['bytes']/1e3:7,.0f}kB"
+              f" {r['seconds']:6.1f}s {r['tries']:5d}")
+    plt.close(fig)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest="outdir",
+                        help="Directory to save figures to")
+    parser.add_argument("--regions", type=int, default=50,
+                        help="Number of panels")
+    parser.add_argument("--days", type=int, default=1143,
+                        help="Number of days")
+    args = parser.parse_args()
+    main(args.outdir, args.regions, args.days)
@@ -0,0 +1,96 @@
+"""
+Benchmark the layout of multi-colored labels (grid_plots.rainbow_text):
+drawing each word to measure it, as before, against measuring it from the
+cached font metrics of textlayout.text_extent.
+
+The figure is the 50-state grid of grid_plot: 5 x 10 panels, each with a
+"Last: value / average" label of four words, plus the figure legend. Both
+layouts must put every word at the same position.
+
+Usage, from the repository root:
+> python -m benchmarks.bench_rainbow_text --repeat 5
+"""
+
+import argparse
+import time
+
+import matplotlib
+matplotlib.use('agg')
+import matplotlib.pyplot as plt
+import numpy as np
+
+from covidplots import textlayout
+
+COLORS = ["black", "lightcoral", "black", "crimson"]
+WEIGHTS = ["normal", "normal", "normal", "bold"]
+
+def place_words_drawn(texts, x, y, t):
+    """ The previous layout: draw each word, then ask for its extent. """
+    renderer = texts[0].figure.canvas.get_renderer()
+    for text in texts:
+        text.set_position((x, y))
+        text.draw(renderer)
+        x = text.get_window_extent().transformed(t.inverted()).x1
+
+def place_words_cached(texts, x, y, t):
+    """ The current layout of grid_plots.place_words. """
+    for text in texts:
+        text.set_position((x, y))
+        x = textlayout.text_extent(text).transformed(t.inverted()).x1
+
+def label_grid(place, seed=0):
+    """
+    Label every panel of a 50-state grid.
+    Args:
+        place (function): Layout function.
+        seed (int): Random seed of the label values.
+    Returns:
+        seconds (float): Time to lay out all labels.
+        positions (:obj:`numpy.ndarray`): x position of every word.
+    """
+    rng = np.random.default_rng(seed)
+    fig, axes = plt.subplots(5, 10, figsize=(20, 9), sharex=True)
+    fig.subplots_adjust(wspace=0.35, hspace=0.35)
+    labels = []
+    for ax in axes.flatten():
+        last, avg = rng.integers(0, 50000, size=2)
+        words = ["Last: ", f"{last:,}", "/", f"{avg:,}"]
+        labels.append(([ax.text(0, 0, word, color=c, weight=w, size="x-small",
+                                transform=ax.transAxes)
+                        for word, c, w in zip(words, COLORS, WEIGHTS)], ax.transAxes))
+    words = ["Last: ", "value", "/", "7 day average"]
+    labels.append(([fig.text(0, 0, word, color=c, weight=w, size="x-large")
+                    for word, c, w in zip(words, COLORS, WEIGHTS)], fig.transFigure))
+
+    t0 = time.perf_counter()
+    for texts, t in labels:
+        place(texts, 0.035, .9, t)
+    seconds = time.perf_counter() - t0
+    positions = np.array([text.get_position()[0] for texts, t in labels for text in texts])
+    plt.close(fig)
+    return seconds, positions
+
+def main(repeat=5):
+    print(f"{'layout':10s} {'first':>9s} {'best':>9s}")
+    results = []
+    for label, place in [("drawn", place_words_drawn), ("cached", place_words_cached)]:
+        times = []
+        for i in range(repeat):
+            seconds, positions = label_grid(place)
+            times.append(seconds)
+        if label == "drawn":
+            expected = positions
+        else:
+            np.testing.assert_allclose(positions, expected, rtol=0, atol=1e-12)
+        print(f"{label:10s} {times[0]*1000:7.1f}ms {min(times)*1000:7.1f}ms")
+        results.append({"layout": label, "first": times[0], "best": min(times)})
+    print(f"speedup {results[0]['best']/results[1]['best']:.1f}x, "
+          f"metrics cache {textlayout.metrics_stats()}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of runs per layout, the fastest is reported")
+    args = parser.parse_args()
+    main(args.repeat)
@@ -0,0 +1,85 @@
+"""
+Benchmark get_data.vax_by_region against the pivot-based implementation
+it replaced.
+
+The input is a synthetic OWID vaccinations.csv lookalike of the same order
+of size as the real global file (~190 locations over ~820 days, each
+reporting on ~60% of days, i.e. ~90k rows after dropping aggregates).
+
+Usage, from the repository root:
+> python -m benchmarks.bench_vax_pivot /tmp/bench --repeat 5
+"""
+
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from covidplots import get_data
+from benchmarks.synthetic import make_workdir
+
+def vax_by_region_pivot(data):
+    """ The previous implementation: two copies, two pivots, two fills. """
+    partial = data[['date', 'location', 'people_vaccinated']].copy()
+    fully = data[['date', 'location', 'people_fully_vaccinated']].copy()
+    fully = fully.pivot(index='date',
+        columns=[x for x in fully.columns if x not in ['date', 'people_fully_vaccinated']],
+        values='people_fully_vaccinated').reset_index()
+    partial = partial.pivot(index='date',
+        columns=[x for x in partial.columns if x not in ['date', 'people_vaccinated']],
+        values='people_vaccinated').reset_index()
+    partial.set_index('date', inplace=True)
+    fully.set_index('date', inplace=True)
+    partial = partial.fillna(method='ffill')
+    partial = partial.fillna(0)
+    fully = fully.fillna(method='ffill')
+    fully = fully.fillna(0)
+    return partial, fully
+
+def best_time(func, data, repeat):
+    """
+    Time a function.
+    Args:
+        func (function): Function to call on data.
+        data (:obj:`pandas.DataFrame`): Argument of func.
+        repeat (int): Number of calls.
+    Returns:
+        seconds (float): Fastest call.
+        result: Result of the last call.
+    """
+    times = []
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        result = func(data)
+        times.append(time.perf_counter() - t0)
+    return min(times), result
+
+def main(workdir, repeat=5):
+    if not os.path.exists(os.path.join(workdir, "covid_data")):
+        make_workdir(workdir)
+    filename = os.path.join(workdir, "covid_data", "vaccinations.csv")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        data, pops = get_data.read_vaccine_data(filename, "world", cache=False)
+    finally:
+        os.chdir(cwd)
+
+    t_old, (partial_old, fully_old) = best_time(vax_by_region_pivot, data, repeat)
+    t_new, (partial_new, fully_new) = best_time(get_data.vax_by_region, data, repeat)
+    pd.testing.assert_frame_equal(partial_old, partial_new)
+    pd.testing.assert_frame_equal(fully_old, fully_new)
+    print(f"{len(data):,} rows -> {fully_new.shape[0]} dates x {fully_new.shape[1]} locations")
+    print(f"pivot      {t_old*1000:8.1f} ms")
+    print(f"vectorised {t_new*1000:8.1f} ms  ({t_old/t_new:.1f}x)")
+    return {"rows": len(data), "pivot": t_old, "vectorised": t_new}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest="workdir",
+                        help="Directory with (or for) synthetic data")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Number of runs per implementation, the fastest is reported")
+    args = parser.parse_args()
+    main(args.workdir, args.repeat)
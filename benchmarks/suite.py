@@ -0,0 +1,314 @@
+"""
+Benchmark suite: the data and plotting paths of a refresh, on synthetic
+data at production and stress scales.
+
+Scales (see synthetic.SCALES):
+    production  today's files: 3340 counties, ~200 countries, 1143 days
+    regions     10x counties, countries and OWID locations
+    days        10x days
+
+Cases (see CASES), each run in a fresh interpreter so that peak RSS is its
+own, with the parsed frame cache and incremental ingest turned off:
+    read_data_usa, read_data_world   parse a JHU file
+    vax_by_region                    pivot the OWID global file
+    grid_plot_usa                    all states grid (as PDF)
+    grid_plot_worst_global           ranking all countries, 9 panels
+    overlaid_plots                   the 8 overlaid plots of the US
+    county_movies                    county_movies.prepare_data
+    bokeh_usa, bokeh_world           session start of the interactive
+                                     apps, then make_data_src
+
+Every case reports seconds, records processed per second (one record per
+date and region, see profiling.records), peak RSS and its growth over the
+RSS after imports and setup. Cases whose dependencies (geopandas, bokeh,
+the county shapefile) are missing are reported as skipped. The synthetic
+county FIPS codes are not those of the shapefile, so county_movies maps
+fewer counties than in production.
+
+Each run is stored as results/<time>-<commit>.json, with the versions of
+the libraries used, and can be compared with an earlier one.
+
+Usage, from the repository root:
+> python -m benchmarks.suite /tmp/bench --scales production days
+> python -m benchmarks.suite /tmp/bench --compare benchmarks/results/<run>.json
+
+Synthetic data is written to /tmp/bench/<scale> on first use.
+"""
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import matplotlib
+import numpy as np
+import pandas as pd
+
+from benchmarks import REPO_DIR, child_env
+from benchmarks.synthetic import SCALES, scale_workdir
+from covidplots import profiling
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+PLOTS_DIR = "bench_plots"
+
+def _read(family):
+    from covidplots import get_data
+    filename = os.path.join("covid_data", get_data.data_filename(family))
+    return get_data.read_data(filename, family, cache=False, incremental=False)
+
+def _setup_read_data(family):
+    return (family,)
+
+def _run_read_data(family):
+    return profiling.records(_read(family))
+
+def _setup_vax_by_region():
+    from covidplots import get_data
+    filename = os.path.join("covid_data", get_data.data_filename("world", vax=True))
+    data, pops = get_data.read_vaccine_data(filename, "world", cache=False)
+    return (data,)
+
+def _run_vax_by_region(data):
+    from covidplots import get_data
+    get_data.vax_by_region(data)
+    return profiling.records(data)
+
+def _setup_grid_plot(region):
+    import grid_plots
+    family = "usa" if region == "usa" else "world"
+    data, pops = _read(family)
+    return (grid_plots.grid_plot, data, pops, region)
+
+def _run_grid_plot(grid_plot, data, pops, region):
+    grid_plot(data, pops, region, outdir=PLOTS_DIR)
+    return profiling.records(data)
+
+def _setup_overlaid_plots():
+    import overlaid_plots
+    data, pops = _read("usa")
+    return (overlaid_plots.overlaid_plots, data, pops)
+
+def _run_overlaid_plots(overlaid_plots, data, pops):
+    overlaid_plots("usa", data, pops, outdir=PLOTS_DIR)
+    return profiling.records(data)
+
+def _setup_county_movies():
+    from covidplots import county_movies
+    shapefile = os.path.join("geo_pop_data", "cb_2019_us_county_500k.shp")
+    if not os.path.exists(shapefile):
+        raise FileNotFoundError(f"{shapefile} not found")
+    return (county_movies.prepare_data,)
+
+def _run_county_movies(prepare_data):
+    data = prepare_data()
+    # County rows times weekly columns
+    return len(data) * (len(data.columns) - 5)
+
+def _setup_bokeh(family):
+    import bokeh.models, bokeh.plotting
+    from covidplots import datastore
+    # Make the sources fresh (contents are unchanged), so the app does not
+    # try to download them, and build the store it maps
+    for filename in datastore.source_files(family):
+        os.utime(filename)
+    datastore.open_store(family, refresh=False)
+    return (family,)
+
+def _run_bokeh(family):
+    app = importlib.import_module(f"covidplots.{family}_interactive.main")
+    records = 0
+    for key, entry in app.data_d.items():
+        data = entry["data"]
+        if family == "usa":
+            regions = app.all_regions
+            kwargs = {"dtype": key}
+        else:
+            regions = [c for c in app.all_countries if c in data][:len(app.colors_l)]
+            kwargs = {"deaths": key}
+        for percapita in [False, True]:
+            app.make_data_src(regions, percapita=percapita, **kwargs)
+        records += profiling.records(data)
+    return records
+
+# name: (setup, run), run(*setup()) returns the number of records processed
+CASES = {
+    "read_data_usa": (lambda: _setup_read_data("usa"), _run_read_data),
+    "read_data_world": (lambda: _setup_read_data("world"), _run_read_data),
+    "vax_by_region": (_setup_vax_by_region, _run_vax_by_region),
+    "grid_plot_usa": (lambda: _setup_grid_plot("usa"), _run_grid_plot),
+    "grid_plot_worst_global": (lambda: _setup_grid_plot("worst_global"), _run_grid_plot),
+    "overlaid_plots": (_setup_overlaid_plots, _run_overlaid_plots),
+    "county_movies": (_setup_county_movies, _run_county_movies),
+    "bokeh_usa": (lambda: _setup_bokeh("usa"), _run_bokeh),
+    "bokeh_world": (lambda: _setup_bokeh("world"), _run_bokeh),
+}
+
+def _max_rss_mb():
+    # ru_maxrss on Linux keeps the peak of the parent across exec, VmHWM
+    # does not
+    try:
+        with open("/proc/self/status") as f1:
+            for line in f1:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+def run_child(case):
+    """
+    Run one case in this process, from the working directory of a scale,
+    and print its result as JSON.
+    Args:
+        case (str): One of CASES.
+    """
+    setup, run = CASES[case]
+    try:
+        args = setup()
+    except (ImportError, FileNotFoundError) as e:
+        print(json.dumps({"skipped": f"{type(e).__name__}: {e}"}))
+        return
+    os.makedirs(PLOTS_DIR, exist_ok=True)
+    base = _max_rss_mb()
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    records = run(*args)
+    seconds = time.perf_counter() - t0
+    cpu = time.process_time() - c0
+    peak = _max_rss_mb()
+    print(json.dumps({"seconds": seconds, "cpu": cpu, "records": int(records),
+                      "peak_mb": peak, "delta_mb": peak - base}))
+
+def run_case(workdir, case):
+    """
+    Run one case in a child process.
+    Args:
+        workdir (str): Directory of synthetic data, see synthetic.scale_workdir.
+        case (str): One of CASES.
+    Returns:
+        result (dict): seconds, cpu, records, peak_mb and delta_mb, or
+            skipped (the reason) if the case cannot run here, or error
+            (the last line of the traceback) if it failed.
+    """
+    out = subprocess.run([sys.executable, "-m", "benchmarks.suite", ".", "--child", case],
+                         cwd=workdir, env=child_env(), capture_output=True, text=True)
+    if out.returncode != 0:
+        return {"error": (out.stderr.strip().splitlines() or ["?"])[-1]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def _commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _print_result(r):
+    if "seconds" not in r:
+        status = "skipped" if "skipped" in r else "FAILED"
+        print(f"{r['scale']:<11} {r['case']:<23} {status} ({r.get('skipped', r.get('error'))})")
+        return
+    print(f"{r['scale']:<11} {r['case']:<23} {r['seconds']:8.2f} {r['records_per_s']:12,.0f} "
+          f"{r['peak_mb']:8.0f} {r['delta_mb']:9.0f}")
+
+def compare(old, new):
+    """
+    Print how the cases of two runs compare.
+    Args:
+        old (dict): Earlier run, as stored by main.
+        new (dict): Later run.
+    Returns:
+        ratios (dict): For each (scale, case) run in both, the ratio of
+            new to old seconds and peak RSS.
+    """
+    before = {(r["scale"], r["case"]): r for r in old["results"] if "seconds" in r}
+    print(f"\nCompared with {old['started']} ({old['commit']}):")
+    print(f"{'scale':<11} {'case':<23} {'seconds':>16} {'peak MB':>14}")
+    ratios = {}
+    for r in new["results"]:
+        key = (r["scale"], r["case"])
+        if "seconds" not in r or key not in before:
+            continue
+        b = before[key]
+        ratios[key] = {"seconds": r["seconds"] / b["seconds"],
+                       "peak_mb": r["peak_mb"] / b["peak_mb"]}
+        print(f"{r['scale']:<11} {r['case']:<23} {b['seconds']:6.2f} -> {r['seconds']:6.2f} "
+              f"{b['peak_mb']:5.0f} -> {r['peak_mb']:5.0f}")
+    return ratios
+
+def main(root, scales=None, cases=None, repeat=1, results_dir=RESULTS_DIR, baseline=None):
+    """
+    Run the suite and store its results.
+    Args:
+        root (str): Directory for synthetic data, one subdirectory per scale.
+        scales (list): Names of SCALES to run, all by default.
+        cases (list): Names of CASES to run, all by default.
+        repeat (int): Number of runs per case, the fastest is reported.
+        results_dir (str): Directory to store the results in.
+        baseline (str): Results file of an earlier run to compare with.
+    Returns:
+        run (dict): Run metadata and results, as stored.
+    """
+    scales = list(SCALES) if scales is None else scales
+    cases = list(CASES) if cases is None else cases
+    started = datetime.now()
+    run = {"started": started.isoformat(timespec="seconds"), "commit": _commit(),
+           "python": platform.python_version(), "numpy": np.__version__,
+           "pandas": pd.__version__, "matplotlib": matplotlib.__version__,
+           "platform": platform.platform(), "cpus": os.cpu_count(),
+           "scales": {name: SCALES[name]._asdict() for name in scales},
+           "results": []}
+    print(f"{'scale':<11} {'case':<23} {'seconds':>8} {'records/s':>12} {'peak MB':>8} "
+          f"{'delta MB':>9}")
+    for scale in scales:
+        workdir = scale_workdir(root, scale)
+        for case in cases:
+            runs = [run_case(workdir, case) for i in range(repeat)]
+            runs = [r for r in runs if "seconds" in r] or runs[:1]
+            best = min(runs, key=lambda r: r.get("seconds", 0))
+            if "seconds" in best:
+                best["peak_mb"] = min(r["peak_mb"] for r in runs)
+                best["delta_mb"] = min(r["delta_mb"] for r in runs)
+                best["records_per_s"] = best["records"] / best["seconds"]
+            result = dict(best, scale=scale, case=case)
+            run["results"].append(result)
+            _print_result(result)
+
+    os.makedirs(results_dir, exist_ok=True)
+    filename = os.path.join(results_dir, f"{started:%Y%m%d-%H%M%S}-{run['commit']}.json")
+    with open(filename, "w") as f1:
+        json.dump(run, f1, indent=1)
+    print(f"Results written to {filename}")
+    if baseline is not None:
+        with open(baseline) as f1:
+            compare(json.load(f1), run)
+    return run
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest="root",
+                        help="Directory with (or for) synthetic data")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=None,
+                        help="Scales to run (default: all)")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=None,
+                        help="Cases to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="Number of runs per case, the fastest is reported")
+    parser.add_argument("--results-dir", default=RESULTS_DIR,
+                        help="Directory to store results in")
+    parser.add_argument("--compare", default=None, metavar="RESULTS",
+                        help="Results file of an earlier run to compare with")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child)
+    else:
+        main(args.root, args.scales, args.cases, args.repeat, args.results_dir, args.compare)
@@ -0,0 +1,333 @@
+"""
+Generate synthetic JHU- and OWID-shaped CSV files, so the data pipeline
+can be benchmarked offline.
+
+The files mimic the upstream layouts closely enough for get_data to read
+them: wide JHU time series (one column per day, "1/22/20" style headers,
+US rows per county with the usual metadata columns, global rows per
+country/province) and long OWID vaccination tables (one row per
+location and date).
+
+Files come in three scales (see SCALES): today's size, ten times as many
+regions (counties and countries), and ten times as many days.
+
+Usage, from the repository root:
+> python -m benchmarks.synthetic outdir --days 1143
+> python -m benchmarks.synthetic outdir --scale regions
+
+This creates outdir/covid_data/*.csv, ready to be read from outdir with
+geo_pop_data/ copied or linked next to it (see make_workdir).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from covidplots.continents import jhu_countries
+
+FIRST_DAY = datetime.date(2020, 1, 22)
+US_TERRITORIES = ["American Samoa", "Guam", "Northern Mariana Islands",
+                  "Puerto Rico", "Virgin Islands"]
+US_SHIPS = ["Diamond Princess", "Grand Princess"]
+# Countries JHU reports per province, and how many provinces each has
+PROVINCES = {"Australia": 8, "Canada": 16, "China": 34, "Denmark": 3,
+             "France": 12, "Netherlands": 5, "United Kingdom": 15}
+# JHU spellings that differ from the sanitized country list
+JHU_SPELLING = {"Taiwan": "Taiwan*", "South Korea": "Korea, South"}
+JHU_EXTRA = ["Diamond Princess", "MS Zaandam", "Holy See"]
+GEO_POP_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "covidplots", "geo_pop_data")
+# Size of the JHU files at the end of their updates
+N_DAYS = 1143
+N_COUNTIES = 3340
+
+# Multiples of today's number of regions (US counties, JHU countries and
+# OWID locations) and of days
+Scale = namedtuple("Scale", ["name", "regions", "days"])
+SCALES = {"production": Scale("production", 1, 1),
+          "regions": Scale("regions", 10, 1),
+          "days": Scale("days", 1, 10)}
+
+def date_labels(n_days):
+    """
+    JHU style date column headers.
+    Args:
+        n_days (int): Number of days since Jan 22 2020.
+    Returns:
+        labels (list): Headers such as "1/22/20".
+    """
+    dates = [FIRST_DAY + datetime.timedelta(days=i) for i in range(n_days)]
+    return [f"{d.month}/{d.day}/{d:%y}" for d in dates]
+
+def cumulative_series(n_rows, n_days, scale, rng, revisions=True):
+    """
+    Random cumulative counts, one row per region.
+    Args:
+        n_rows (int): Number of regions.
+        n_days (int): Number of days.
+        scale (array-like): Typical number of new counts per day per region.
+        rng (:obj:`numpy.random.Generator`): Random number generator.
+        revisions (Bool): If True, add a few downward revisions like the
+            ones found in the real files.
+    Returns:
+        counts (:obj:`numpy.ndarray`): Array of shape (n_rows, n_days).
+    """
+    t = np.arange(n_days)
+    waves = 1 + np.sin(t / 60.)[None, :] ** 2 * 4
+    daily = rng.poisson(np.outer(scale, np.ones(n_days)) * waves)
+    counts = np.cumsum(daily, axis=1)
+    if revisions is True:
+        rows = rng.integers(0, n_rows, size=max(1, n_rows // 50))
+        days = rng.integers(1, n_days, size=len(rows))
+        counts[rows, days] = counts[rows, days] // 2
+    return counts
+
+def write_jhu_us(filename, n_counties=N_COUNTIES, n_days=N_DAYS, deaths=False, seed=0):
+    """
+    Write a time_series_covid19_*_US.csv lookalike.
+    Args:
+        filename (str): Path of CSV file to write.
+        n_counties (int): Number of county rows, spread over all states,
+            territories and cruise ships.
+        n_days (int): Number of date columns.
+        deaths (Bool): If True, write the deaths layout (with Population).
+        seed (int): Random seed.
+    """
+    rng = np.random.default_rng(seed)
+    states = pd.read_csv(os.path.join(GEO_POP_DIR, "nst-pop2020.csv"))["State"].to_list()
+    states += US_TERRITORIES + US_SHIPS
+    state_i = np.sort(rng.integers(0, len(states), size=n_counties))
+    state_i[:len(states)] = np.arange(len(states))
+    state_i.sort()
+    county_i = np.zeros(n_counties, dtype=int)
+    for i in range(1, n_counties):
+        if state_i[i] == state_i[i-1]:
+            county_i[i] = county_i[i-1] + 1
+    meta = pd.DataFrame({
+        "UID": 84000000 + state_i * 1000 + county_i,
+        "iso2": "US", "iso3": "USA", "code3": 840,
+        "FIPS": (state_i * 1000 + county_i + 1000).astype(float),
+        "Admin2": [f"County {c}" for c in county_i],
+        "Province_State": [states[s] for s in state_i],
+        "Country_Region": "US",
+        "Lat": rng.uniform(20, 60, n_counties),
+        "Long_": rng.uniform(-160, -60, n_counties),
+        })
+    meta["Combined_Key"] = meta["Admin2"] + ", " + meta["Province_State"] + ", US"
+    if deaths is True:
+        meta["Population"] = rng.integers(1000, 1000000, n_counties)
+    scale = rng.uniform(0.1, 50, n_counties) / (100 if deaths else 1)
+    counts = cumulative_series(n_counties, n_days, scale, rng)
+    values = pd.DataFrame(counts, columns=date_labels(n_days))
+    pd.concat([meta, values], axis=1).to_csv(filename, index=False)
+
+def write_jhu_global(filename, n_days=N_DAYS, deaths=False, extra_countries=0,
+                     seed=0):
+    """
+    Write a time_series_covid19_*_global.csv lookalike.
+    Args:
+        filename (str): Path of CSV file to write.
+        n_days (int): Number of date columns.
+        deaths (Bool): If True, write fewer counts per day.
+        extra_countries (int): Number of made up countries to add, to
+            simulate a larger set of regions.
+        seed (int): Random seed.
+    """
+    rng = np.random.default_rng(seed)
+    countries = [JHU_SPELLING.get(c, c) for c in jhu_countries()] + JHU_EXTRA
+    countries += synthetic_countries(extra_countries)
+    rows = []
+    for country in countries:
+        for p in range(PROVINCES.get(country, 0)):
+            rows.append((f"{country} province {p}", country))
+        rows.append((np.nan, country))
+    meta = pd.DataFrame(rows, columns=["Province/State", "Country/Region"])
+    meta["Lat"] = rng.uniform(-50, 70, len(meta))
+    meta["Long"] = rng.uniform(-180, 180, len(meta))
+    scale = rng.uniform(1, 5000, len(meta)) / (100 if deaths else 1)
+    counts = cumulative_series(len(meta), n_days, scale, rng)
+    values = pd.DataFrame(counts, columns=date_labels(n_days))
+    pd.concat([meta, values], axis=1).to_csv(filename, index=False)
+
+def synthetic_countries(n):
+    """
+    Names of made up countries.
+    Args:
+        n (int): Number of countries.
+    Returns:
+        names (list): Country names.
+    """
+    return [f"Country {i:04d}" for i in range(n)]
+
+def write_owid(filename, locations, n_days=1000, world=True, seed=0):
+    """
+    Write an OWID vaccinations.csv or us_state_vaccinations.csv lookalike.
+    Args:
+        filename (str): Path of CSV file to write.
+        locations (list): Names of countries or states.
+        n_days (int): Number of days, starting Dec 2020.
+        world (Bool): If True, use the global vaccinations.csv columns.
+        seed (int): Random seed.
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2020-12-13", periods=n_days).strftime("%Y-%m-%d")
+    n = len(locations)
+    pops = rng.uniform(1e5, 5e7, n)
+    # Logistic uptake, with every location reporting on ~60% of days
+    t = np.arange(n_days)
+    uptake = 1 / (1 + np.exp(-(t[None, :] - rng.uniform(100, 300, (n, 1))) / 40.))
+    partial = np.floor(pops[:, None] * 0.85 * uptake)
+    fully = np.floor(partial * 0.9 * np.clip((t[None, :] - 21) / 100., 0, 1))
+    mask = rng.random((n, n_days)) < 0.6
+    loc_i, day_i = np.nonzero(mask)
+    df = pd.DataFrame({"date": dates[day_i],
+                       "location": np.asarray(locations, dtype=object)[loc_i]})
+    df["people_vaccinated"] = partial[loc_i, day_i]
+    df["people_fully_vaccinated"] = fully[loc_i, day_i]
+    gaps = rng.random(len(df)) < 0.1
+    df.loc[gaps, "people_fully_vaccinated"] = np.nan
+    df["total_vaccinations"] = df["people_vaccinated"] + df["people_fully_vaccinated"]
+    df["daily_vaccinations"] = rng.uniform(0, 1e5, len(df))
+    df["people_vaccinated_per_hundred"] = df["people_vaccinated"] / pops[loc_i] * 100
+    df["people_fully_vaccinated_per_hundred"] = df["people_fully_vaccinated"] / pops[loc_i] * 100
+    if world is True:
+        df["iso_code"] = [f"X{i:02d}" for i in loc_i]
+        df["total_boosters"] = np.nan
+        df["daily_vaccinations_raw"] = np.nan
+        df["daily_people_vaccinated"] = np.nan
+        df = df[["location", "iso_code", "date", "total_vaccinations",
+                 "people_vaccinated", "people_fully_vaccinated", "total_boosters",
+                 "daily_vaccinations_raw", "daily_vaccinations",
+                 "people_vaccinated_per_hundred",
+                 "people_fully_vaccinated_per_hundred", "daily_people_vaccinated"]]
+    else:
+        df["total_distributed"] = df["total_vaccinations"] * 1.2
+        df["share_doses_used"] = 0.8
+        df = df[["date", "location", "total_vaccinations", "total_distributed",
+                 "people_vaccinated", "people_fully_vaccinated_per_hundred",
+                 "people_fully_vaccinated", "people_vaccinated_per_hundred",
+                 "daily_vaccinations", "share_doses_used"]]
+    df.sort_values(["location", "date"]).to_csv(filename, index=False)
+
+def make_workdir(workdir, n_days=N_DAYS, n_counties=N_COUNTIES, extra_countries=0,
+                 seed=0):
+    """
+    Create a directory laid out like covidplots/, with synthetic files in
+    covid_data/ and a copy of geo_pop_data/, so the plotting code can be
+    run from it.
+    Args:
+        workdir (str): Directory to create.
+        n_days (int): Number of days in the JHU files.
+        n_counties (int): Number of rows in the JHU US files.
+        extra_countries (int): Number of made up countries in the global
+            files, on top of the ones JHU reports.
+        seed (int): Random seed.
+    Returns:
+        workdir (str): Directory created.
+    """
+    datadir = os.path.join(workdir, "covid_data")
+    os.makedirs(datadir, exist_ok=True)
+    geodir = os.path.join(workdir, "geo_pop_data")
+    if not os.path.exists(geodir):
+        shutil.copytree(GEO_POP_DIR, geodir)
+    if extra_countries > 0:
+        add_census_countries(os.path.join(geodir, "Census_data_2020_world_regions.csv"),
+                             synthetic_countries(extra_countries), seed=seed)
+
+    for deaths in [False, True]:
+        lbl = "deaths" if deaths else "confirmed"
+        write_jhu_us(os.path.join(datadir, f"time_series_covid19_{lbl}_US.csv"),
+                     n_counties=n_counties, n_days=n_days, deaths=deaths, seed=seed)
+        write_jhu_global(os.path.join(datadir, f"time_series_covid19_{lbl}_global.csv"),
+                         n_days=n_days, deaths=deaths,
+                         extra_countries=extra_countries, seed=seed)
+    n_vax_days = max(n_days - 325, 30)
+    states = pd.read_csv(os.path.join(GEO_POP_DIR, "nst-pop2020.csv"))["State"].to_list()
+    # OWID spells New York "New York State" and also reports federal agencies
+    states = [s if s != "New York" else "New York State" for s in states]
+    states += ["United States", "Bureau of Prisons", "Dept of Defense",
+               "Puerto Rico", "Guam"]
+    write_owid(os.path.join(datadir, "us_state_vaccinations.csv"),
+               states, n_days=n_vax_days, world=False, seed=seed)
+    countries = jhu_countries() + synthetic_countries(extra_countries)
+    write_owid(os.path.join(datadir, "vaccinations.csv"),
+               countries + ["World", "Europe", "High income"],
+               n_days=n_vax_days, seed=seed)
+    return workdir
+
+def add_census_countries(filename, countries, seed=0):
+    """
+    Append made up countries to the census population file.
+    Args:
+        filename (str): Path of Census_data_2020_world_regions.csv copy.
+        countries (list): Names of countries to add.
+        seed (int): Random seed.
+    """
+    rng = np.random.default_rng(seed)
+    with open(filename) as f1:
+        existing = f1.read()
+    rows = [f"Africa,{c},2020,{rng.integers(100000, 50000000)},1000,10.0"
+            for c in countries if f",{c}," not in existing]
+    if not existing.endswith("\n"):
+        rows.insert(0, "")
+    with open(filename, "a") as f1:
+        f1.write("\n".join(rows) + "\n")
+
+def scale_workdir(root, scale, seed=0):
+    """
+    Directory of synthetic data at a given scale, created on first use.
+    Args:
+        root (str): Directory holding one subdirectory per scale.
+        scale (str): One of SCALES.
+        seed (int): Random seed.
+    Returns:
+        workdir (str): Directory laid out like covidplots/, see make_workdir.
+    """
+    scale = SCALES[scale]
+    n_countries = len(jhu_countries()) + len(JHU_EXTRA)
+    params = {"n_days": N_DAYS * scale.days, "n_counties": N_COUNTIES * scale.regions,
+              "extra_countries": n_countries * (scale.regions - 1), "seed": seed}
+    workdir = os.path.join(root, scale.name)
+    marker = os.path.join(workdir, "covid_data", "synthetic.json")
+    try:
+        with open(marker) as f1:
+            if json.load(f1) == params:
+                return workdir
+    except (OSError, ValueError):
+        pass
+    # Population files are patched for the extra countries, start afresh
+    shutil.rmtree(workdir, ignore_errors=True)
+    print(f"Writing synthetic data at {scale.name} scale to {workdir}")
+    make_workdir(workdir, **params)
+    with open(marker, "w") as f1:
+        json.dump(params, f1)
+    return workdir
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(dest="workdir",
+                        help="Directory to write synthetic data to")
+    parser.add_argument("--days", type=int, default=N_DAYS,
+                        help="Number of days in the JHU files")
+    parser.add_argument("--counties", type=int, default=N_COUNTIES,
+                        help="Number of rows in the JHU US files")
+    parser.add_argument("--extra-countries", type=int, default=0,
+                        help="Number of made up countries to add")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed")
+    parser.add_argument("--scale", choices=list(SCALES), default=None,
+                        help="Write files at this scale to workdir/<scale> instead")
+    args = parser.parse_args()
+
+    if args.scale is not None:
+        workdir = scale_workdir(args.workdir, args.scale, seed=args.seed)
+    else:
+        workdir = make_workdir(args.workdir, n_days=args.days, n_counties=args.counties,
+                               extra_countries=args.extra_countries, seed=args.seed)
+    print(f"Wrote synthetic data to {workdir}")
@@ -0,0 +1,95 @@
+"""
+In-memory caches shared by the data modules.
+
+get_data keeps parsed files, metrics derived layers and cleaning cleaned
+frames. Each is a Memo: a least recently used cache, safe to use from
+threads, whose entries are frames made read-only so that every consumer
+can share them.
+"""
+
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+def read_only(df, copy=False):
+    """
+    Share a single-dtype frame without allowing in-place changes.
+    Args:
+        df (:obj:`pandas.DataFrame`): Frame to share.
+        copy (Bool): If True, copy the values first, so that frames
+            sharing them with df stay writeable.
+    Returns:
+        df (:obj:`pandas.DataFrame`): Frame with read-only values. Frames
+            of several dtypes (or of objects) are returned as they are.
+    """
+    if len(set(df.dtypes)) != 1 or df.dtypes.iloc[0] == object:
+        return df
+    values = df.to_numpy(copy=copy)
+    values.flags.writeable = False
+    return pd.DataFrame(values, index=df.index, columns=df.columns, copy=False)
+
+class Memo:
+    """
+    Least recently used cache.
+
+    Attributes:
+        size (int): Number of entries kept.
+        stats (dict): Number of hits and misses, updated in place.
+    """
+
+    def __init__(self, size, stats):
+        """
+        Args:
+            size (int): Number of entries kept.
+            stats (dict): Counters of hits and misses to update, usually
+                the *_STATS dict of the module owning the cache.
+        """
+        self.size = size
+        self.stats = stats
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Entry for a key, which becomes the most recently used.
+        Args:
+            key (tuple): Cache key.
+        Returns:
+            value: Cached value, or None (which is not counted as a miss,
+                see put).
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value computed after get missed, dropping the least
+        recently used entries beyond size.
+        Args:
+            key (tuple): Cache key.
+            value: Value to store.
+        """
+        with self._lock:
+            self.stats["misses"] += 1
+            self._entries[key] = value
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self, match=None):
+        """
+        Drop entries.
+        Args:
+            match (function): If given, only drop the entries whose key it
+                returns True for.
+        """
+        with self._lock:
+            if match is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if match(key)]:
+                del self._entries[key]
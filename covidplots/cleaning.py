@@ -0,0 +1,222 @@
+"""
+Clean cumulative count series before they are plotted.
+
+JHU revises cumulative counts now and then, which shows up as negative
+daily counts, and some regions report weeks of backlog on a single day,
+which shows up as a spike. This module finds both over a whole (date,
+region) frame at once and fixes them with one of these strategies:
+
+    clamp         negative daily counts become 0 (totals grow slightly)
+    redistribute  negative counts and backlog dumps are spread over the
+                  preceding days in proportion to their counts (totals are
+                  kept where possible)
+    envelope      the cumulative series is lowered to the largest
+                  non-decreasing series below it (the revision is applied
+                  to the past; totals are kept)
+
+Every call also returns a report of the changed regions and dates.
+Cleaned frames are cached in memory by a digest of the input, so every
+consumer of the same data shares one computation.
+"""
+
+import numpy as np
+import pandas as pd
+
+from covidplots import _memo, kernels, profiling
+from covidplots.metrics import dataset_digest
+
+STRATEGIES = ["clamp", "redistribute", "envelope"]
+# Which strategy backlog dumps get by default: only redistribute moves
+# counts between days, the others leave dumps alone and just report them.
+DUMP_STRATEGY = {"clamp": "report", "redistribute": "redistribute",
+                 "envelope": "report"}
+# A day is a backlog dump if it reports at least DUMP_MIN_COUNT new counts
+# and more than DUMP_FACTOR times the mean of the DUMP_WINDOW days before.
+DUMP_FACTOR = 10.
+DUMP_WINDOW = 28
+DUMP_MIN_COUNT = 100
+REPORT_COLUMNS = ["region", "kind", "before", "after"]
+# Number of cleaned frames kept in memory
+CLEAN_CACHE_SIZE = 16
+CLEAN_STATS = {"hits": 0, "misses": 0}
+_CLEANED = _memo.Memo(CLEAN_CACHE_SIZE, CLEAN_STATS)
+
+def clean_stats():
+    """
+    Report how many cleaned frames were served from the cache.
+    Returns:
+        stats (dict): Number of cache hits and misses.
+    """
+    return dict(CLEAN_STATS)
+
+def daily_counts(data):
+    """
+    Daily counts of cumulative series, with missing values carried over
+    from the previous date.
+    Args:
+        data (:obj:`pandas.DataFrame`): Cumulative counts, one column per
+            region, one row per date.
+    Returns:
+        daily (:obj:`numpy.ndarray`): Daily counts, 0 on the first date and
+            before a series starts.
+        start (:obj:`numpy.ndarray`): First value of each series.
+    """
+    filled = data.ffill().to_numpy(dtype=float)
+    daily = np.zeros_like(filled)
+    daily[1:] = filled[1:] - filled[:-1]
+    daily[np.isnan(daily)] = 0.
+    start = data.bfill().to_numpy(dtype=float)[0] if len(data) else filled[:0]
+    return daily, start
+
+def find_dumps(daily, factor=DUMP_FACTOR, window=DUMP_WINDOW,
+               min_count=DUMP_MIN_COUNT):
+    """
+    Find backlog dumps: days reporting far more than the days before.
+    Args:
+        daily (:obj:`numpy.ndarray`): Daily counts of shape (date, region).
+        factor (float): How many times the mean of the preceding days a
+            dump must exceed.
+        window (int): Number of preceding days to average.
+        min_count (int): Smallest count considered a dump.
+    Returns:
+        dumps (:obj:`numpy.ndarray`): Boolean array, True on dump days.
+        baseline (:obj:`numpy.ndarray`): Mean of the preceding days.
+    """
+    baseline = np.full(daily.shape, np.nan)
+    if len(daily) > 1:
+        baseline[1:] = kernels.rolling_mean(np.clip(daily[:-1], 0, None), window,
+                                            min_periods=max(window // 2, 1))
+    with np.errstate(invalid="ignore"):
+        dumps = (daily >= min_count) & (daily > factor * baseline)
+    return dumps, baseline
+
+def _spread_back(daily, excess, window):
+    """
+    Move excess counts of some days onto the window days before each of
+    them, in proportion to what those days reported.
+    Args:
+        daily (:obj:`numpy.ndarray`): Daily counts with the excess removed.
+        excess (:obj:`numpy.ndarray`): Counts to move away from each day.
+        window (int): Number of preceding days to spread over.
+    Returns:
+        daily (:obj:`numpy.ndarray`): Daily counts after the move.
+        kept (:obj:`numpy.ndarray`): Excess that could not be moved because
+            the preceding days reported nothing, to be put back.
+    """
+    n = len(daily)
+    weights = np.clip(daily, 0, None)
+    # Total weight of the window days before each day
+    before = np.zeros_like(weights)
+    if n > 1:
+        before[1:] = kernels.rolling_sum_count(weights[:-1], window)[0]
+    movable = (excess != 0) & (before > 0)
+    ratio = np.divide(excess, before, out=np.zeros_like(excess), where=movable)
+    # Day d receives weights[d] times the ratios of days d+1 ... d+window
+    cum = np.zeros((n + 1,) + ratio.shape[1:])
+    np.cumsum(ratio, axis=0, out=cum[1:])
+    ends = np.minimum(np.arange(n) + window + 1, n)
+    received = cum[ends] - cum[np.arange(n) + 1]
+    daily = daily + weights * received
+    kept = np.where(movable, 0., excess)
+    return daily, kept
+
+def _clean(data, strategy, dumps, window, factor, min_count):
+    """ clean without the cache. """
+    values = data.to_numpy(dtype=float)
+    missing = np.isnan(values)
+    daily, start = daily_counts(data)
+    negative = daily < 0
+    is_dump, baseline = find_dumps(daily, factor, window, min_count)
+
+    if strategy == "envelope":
+        # Largest non-decreasing series below the cumulative counts
+        filled = data.ffill().to_numpy(dtype=float)
+        cleaned = np.fmin.accumulate(filled[::-1], axis=0)[::-1]
+        new_daily = np.zeros_like(cleaned)
+        new_daily[1:] = cleaned[1:] - cleaned[:-1]
+        new_daily[np.isnan(new_daily)] = 0.
+        start = cleaned[0] if len(cleaned) else start
+        if dumps == "redistribute":
+            excess = np.where(is_dump, new_daily - baseline, 0.)
+            new_daily, kept = _spread_back(new_daily - excess, excess, window)
+            new_daily += kept
+    else:
+        excess = np.zeros_like(daily)
+        if strategy == "redistribute":
+            excess = np.where(negative, daily, excess)
+        if dumps == "redistribute":
+            excess = np.where(is_dump & ~negative, daily - baseline, excess)
+        if excess.any():
+            new_daily, kept = _spread_back(daily - excess, excess, window)
+            new_daily += kept
+        else:
+            new_daily = daily
+        # Whatever is still negative is clamped
+        new_daily = np.clip(new_daily, 0, None)
+
+    first = np.nan_to_num(start)
+    cleaned = first[None, :] + np.cumsum(new_daily, axis=0)
+    cleaned[missing] = np.nan
+    cleaned = pd.DataFrame(cleaned, index=data.index, columns=data.columns)
+
+    # Report every changed day, and why
+    changed = ~np.isclose(new_daily, daily, rtol=1e-9, atol=1e-6) | is_dump
+    changed &= ~missing
+    rows, cols = np.nonzero(changed)
+    kind = np.where(negative[rows, cols], "negative",
+                    np.where(is_dump[rows, cols], "dump",
+                             "envelope" if strategy == "envelope" else "spread"))
+    report = pd.DataFrame({"region": np.asarray(data.columns)[cols].astype(str),
+                           "kind": kind,
+                           "before": daily[rows, cols],
+                           "after": new_daily[rows, cols]},
+                          index=pd.Index(data.index[rows], name="date"),
+                          columns=REPORT_COLUMNS)
+    return cleaned, report
+
+@profiling.timed("clean", rows=profiling.records)
+def clean(data, strategy="clamp", dumps=None, window=DUMP_WINDOW,
+          factor=DUMP_FACTOR, min_count=DUMP_MIN_COUNT, cache=True):
+    """
+    Fix negative daily counts and backlog dumps of cumulative series.
+    Args:
+        data (:obj:`pandas.DataFrame`): Cumulative counts, one column per
+            region, one row per date.
+        strategy (str): How to fix negative daily counts, one of
+            STRATEGIES.
+        dumps (str): 'redistribute' to spread backlog dumps over the
+            preceding days, or 'report' to only report them. Defaults to
+            DUMP_STRATEGY[strategy].
+        window (int): Number of preceding days dumps are compared with and
+            counts are spread over.
+        factor (float): How many times the mean of the preceding days a
+            dump must exceed.
+        min_count (int): Smallest daily count considered a dump.
+        cache (Bool): If True, reuse the result of an earlier call on the
+            same data.
+    Returns:
+        cleaned (:obj:`pandas.DataFrame`): Cleaned cumulative counts, same
+            shape as data. Values are read-only if cached.
+        report (:obj:`pandas.DataFrame`): One row per changed (or dumped)
+            region and date, indexed by date, with columns region, kind
+            ('negative', 'dump', 'spread' or 'envelope'), before and after
+            (the daily counts).
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown cleaning strategy {strategy}, use one of {STRATEGIES}")
+    if dumps is None:
+        dumps = DUMP_STRATEGY[strategy]
+    if dumps not in ["report", "redistribute"]:
+        raise ValueError(f"Unknown dump strategy {dumps}, use 'report' or 'redistribute'")
+    data = data.select_dtypes("number")
+    if cache is False:
+        return _clean(data, strategy, dumps, window, factor, min_count)
+
+    key = (dataset_digest(data), strategy, dumps, window, factor, min_count)
+    frames = _CLEANED.get(key)
+    if frames is None:
+        cleaned, report = _clean(data, strategy, dumps, window, factor, min_count)
+        frames = (_memo.read_only(cleaned), report)
+        _CLEANED.put(key, frames)
+    cleaned, report = frames
+    return cleaned.copy(deep=False), report.copy()
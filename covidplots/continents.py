@@ -1,14 +1,10 @@
+import os
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 
-# These are the entries in JHU data that do not have matches in census    
-#diff = ['West Bank and Gaza',
-#         'US',
-#         'Taiwan*',
-#         'Diamond Princess',
-#         'Bahamas',
-#         'Holy See',
-#         'MS Zaandam',
-#         'Gambia']
+from covidplots import regions
 
 def fix_census_df(census_df, countries=None):
     """
@@ -16,42 +12,44 @@ def fix_census_df(census_df, countries=None):
     that have no Covid data.
     Args:
         census_df (:obj:`pandas.DataFrame`): Census dataframe to fix.
+        countries (list): Countries (canonical names) to keep. Defaults to
+            the countries JHU tracks.
     Returns:
         census_df (:obj:`pandas.DataFrame`): Rectified census dataframe.
     """
 
-    census_df["West Bank and Gaza"] = census_df["Gaza Strip"] + census_df["West Bank"]
-    census_df.rename({"United States": "US", "Bahamas, The": "Bahamas",
-                      "Gambia, The": "Gambia", "Virgin Islands, British": "British Virgin Islands",
-                      "Virgin Islands, U.S.": "U.S. Virgin Islands",
-                      "Congo (Brazzaville)": "Congo", 
-                      "Congo (Kinshasa)": "Democratic Republic of Congo",
-                      "Korea, North": "North Korea", "Korea, South": "South Korea"}, 
-                      axis="columns", inplace=True)
-    census_countries = census_df.columns.to_list()
+    registry = regions.registry("world")
+    ids = registry.ids(census_df.columns, "census")
+    by_id, present = registry.collect(census_df.to_numpy(), ids)
     if countries is None:
         countries = jhu_countries()
-    to_remove = list(set(census_countries) - set(countries))
-    census_df.drop(columns=to_remove, inplace=True)
-    census_df = census_df.reindex(sorted(census_df.columns), axis=1)
-    return census_df
+    keep = np.unique(registry.ids(countries, add=False))
+    keep = keep[(keep >= 0) & present[keep]]
+    names = registry.take(keep)
+    order = np.argsort(names.to_numpy())
+    columns = pd.Index(names[order], name=census_df.columns.name)
+    return pd.DataFrame(by_id[:, keep[order]], index=census_df.index,
+                        columns=columns)
 
 def fix_owid_df(owid_df, world=True):
+    """
+    Fix the OWID data to match JHU names, and remove rows of aggregates
+    (continents, income groups) and of places with no Covid data.
+    Args:
+        owid_df (:obj:`pandas.DataFrame`): OWID dataframe to fix.
+        world (Bool): If True, the data is by country, else by US state.
+    Returns:
+        owid_df (:obj:`pandas.DataFrame`): Rectified OWID dataframe.
+    """
     if world is True:
-        owid_df['location'] = owid_df['location'].replace({"Myanmar": "Burma", 
-            "United States": "US", "Korea, South": "South Korea",
-            "Cape Verde": "Cabo Verde", "Faeroe Islands": "Faroe Islands",
-            "Macao": "Macau", "Timor": "Timor-Leste"})
-        regions = ["Africa", "Asia", "European Union", "Europe", "North America", 
-                   "Oceania", "South America", "World", "Upper middle income", 
-                   "High income", "Low income", "Lower middle income"]
-        regions += ["Bonaire Sint Eustatius and Saba", "England", "Falkland Islands",
-                    "Niue", "Northern Cyprus", "Northern Ireland", "Palestine",
-                    "Pitcairn", "Saint Helena", "Scotland", "Sint Maarten (Dutch part)",
-                    "Wales"] 
-        owid_df.drop(owid_df.loc[owid_df["location"].isin(regions)].index, inplace=True)
+        registry = regions.registry("world")
     else:
-        owid_df['location'] = owid_df['location'].replace({"New York State": "New York"})
+        registry = regions.registry("usa")
+    ids = registry.ids(owid_df["location"], "owid")
+    keep = ids >= 0
+    if not keep.all():
+        owid_df = owid_df.loc[keep]
+    owid_df = owid_df.assign(location=registry.take(ids[keep]).to_numpy())
     owid_df = owid_df.reindex(sorted(owid_df.columns), axis=1)
     return owid_df
 
@@ -64,10 +62,13 @@ def fix_jhu_df(jhu_df):
         jhu_df (:obj:`pandas.DataFrame`): Rectified JHU dataframe.
     """
     
-    jhu_df.drop(columns=["Diamond Princess", "MS Zaandam", "Holy See"],
-                inplace=True)
-    jhu_df.rename({"Taiwan*": "Taiwan", "Korea, South": "South Korea"}, axis="columns", inplace=True)
-    jhu_df = jhu_df.reindex(sorted(jhu_df.columns), axis=1)
+    registry = regions.registry("world")
+    ids = registry.ids(jhu_df.columns, "jhu")
+    keep = np.flatnonzero(ids >= 0)
+    names = registry.take(ids[keep])
+    order = keep[np.argsort(names.to_numpy())]
+    jhu_df = jhu_df.iloc[:, order]
+    jhu_df.columns = pd.Index(registry.take(ids[order]), name=jhu_df.columns.name)
     return jhu_df
 
 
@@ -80,26 +81,33 @@ def census_continents(filename="geo_pop_data/Census_data_2020_world_regions.csv"
         by_cont (:obj:`pandas.Series`): Pandas series, each key is the
             continent and the value is a list of countries.
     """
+    # The file is only read once per process, callers get their own lists
+    by_cont = _census_continents(os.path.abspath(filename))
+    return pd.Series({cont: list(countries) for cont, countries in by_cont})
+
 
+@lru_cache(maxsize=None)
+def _census_continents(filename):
     # Census CSV From here
     # https://www.census.gov/data-tools/demo/idb/region.php?T=6&RT=0&A=separate&Y=2020&C=&R=110,120,130,141,142,143,150,160
-    df = pd.read_csv(filename, skiprows=1)
-    df.drop(columns=['Year', 'Area (sq. km.)', 'Density (persons per sq. km.)',
-                     'Population'], inplace=True)
-    df.Country[df["Country"] == "United States"] = "US"
-    df.Country[df["Country"] == "Bahamas, The"] = "Bahamas"
-    df.Country[df["Country"] == "Gambia, The"] = "Gambia"
-    df2 = pd.DataFrame({"Region": ["Asia"], "Country": ["West Bank and Gaza"]})
-    df = df.append(df2) 
+    df = pd.read_csv(filename, skiprows=1, usecols=["Region", "Country"])
+    registry = regions.registry("world")
     jhu = jhu_countries()
-    census_countries = df["Country"].to_list()
-    to_remove = list(set(census_countries) - set(jhu))
-    df = df[df["Country"].apply(lambda x: x not in to_remove)]
-    by_cont = df.groupby("Region")["Country"].apply(list) 
-    allcountries = pd.Series({"All": jhu})
-    by_cont = by_cont.append(allcountries)
+    is_jhu = np.zeros(len(registry), dtype=bool)
+    is_jhu[registry.ids(jhu)] = True
+    ids = registry.ids(df["Country"], "census")
+    # Several census entries can make up one JHU country, keep the first
+    keep = (ids >= 0) & ~pd.Series(ids).duplicated().to_numpy()
+    keep &= regions.gather(is_jhu, ids, fill=False)
+    countries = registry.take(ids[keep]).to_list()
+    conts = df["Region"].to_numpy()[keep]
+    by_cont = {}
+    for cont, country in zip(conts, countries):
+        by_cont.setdefault(cont, []).append(country)
+    by_cont = dict(sorted(by_cont.items()))
+    by_cont["All"] = jhu
 
-    return by_cont    
+    return tuple((cont, tuple(countries)) for cont, countries in by_cont.items())
 
 
 def jhu_countries():
@@ -108,190 +116,4 @@ def jhu_countries():
     Returns:
         countries (list): JHU countries.
     """
-    # This is the sanitized list (e.g. Taiwan* is now Taiawn)
-    countries = [
- 'Afghanistan',
- 'Albania',
- 'Algeria',
- 'Andorra',
- 'Angola',
- 'Antigua and Barbuda',
- 'Argentina',
- 'Armenia',
- 'Australia',
- 'Austria',
- 'Azerbaijan',
- 'Bahamas',
- 'Bahrain',
- 'Bangladesh',
- 'Barbados',
- 'Belarus',
- 'Belgium',
- 'Belize',
- 'Benin',
- 'Bhutan',
- 'Bolivia',
- 'Bosnia and Herzegovina',
- 'Botswana',
- 'Brazil',
- 'Brunei',
- 'Bulgaria',
- 'Burkina Faso',
- 'Burma',
- 'Burundi',
- 'Cabo Verde',
- 'Cambodia',
- 'Cameroon',
- 'Canada',
- 'Central African Republic',
- 'Chad',
- 'Chile',
- 'China',
- 'Colombia',
- 'Comoros',
- 'Congo (Brazzaville)',
- 'Congo (Kinshasa)',
- 'Costa Rica',
- "Cote d'Ivoire",
- 'Croatia',
- 'Cuba',
- 'Cyprus',
- 'Czechia',
- 'Denmark',
- 'Djibouti',
- 'Dominica',
- 'Dominican Republic',
- 'Ecuador',
- 'Egypt',
- 'El Salvador',
- 'Equatorial Guinea',
- 'Eritrea',
- 'Estonia',
- 'Eswatini',
- 'Ethiopia',
- 'Fiji',
- 'Finland',
- 'France',
- 'Gabon',
- 'Gambia',
- 'Georgia',
- 'Germany',
- 'Ghana',
- 'Greece',
- 'Grenada',
- 'Guatemala',
- 'Guinea',
- 'Guinea-Bissau',
- 'Guyana',
- 'Haiti',
- 'Honduras',
- 'Hungary',
- 'Iceland',
- 'India',
- 'Indonesia',
- 'Iran',
- 'Iraq',
- 'Ireland',
- 'Israel',
- 'Italy',
- 'Jamaica',
- 'Japan',
- 'Jordan',
- 'Kazakhstan',
- 'Kenya',
- 'South Korea',
- 'Kosovo',
- 'Kuwait',
- 'Kyrgyzstan',
- 'Laos',
- 'Latvia',
- 'Lebanon',
- 'Lesotho',
- 'Liberia',
- 'Libya',
- 'Liechtenstein',
- 'Lithuania',
- 'Luxembourg',
- 'Madagascar',
- 'Malawi',
- 'Malaysia',
- 'Maldives',
- 'Mali',
- 'Malta',
- 'Mauritania',
- 'Mauritius',
- 'Mexico',
- 'Moldova',
- 'Monaco',
- 'Mongolia',
- 'Montenegro',
- 'Morocco',
- 'Mozambique',
- 'Namibia',
- 'Nepal',
- 'Netherlands',
- 'New Zealand',
- 'Nicaragua',
- 'Niger',
- 'Nigeria',
- 'North Macedonia',
- 'Norway',
- 'Oman',
- 'Pakistan',
- 'Panama',
- 'Papua New Guinea',
- 'Paraguay',
- 'Peru',
- 'Philippines',
- 'Poland',
- 'Portugal',
- 'Qatar',
- 'Romania',
- 'Russia',
- 'Rwanda',
- 'Saint Kitts and Nevis',
- 'Saint Lucia',
- 'Saint Vincent and the Grenadines',
- 'San Marino',
- 'Sao Tome and Principe',
- 'Saudi Arabia',
- 'Senegal',
- 'Serbia',
- 'Seychelles',
- 'Sierra Leone',
- 'Singapore',
- 'Slovakia',
- 'Slovenia',
- 'Somalia',
- 'South Africa',
- 'South Sudan',
- 'Spain',
- 'Sri Lanka',
- 'Sudan',
- 'Suriname',
- 'Sweden',
- 'Switzerland',
- 'Syria',
- 'Taiwan',
- 'Tajikistan',
- 'Tanzania',
- 'Thailand',
- 'Timor-Leste',
- 'Togo',
- 'Trinidad and Tobago',
- 'Tunisia',
- 'Turkey',
- 'US',
- 'Uganda',
- 'Ukraine',
- 'United Arab Emirates',
- 'United Kingdom',
- 'Uruguay',
- 'Uzbekistan',
- 'Venezuela',
- 'Vietnam',
- 'West Bank and Gaza',
- 'Yemen',
- 'Zambia',
- 'Zimbabwe']
-    return countries
+    return list(regions.JHU_COUNTRIES)
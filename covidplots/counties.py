@@ -0,0 +1,271 @@
+"""
+County-level store of the JHU US time series files.
+
+The US files hold one row per county (plus a few rows per state for
+unassigned cases and cruise ships). A CountyStore keeps every row, keyed by
+FIPS code, with the rows sorted by state so that each state is one
+contiguous segment. State totals are then a single segmented sum over the
+county matrix (np.add.reduceat, the same as multiplying by the 0/1
+county-to-state membership matrix) and national totals are the sum of the
+states.
+
+Like ingest.ingest_jhu, the store is kept on disk with a hash of the file it
+came from. When JHU only appended dates, just the new columns are read and
+only those are aggregated and appended. State, county and national
+consumers of the same file share one parse per process.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from covidplots import frame_cache, ingest, schema
+
+COUNTY_KEY = "FIPS"
+STATE_KEY = "Province_State"
+STORE_STATS = {"full": 0, "incremental": 0, "unchanged": 0, "shared": 0}
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+def store_stats():
+    """
+    Report how county stores were built.
+    Returns:
+        stats (dict): Number of full parses, incremental appends, files
+            found unchanged on disk, and stores shared within the process.
+    """
+    return dict(STORE_STATS)
+
+def store_path(filename):
+    """
+    Path of the stored county matrix of a file.
+    Args:
+        filename (str): Path of the source CSV file.
+    Returns:
+        path (str): Path of .npz store file.
+    """
+    cachedir = os.path.join(os.path.dirname(filename), frame_cache.CACHE_SUBDIR)
+    basename = os.path.basename(filename)
+    return os.path.join(cachedir, f"{basename}.counties.npz")
+
+def aggregate(values, offsets):
+    """
+    Sum consecutive segments of rows.
+    Args:
+        values (:obj:`numpy.ndarray`): Array of shape (row, date), rows
+            grouped in segments.
+        offsets (:obj:`numpy.ndarray`): First row of each segment.
+    Returns:
+        totals (:obj:`numpy.ndarray`): Array of shape (segment, date).
+            Missing values count as 0.
+    """
+    if values.dtype.kind == "f":
+        values = np.nan_to_num(values)
+    if values.dtype.kind in "iu":
+        values = values.astype(np.int64)
+    if values.shape[1] == 0:
+        return np.zeros((len(offsets), 0), dtype=values.dtype)
+    return np.add.reduceat(values, offsets, axis=0)
+
+class CountyStore:
+    """
+    County series of one JHU US file, with state and national totals.
+
+    Attributes:
+        fips (:obj:`numpy.ndarray`): FIPS code of each row, negative for
+            rows without one (e.g. cruise ships).
+        names (:obj:`numpy.ndarray`): Combined_Key of each row.
+        states (:obj:`numpy.ndarray`): State names, sorted.
+        offsets (:obj:`numpy.ndarray`): First row of each state.
+        dates (list): Date column labels, as in the CSV header.
+        values (:obj:`numpy.ndarray`): Array of shape (row, date).
+        state_values (:obj:`numpy.ndarray`): Array of shape (state, date).
+    """
+
+    def __init__(self, fips, names, states, offsets, dates, values,
+                 state_values=None):
+        self.fips = fips
+        self.names = names
+        self.states = states
+        self.offsets = offsets
+        self.dates = list(dates)
+        self.values = values
+        if state_values is None:
+            state_values = aggregate(values, offsets)
+        self.state_values = state_values
+        self._freeze()
+
+    def _freeze(self):
+        # Frames handed out share these arrays with every other caller
+        for values in [self.values, self.state_values]:
+            values.flags.writeable = False
+
+    @classmethod
+    def from_frame(cls, a, dates):
+        """
+        Build a store from a parsed JHU US file.
+        Args:
+            a (:obj:`pandas.DataFrame`): One row per line of the file, with
+                columns FIPS, Combined_Key, Province_State and the dates.
+            dates (list): Date columns.
+        Returns:
+            store (:obj:`CountyStore`): Store.
+            rows (:obj:`numpy.ndarray`): Row of each line of the file in the
+                store.
+        """
+        states, codes = np.unique(a[STATE_KEY].astype(str).to_numpy(),
+                                  return_inverse=True)
+        # Group lines by state, keeping file order within each state
+        order = np.argsort(codes, kind="stable")
+        offsets = np.searchsorted(codes[order], np.arange(len(states)))
+        fips = a[COUNTY_KEY].to_numpy(dtype=float)[order]
+        missing = np.isnan(fips)
+        fips[missing] = -np.arange(1, missing.sum() + 1)
+        names = a["Combined_Key"].astype(str).to_numpy()[order]
+        values = a[dates].to_numpy()[order]
+        rows = np.empty(len(order), dtype=np.int64)
+        rows[order] = np.arange(len(order))
+        return cls(fips, names, states, offsets, dates, values), rows
+
+    def append(self, dates, new, rows):
+        """
+        Add date columns, aggregating only them.
+        Args:
+            dates (list): Labels of the new dates.
+            new (:obj:`numpy.ndarray`): Values of the new dates, one row per
+                line of the file.
+            rows (:obj:`numpy.ndarray`): Row of each line of the file.
+        """
+        values = np.empty((len(self.fips), new.shape[1]), dtype=float)
+        values[rows] = new
+        if np.array_equal(values, np.round(values)) and self.values.dtype.kind in "iu":
+            values = values.astype(self.values.dtype)
+        self.values = np.hstack([self.values, values])
+        self.state_values = np.hstack([self.state_values,
+                                       aggregate(values, self.offsets).astype(
+                                           self.state_values.dtype)])
+        self.dates += list(dates)
+        self._freeze()
+
+    def county_frame(self):
+        """
+        County series.
+        Returns:
+            covid (:obj:`pandas.DataFrame`): One row per FIPS code, one
+                column per date (labelled as in the CSV header).
+        """
+        index = pd.Index(self.fips, name=COUNTY_KEY)
+        return pd.DataFrame(self.values, index=index, columns=self.dates)
+
+    def county_names(self):
+        """
+        Names of the counties.
+        Returns:
+            names (:obj:`pandas.Series`): Combined_Key by FIPS code.
+        """
+        return pd.Series(self.names, index=pd.Index(self.fips, name=COUNTY_KEY),
+                         name="Combined_Key")
+
+    def state_frame(self):
+        """
+        State totals.
+        Returns:
+            b (:obj:`pandas.DataFrame`): One row per state, one column per
+                date (labelled as in the CSV header).
+        """
+        index = pd.Index(self.states.astype(object), name=STATE_KEY)
+        return pd.DataFrame(self.state_values, index=index, columns=self.dates)
+
+    def national(self):
+        """
+        National totals.
+        Returns:
+            totals (:obj:`pandas.Series`): One value per date.
+        """
+        return pd.Series(self.state_values.sum(axis=0), index=self.dates, name="US")
+
+    def save(self, path, rows, header, digest):
+        """
+        Store the county matrix and its totals.
+        Args:
+            path (str): Path of .npz store file.
+            rows (:obj:`numpy.ndarray`): Row of each line of the file.
+            header (list): Header of the file.
+            digest (str): Hex digest of the file.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmppath = f"{path}.{os.getpid()}.tmp"
+        with open(tmppath, "wb") as f1:
+            np.savez(f1, fips=self.fips, names=self.names.astype(str),
+                     states=self.states.astype(str), offsets=self.offsets,
+                     values=self.values, state_values=self.state_values,
+                     rows=rows, header=np.asarray(header, dtype=str),
+                     digest=np.array(digest))
+        os.replace(tmppath, path)
+
+def _load(path):
+    try:
+        with np.load(path, allow_pickle=False) as state:
+            return {k: state[k] for k in state.files}
+    except (OSError, ValueError):
+        return None
+
+def _build(filename, incremental=True):
+    header = ingest.read_header(filename)
+    dates = [col for col in header if ingest.DATE_COLUMN.match(col)]
+    path = store_path(filename)
+    state = _load(path) if incremental is True else None
+
+    if state is not None:
+        old_header = state["header"].tolist()
+        appended = header[len(old_header):]
+        if header[:len(old_header)] == old_header and \
+                all(ingest.DATE_COLUMN.match(col) for col in appended):
+            before, after, new = ingest.scan(filename, len(appended))
+            if before == str(state["digest"]):
+                old_dates = [col for col in old_header if ingest.DATE_COLUMN.match(col)]
+                store = CountyStore(state["fips"], state["names"], state["states"],
+                                    state["offsets"], old_dates, state["values"],
+                                    state["state_values"])
+                if new is None:
+                    STORE_STATS["unchanged"] += 1
+                    return store
+                store.append(appended, new, state["rows"])
+                store.save(path, state["rows"], header, after)
+                STORE_STATS["incremental"] += 1
+                return store
+
+    # First build, or JHU revised earlier data: parse everything
+    a = schema.read_jhu(filename, STATE_KEY, dates, usecols=schema.COUNTY_COLUMNS,
+                        dtype=schema.COUNTY_DTYPES)
+    store, rows = CountyStore.from_frame(a, dates)
+    if incremental is True:
+        store.save(path, rows, header, ingest.scan(filename)[1])
+    STORE_STATS["full"] += 1
+    return store
+
+def open_counties(filename, incremental=True):
+    """
+    County store of a JHU US time series file, shared by all callers in
+    the process for as long as the file is unchanged.
+    Args:
+        filename (str): Path of the CSV file.
+        incremental (Bool): If True, only parse date columns added since the
+            store was last saved, when history was not revised.
+    Returns:
+        store (:obj:`CountyStore`): County series and their totals. Treat
+            its arrays as read-only.
+    """
+    key = (os.path.abspath(filename), frame_cache.file_digest(filename))
+    with _STORES_LOCK:
+        store = _STORES.get(key)
+        if store is not None:
+            STORE_STATS["shared"] += 1
+            return store
+        store = _build(filename, incremental=incremental)
+        for old in [k for k in _STORES if k[0] == key[0]]:
+            del _STORES[old]
+        _STORES[key] = store
+    return store
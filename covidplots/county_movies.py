@@ -32,16 +32,21 @@ from datetime import datetime
 import sys
 import os
 
+from covidplots import cleaning, counties, profiling, schema
 from covidplots.get_data import download_data
 #Colormap to use
 CMAPNAME = 'Blues'
 VMIN = 0.001
 VMAX = 50
+#How negative daily counts (JHU revisions) are fixed
+CLEAN_STRATEGY = 'clamp'
 
 
+@profiling.timed('prepare_data')
 def prepare_data():
     #Reading in government tables.
-    allpop = pd.read_csv('geo_pop_data/co-est2020.csv') 
+    allpop = pd.read_csv('geo_pop_data/co-est2020.csv',
+                         usecols=['STATE','COUNTY','POPESTIMATE2019'])
     map_df = gpd.read_file('geo_pop_data/cb_2019_us_county_500k.shp')
 
     #Keep only the 50 states and DC
@@ -64,21 +69,19 @@ def prepare_data():
 
 
     #Reading in the COVID data
-    covid = pd.read_csv('covid_data/time_series_covid19_confirmed_US.csv',
-                        index_col='FIPS')
-    countynames = covid.Combined_Key
-    covid.drop(columns=['UID','iso2','iso3','code3','Combined_Key',
-                        'Admin2','Province_State','Country_Region',
-                        'Lat','Long_'],
-               inplace=True)
+    covidfile = 'covid_data/time_series_covid19_confirmed_US.csv'
+    store = counties.open_counties(covidfile)
+    covid = store.county_frame()
+    countynames = store.county_names()
 
-    covid = covid.diff(axis=1)
-    covid[covid<0.] = 0.  #Removing negative values
-
-
-    dt_idx = pd.to_datetime(covid.columns)
+    dt_idx = schema.jhu_dates(covid.columns)
     covid = covid.T
     covid.index = dt_idx
+    #Clamping rebuilds the cumulative series from its daily counts with the
+    #negative ones set to 0, so its diff() is the clamped daily counts
+    covid, report = cleaning.clean(covid, CLEAN_STRATEGY)
+    profiling.count(len(report), 'cleaned')
+    covid = covid.diff()
     covid = covid.iloc[5:].resample('W',label='right',closed='right').sum()
     covid.rename(index=str,inplace=True)
     covid = covid.T
@@ -124,6 +127,7 @@ def fig_setup(figtype):
 
 
 #Function that makes cloropleth
+@profiling.timed('make_plots')
 def make_plots(data,plot_type):
 
     for col in data.columns[5:]:
@@ -151,7 +155,8 @@ def make_plots(data,plot_type):
                 date_text.set_text(f'{col[:10]}')
 
             fig.tight_layout()
-            fig.savefig(f'{outputfile}',dpi=200)
+            with profiling.stage('save'):
+                fig.savefig(f'{outputfile}',dpi=200)
             plt.close(fig)
             print(f'Created {outputfile} {(datetime.now()-dt1).total_seconds():5.2f}')
 
@@ -167,8 +172,18 @@ if __name__ == "__main__":
     parser.add_argument('--percapita',action='store_true',
            default=False,
            help='Switch to plot per-capita')
+    parser.add_argument('--profile',nargs='?',const=profiling.PROFILE_REPORT,
+           default=None,metavar='REPORT',
+           help='Time each stage and write a JSON report (default: profiles/)')
+    parser.add_argument('--cprofile',action='store_true',
+           default=False,
+           help='With --profile, also run cProfile')
+    parser.add_argument('--trace-memory',action='store_true',
+           default=False,
+           help='With --profile, also trace the memory each stage allocates (slow)')
     
     args = parser.parse_args()
+    profiling.start('county_movies',args.profile,args.cprofile,args.trace_memory)
 
     if args.percentile or args.percapita:
         data = prepare_data()
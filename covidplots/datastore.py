@@ -0,0 +1,226 @@
+"""
+Shared on-disk data cube of cases, deaths and vaccinations.
+
+All metrics for one region family ('usa' states or 'world' countries) are
+materialised once into a single dense float32 array of shape
+(metric, date, region), stored as a raw file in covid_data/store/. The
+region and date labels, populations and source file digests live in a JSON
+sidecar next to it.
+
+Processes open the cube with np.memmap, so any number of plotting scripts
+and Bokeh sessions share the same pages through the OS page cache instead
+of each holding private copies. Each metric is a contiguous (date, region)
+slab, which pandas wraps without copying.
+
+The store serves the interactive apps, which open many sessions at once.
+The batch plotting scripts keep reading through get_data.get_data: float32
+rounds cumulative totals above 2**24 (which shifts the daily counts they
+plot by a few units), the cube holds uncleaned counts only, and building it
+downloads the vaccination files too. Within a script the parsed data is
+already shared, by the get_data memo and by forked scheduler workers.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from covidplots import frame_cache, get_data
+from covidplots.population import PopulationIndex
+
+METRICS = ["cases", "deaths", "partially_vaccinated", "fully_vaccinated"]
+STORE_SUBDIR = "store"
+STORE_VERSION = 2
+
+class DataStore:
+    """
+    Read-only view of a memory-mapped region family cube.
+
+    Attributes:
+        family (str): 'usa' or 'world'.
+        metrics (list): Names of the metrics along the first axis.
+        dates (:obj:`pandas.DatetimeIndex`): Dates along the second axis.
+        regions (:obj:`pandas.Index`): Regions along the third axis.
+        cube (:obj:`numpy.memmap`): Array of shape (metric, date, region).
+    """
+
+    def __init__(self, family, outdir="covid_data"):
+        cubefile, metafile = store_paths(family, outdir)
+        with open(metafile) as f1:
+            meta = json.load(f1)
+        self.family = family
+        self.meta = meta
+        self.metrics = meta["metrics"]
+        self.dates = pd.DatetimeIndex(meta["dates"])
+        self.regions = pd.Index(meta["regions"])
+        self.populations = np.asarray(meta["populations"], dtype=float)
+        shape = (len(self.metrics), len(self.dates), len(self.regions))
+        self.cube = np.memmap(cubefile, dtype=np.float32, mode="r", shape=shape)
+
+    def array(self, metric):
+        """
+        Values of one metric, without copying.
+        Args:
+            metric (str): One of METRICS.
+        Returns:
+            values (:obj:`numpy.ndarray`): Read-only array of shape
+                (date, region).
+        """
+        return self.cube[self.metrics.index(metric)]
+
+    def frame(self, metric, dropna=True):
+        """
+        Values of one metric as a DataFrame backed by the memory map.
+        Args:
+            metric (str): One of METRICS.
+            dropna (Bool): If True, drop dates where no region has data
+                (e.g. vaccinations before Dec 2020).
+        Returns:
+            data (:obj:`pandas.DataFrame`): One column per region, indexed
+                by date, like the data returned by get_data.get_data.
+        """
+        values = self.array(metric)
+        data = pd.DataFrame(values, index=self.dates, columns=self.regions,
+                            copy=False)
+        if dropna is True:
+            valid = np.flatnonzero(~np.isnan(values).all(axis=1))
+            if len(valid) > 0:
+                data = data.iloc[valid[0]:valid[-1]+1]
+        return data
+
+    def pops(self):
+        """
+        Populations, shaped like the pops returned by get_data.get_data.
+        Returns:
+            pops (:obj:`pandas.DataFrame`): One row, one column per region.
+        """
+        return pd.DataFrame([self.populations], index=["Population"],
+                            columns=self.regions)
+
+    def population_index(self, columns=None):
+        """
+        Populations aligned with a selection of regions.
+        Args:
+            columns (list): Regions to align with. Defaults to all regions
+                of the store, in store order.
+        Returns:
+            index (:obj:`PopulationIndex`): Population index.
+        """
+        index = PopulationIndex(self.regions, self.populations)
+        if columns is None:
+            return index
+        return PopulationIndex(columns, index.aligned(columns))
+
+def store_paths(family, outdir="covid_data"):
+    """
+    Paths of the cube and its sidecar for a region family.
+    Args:
+        family (str): 'usa' or 'world'.
+        outdir (str): Name of directory data is downloaded to.
+    Returns:
+        cubefile (str): Path of raw float32 cube.
+        metafile (str): Path of JSON sidecar.
+    """
+    storedir = os.path.join(outdir, STORE_SUBDIR)
+    return (os.path.join(storedir, f"{family}.f32"),
+            os.path.join(storedir, f"{family}.json"))
+
+def source_files(family, outdir="covid_data"):
+    """
+    Paths of the downloaded files a cube is built from.
+    Args:
+        family (str): 'usa' or 'world'.
+        outdir (str): Name of directory data is downloaded to.
+    Returns:
+        filenames (list): Paths of the cases, deaths and vaccination files.
+    """
+    return [os.path.join(outdir, get_data.data_filename(family)),
+            os.path.join(outdir, get_data.data_filename(family, deaths=True)),
+            os.path.join(outdir, get_data.data_filename(family, vax=True))]
+
+def _source_digests(family, outdir):
+    filenames = source_files(family, outdir) + [get_data.population_file(family)]
+    return [frame_cache.file_digest(filename) for filename in filenames]
+
+def build_store(family, outdir="covid_data"):
+    """
+    Download (if needed) and read all metrics for a region family, and
+    write them to the memory-mapped cube.
+    Args:
+        family (str): 'usa' or 'world'.
+        outdir (str): Name of directory data is downloaded to.
+    """
+    cases_file = get_data.download_data(family, outdir=outdir)
+    deaths_file = get_data.download_data(family, deaths=True, outdir=outdir)
+    vax_file = get_data.download_vaccine_data(family, outdir=outdir)
+    cases, pops = get_data.read_data(cases_file, family)
+    deaths, _ = get_data.read_data(deaths_file, family)
+    vax, _ = get_data.read_vaccine_data(vax_file, family)
+    partial, fully = get_data.vax_by_region(vax)
+    frames = [cases, deaths, partial, fully]
+
+    regions = cases.columns.union(deaths.columns)
+    dates = cases.index
+    for df in frames[1:]:
+        dates = dates.union(df.index)
+    populations = pops.reindex(columns=regions).iloc[0].to_numpy(dtype=float)
+
+    cubefile, metafile = store_paths(family, outdir)
+    os.makedirs(os.path.dirname(cubefile), exist_ok=True)
+    tmpcube = f"{cubefile}.{os.getpid()}.tmp"
+    shape = (len(METRICS), len(dates), len(regions))
+    cube = np.memmap(tmpcube, dtype=np.float32, mode="w+", shape=shape)
+    for i, df in enumerate(frames):
+        cube[i] = df.reindex(index=dates, columns=regions).to_numpy(dtype=np.float32)
+    cube.flush()
+    del cube
+
+    meta = {"version": STORE_VERSION, "metrics": METRICS,
+            "dates": [f"{d:%Y-%m-%d}" for d in dates],
+            "regions": regions.to_list(),
+            "populations": [None if np.isnan(p) else p for p in populations],
+            "sources": _source_digests(family, outdir)}
+    tmpmeta = f"{metafile}.{os.getpid()}.tmp"
+    with open(tmpmeta, "w") as f1:
+        json.dump(meta, f1)
+    # Processes that already mapped the old cube keep their (unlinked) copy
+    os.replace(tmpcube, cubefile)
+    os.replace(tmpmeta, metafile)
+    print(f"Built {cubefile} {shape}")
+
+def _is_current(family, outdir):
+    cubefile, metafile = store_paths(family, outdir)
+    try:
+        with open(metafile) as f1:
+            meta = json.load(f1)
+        return meta["version"] == STORE_VERSION and os.path.exists(cubefile) \
+            and meta["sources"] == _source_digests(family, outdir)
+    except (OSError, ValueError, KeyError):
+        return False
+
+def open_store(family, outdir="covid_data", refresh=True):
+    """
+    Open the cube for a region family, building it first if it does not
+    exist or if its source files changed since it was built.
+    Args:
+        family (str): 'usa' or 'world'.
+        outdir (str): Name of directory data is downloaded to.
+        refresh (Bool): If True, download newer source files (subject to
+            get_data.MAX_AGE) before checking whether the cube is current.
+    Returns:
+        store (:obj:`DataStore`): Memory-mapped store.
+    """
+    if refresh is True:
+        get_data.fetch_all([os.path.basename(f) for f in source_files(family, outdir)],
+                           outdir=outdir)
+    cubefile, metafile = store_paths(family, outdir)
+    os.makedirs(os.path.dirname(cubefile), exist_ok=True)
+    if not _is_current(family, outdir):
+        # Only one process builds, the others wait and reuse its result
+        with get_data.file_lock(cubefile):
+            if not _is_current(family, outdir):
+                build_store(family, outdir)
+    # Do not read the sidecar while another process is replacing the cube
+    with get_data.file_lock(cubefile, shared=True):
+        return DataStore(family, outdir)
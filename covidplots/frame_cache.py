@@ -0,0 +1,187 @@
+"""
+On-disk cache of parsed DataFrames, so that a CSV file is only parsed again
+when its contents (or the population files read along with it) change.
+
+Frames are stored in uncompressed .npz files, one array per block of
+values, index and column labels. Loading them back does not involve any
+text parsing.
+"""
+
+import glob
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+# Bump when the layout of cached frames (or how they are computed) changes,
+# so that stale cache files are ignored.
+CACHE_VERSION = 3
+CACHE_SUBDIR = "parsed"
+CACHE_STATS = {"hits": 0, "misses": 0}
+_DIGESTS = {}
+
+def cache_stats():
+    """
+    Report how many parsed frames were served from the cache.
+    Returns:
+        stats (dict): Number of cache hits and misses.
+    """
+    return dict(CACHE_STATS)
+
+def file_digest(*filenames):
+    """
+    Hash the contents of one or more files. Digests are remembered for as
+    long as a file keeps the same size and modification time.
+    Args:
+        filenames (str): Paths of files to hash.
+    Returns:
+        digest (str): Hex SHA1 digest of the concatenated file contents.
+    """
+    h = hashlib.sha1()
+    for filename in filenames:
+        st = os.stat(filename)
+        stamp = (os.path.abspath(filename), st.st_size, st.st_mtime_ns)
+        if stamp not in _DIGESTS:
+            fh = hashlib.sha1()
+            with open(filename, "rb") as f1:
+                for chunk in iter(lambda: f1.read(1024 * 1024), b""):
+                    fh.update(chunk)
+            _DIGESTS[stamp] = fh.hexdigest()
+        h.update(_DIGESTS[stamp].encode())
+    return h.hexdigest()
+
+def cache_path(filename, tag, digest):
+    """
+    Path of the cache file holding frames parsed from filename.
+    Args:
+        filename (str): Path of the source CSV file.
+        tag (str): Distinguishes different ways of parsing the same file,
+            e.g. the region family.
+        digest (str): Content digest of all inputs.
+    Returns:
+        path (str): Path of .npz cache file, in a parsed/ directory next to
+            the source file.
+    """
+    cachedir = os.path.join(os.path.dirname(filename), CACHE_SUBDIR)
+    basename = os.path.basename(filename)
+    return os.path.join(cachedir, f"{basename}.{tag}.{digest}.npz")
+
+def _label_array(labels):
+    """ Convert index or column labels to an array that needs no pickling. """
+    if isinstance(labels, pd.DatetimeIndex):
+        return labels.values
+    return np.asarray(labels, dtype=str)
+
+def _frame_arrays(df, prefix):
+    """
+    Split a frame into plain arrays, grouping columns that share a dtype.
+    Args:
+        df (:obj:`pandas.DataFrame`): Frame to store.
+        prefix (str): Prefix of the array names.
+    Returns:
+        arrays (dict): Arrays to save.
+    """
+    names = [df.index.name, df.columns.name]
+    arrays = {f"{prefix}index": _label_array(df.index),
+              f"{prefix}columns": _label_array(df.columns),
+              f"{prefix}names": np.array([n or "" for n in names], dtype=str),
+              f"{prefix}hasnames": np.array([n is not None for n in names])}
+    dtypes = df.dtypes
+    if len(set(dtypes)) == 1 and dtypes.iloc[0] != object:
+        arrays[f"{prefix}values"] = df.to_numpy()
+        return arrays
+    for i, col in enumerate(df.columns):
+        values = df.iloc[:, i]
+        if values.dtype == object:
+            arrays[f"{prefix}na{i}"] = values.isna().to_numpy()
+            values = values.fillna("").to_numpy(dtype=str)
+        arrays[f"{prefix}col{i}"] = np.asarray(values)
+    return arrays
+
+def _arrays_frame(arrays, prefix):
+    """
+    Rebuild a frame stored by _frame_arrays.
+    Args:
+        arrays (:obj:`numpy.lib.npyio.NpzFile`): Loaded arrays.
+        prefix (str): Prefix of the array names.
+    Returns:
+        df (:obj:`pandas.DataFrame`): Stored frame.
+    """
+    names = [str(n) if has else None for n, has in
+             zip(arrays[f"{prefix}names"], arrays[f"{prefix}hasnames"])]
+    index = pd.Index(arrays[f"{prefix}index"], name=names[0])
+    columns = pd.Index(arrays[f"{prefix}columns"], name=names[1])
+    if f"{prefix}values" in arrays:
+        return pd.DataFrame(arrays[f"{prefix}values"], index=index,
+                            columns=columns)
+    data = {}
+    for i, col in enumerate(columns):
+        values = arrays[f"{prefix}col{i}"]
+        if f"{prefix}na{i}" in arrays:
+            values = values.astype(object)
+            values[arrays[f"{prefix}na{i}"]] = np.nan
+        data[i] = values
+    df = pd.DataFrame(data, index=index)
+    df.columns = columns
+    return df
+
+def load_frames(filename, tag, digest):
+    """
+    Load frames previously parsed from filename.
+    Args:
+        filename (str): Path of the source CSV file.
+        tag (str): Distinguishes different ways of parsing the same file.
+        digest (str): Content digest of all inputs.
+    Returns:
+        frames (list): Cached frames, or None if there are none.
+    """
+    path = cache_path(filename, tag, digest)
+    try:
+        with np.load(path, allow_pickle=False) as arrays:
+            n = int(arrays["nframes"])
+            frames = [_arrays_frame(arrays, f"f{i}_") for i in range(n)]
+    except (OSError, KeyError, ValueError):
+        CACHE_STATS["misses"] += 1
+        return None
+    CACHE_STATS["hits"] += 1
+    return frames
+
+def save_frames(filename, tag, digest, frames):
+    """
+    Store frames parsed from filename, replacing any older version.
+    Args:
+        filename (str): Path of the source CSV file.
+        tag (str): Distinguishes different ways of parsing the same file.
+        digest (str): Content digest of all inputs.
+        frames (list): Frames to store.
+    """
+    path = cache_path(filename, tag, digest)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = {"nframes": np.array(len(frames))}
+    for i, df in enumerate(frames):
+        arrays.update(_frame_arrays(df, f"f{i}_"))
+    # Files from older versions of the source are of no further use
+    stale = glob.glob(cache_path(filename, tag, "*"))
+    tmppath = f"{path}.{os.getpid()}.tmp"
+    with open(tmppath, "wb") as f1:
+        np.savez(f1, **arrays)
+    os.replace(tmppath, path)
+    for oldpath in stale:
+        if oldpath != path:
+            try:
+                os.remove(oldpath)
+            except OSError:
+                pass
+
+def frames_digest(filename, *others):
+    """
+    Digest identifying the parsed result of a CSV file and its companions.
+    Args:
+        filename (str): Path of the source CSV file.
+        others (str): Paths of other files the result depends on, such as
+            population files.
+    Returns:
+        digest (str): Hex digest, also covering CACHE_VERSION.
+    """
+    return f"v{CACHE_VERSION}-{file_digest(filename, *others)}"
@@ -1,53 +1,307 @@
+import numpy as np
 import pandas as pd
 import requests
+import json
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import lru_cache, partial
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
 
+from covidplots import _memo, cleaning, counties, frame_cache, ingest, profiling, schema
 from covidplots.continents import fix_jhu_df, fix_census_df, fix_owid_df
 
 JHU_URL = "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series"
 OWID_URL = "https://raw.githubusercontent.com/owid/covid-19-data/master/public/data/vaccinations"
+US_POP_FILE = "geo_pop_data/nst-pop2020.csv"
+WORLD_POP_FILE = "geo_pop_data/Census_data_2020_world_regions.csv"
 
-def download_vaccine_data(region, url=OWID_URL, outdir="covid_data"):
+# Local copies younger than this (in seconds) are used without contacting
+# upstream at all. Older copies are revalidated with a conditional GET.
+MAX_AGE = 43200 # 12 hours
+# Connect/read timeout in seconds for each individual download
+TIMEOUT = 60
+# Downloads are streamed to disk in chunks of this many bytes
+CHUNK_SIZE = 1024 * 1024
+HTTP_CACHE_FILE = ".http_cache.json"
+CACHE_STATS = {"hits": 0, "misses": 0}
+# Guards CACHE_STATS and the validators file when downloading in threads
+_CACHE_LOCK = threading.Lock()
+# Number of parsed files get_data keeps in memory
+MEMO_SIZE = 8
+MEMO_STATS = {"hits": 0, "misses": 0}
+_MEMO = _memo.Memo(MEMO_SIZE, MEMO_STATS)
+
+# Every file the plotting scripts can use, and where it lives upstream
+SOURCES = {"time_series_covid19_confirmed_US.csv": JHU_URL,
+           "time_series_covid19_deaths_US.csv": JHU_URL,
+           "time_series_covid19_confirmed_global.csv": JHU_URL,
+           "time_series_covid19_deaths_global.csv": JHU_URL,
+           "us_state_vaccinations.csv": OWID_URL,
+           "vaccinations.csv": OWID_URL}
+
+def cache_stats():
     """
-    Download CSV file from Our World In Data.
+    Report how many downloads were served from the local cache.
+    Returns:
+        stats (dict): Number of cache hits (local copy still valid, either
+            because it is fresh or because upstream answered 304 Not Modified)
+            and misses (file body downloaded).
+    """
+    return dict(CACHE_STATS)
+
+def _count(key):
+    with _CACHE_LOCK:
+        CACHE_STATS[key] += 1
+
+def _read_http_cache(outdir):
+    """
+    Read the ETag/Last-Modified validators stored for files in outdir.
+    Args:
+        outdir (str): Name of directory files are downloaded to.
+    Returns:
+        validators (dict): For each filename, the stored response validators.
+    """
+    cachefile = os.path.join(outdir, HTTP_CACHE_FILE)
+    try:
+        with open(cachefile) as f1:
+            return json.load(f1)
+    except (OSError, ValueError):
+        return {}
+
+def _update_http_cache(outdir, key, response, drop=None):
+    """
+    Persist the ETag/Last-Modified validators of a response.
+    Args:
+        outdir (str): Name of directory files are downloaded to.
+        key (str): Name to store the validators under, usually the name
+            of the downloaded file.
+        response (:obj:`requests.Response`): Response the file came from.
+        drop (str): Name of an entry to remove at the same time.
+    """
+    with _CACHE_LOCK:
+        validators = _read_http_cache(outdir)
+        validators[key] = {"etag": response.headers.get("ETag"),
+                           "last_modified": response.headers.get("Last-Modified")}
+        validators.pop(drop, None)
+        cachefile = os.path.join(outdir, HTTP_CACHE_FILE)
+        tmpfile = f"{cachefile}.{os.getpid()}.tmp"
+        with open(tmpfile, "w") as f1:
+            json.dump(validators, f1, indent=1)
+        os.replace(tmpfile, cachefile)
+
+def data_filename(region, deaths=False, vax=False):
+    """
+    Name of the upstream CSV file holding the data for a region.
     Args:
         region (str): Country of interest. Acceptable values are 'world', 
             'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
-        url (str): URL of OWID repository+directory that houses CSV files.
-        outdir (str): Name of directory to download data to.
+        deaths (Bool): If True, name the file with data on deaths.
+        vax (Bool): If True, name the OWID vaccination file.
     Returns:
-        outfilename (str): Path of downloaded file.
+        filename (str): Name of CSV file, a key of SOURCES.
     """
 
     if region in ["usa", "us", "worst_usa"]:
-        filename = "us_state_vaccinations.csv"
+        if vax is True:
+            filename = "us_state_vaccinations.csv"
+        elif deaths is True:
+            filename = "time_series_covid19_deaths_US.csv"
+        else:
+            filename = "time_series_covid19_confirmed_US.csv"
     else:
-        filename = "vaccinations.csv"
-   
-    if not os.path.exists(outdir):
-        os.mkdir(outdir)
+        if vax is True:
+            filename = "vaccinations.csv"
+        elif deaths is True:
+            filename = "time_series_covid19_deaths_global.csv"
+        else:
+            filename = "time_series_covid19_confirmed_global.csv"
+    return filename
+
+@contextmanager
+def file_lock(path, shared=False):
+    """
+    Hold a cross-process lock on path while the block runs. Processes
+    refreshing the same file in covid_data/ take turns instead of racing.
+    Locking is a no-op on platforms without fcntl.
+    Args:
+        path (str): Path of the file to lock. The lock itself lives in a 
+            separate path+".lock" file.
+        shared (Bool): If True, take a shared (reader) lock instead of an
+            exclusive one.
+    """
+    with open(f"{path}.lock", "a") as lockfile:
+        if fcntl is not None:
+            fcntl.flock(lockfile, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lockfile, fcntl.LOCK_UN)
+
+def download_file(filename, url, outdir="covid_data", max_age=MAX_AGE,
+                  session=None, timeout=TIMEOUT):
+    """
+    Download a file, reusing the local copy whenever upstream has not changed.
+    A local copy younger than max_age is used as is. Otherwise the request
+    carries the stored ETag/Last-Modified validators, so an unchanged file
+    costs a single 304 round trip instead of a full download.
+    The body is streamed in chunks to a .part file that is atomically 
+    renamed into place once complete, so readers never see a half-written
+    file. An interrupted transfer is resumed with a Range request.
+    Args:
+        filename (str): Name of file to download.
+        url (str): URL of repository+directory that houses the file.
+        outdir (str): Name of directory to download data to.
+        max_age (float): Age in seconds under which a local copy is used
+            without contacting upstream. Use 0 to always revalidate.
+        session (:obj:`requests.Session`): Session to download with, so
+            connections can be kept alive between files.
+        timeout (float): Connect and read timeout in seconds.
+    Returns:
+        outfilename (str): Path of downloaded file.
+    """
+
+    os.makedirs(outdir, exist_ok=True)
     
     outfilename = os.path.join(outdir, filename)
-    if os.path.exists(outfilename):
-        filetime = os.path.getmtime(outfilename)
-        now = time.time()
-        if now - filetime <= 43200: #43200s = 12 hours
-            print(f"File {outfilename} already up to date")
-            return outfilename
-        else:
-            os.remove(outfilename)
+    partfilename = f"{outfilename}.part"
+    # Another process may be refreshing this file, wait for it and
+    # then check whether its copy is fresh enough for us.
+    with file_lock(outfilename):
+        headers = {"Accept-Encoding": "gzip"}
+        stored = _read_http_cache(outdir)
+        if os.path.exists(partfilename):
+            # Resume where the interrupted transfer stopped. The partial file
+            # holds decoded bytes, so ask for the unencoded representation.
+            validator = stored.get(f"{filename}.part", {})
+            validator = validator.get("etag") or validator.get("last_modified")
+            if validator:
+                headers = {"Accept-Encoding": "identity", "If-Range": validator,
+                           "Range": f"bytes={os.path.getsize(partfilename)}-"}
+        elif os.path.exists(outfilename):
+            filetime = os.path.getmtime(outfilename)
+            now = time.time()
+            if now - filetime <= max_age:
+                print(f"File {outfilename} already up to date")
+                _count("hits")
+                return outfilename
+            validators = stored.get(filename, {})
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
 
-    download = requests.get(os.path.join(url,filename))
+        if session is None:
+            session = requests
+        retry = False
+        with session.get(os.path.join(url,filename), headers=headers,
+                         timeout=timeout, stream=True) as download:
+            if download.status_code == 304:
+                # Restart the max_age window, the local copy is still current
+                os.utime(outfilename)
+                _count("hits")
+                print(f"File {outfilename} not modified upstream")
+                return outfilename
+            if download.status_code == 416:
+                # The partial file cannot be resumed, start over below
+                # once the lock is released
+                os.remove(partfilename)
+                retry = True
+            else:
+                download.raise_for_status()
+                # Anything but a 206 means upstream sent the whole file
+                if download.status_code == 206:
+                    mode = "ab"
+                else:
+                    mode = "wb"
+                    _update_http_cache(outdir, f"{filename}.part", download)
+                with open(partfilename, mode) as f1:
+                    for chunk in download.iter_content(chunk_size=CHUNK_SIZE):
+                        f1.write(chunk)
+                os.replace(partfilename, outfilename)
+                _count("misses")
+                _update_http_cache(outdir, filename, download, 
+                                   drop=f"{filename}.part")
 
-    with open(outfilename,'w') as f1:
-        f1.write(download.content.decode())
+    if retry is True:
+        return download_file(filename, url, outdir=outdir, max_age=max_age,
+                             session=session, timeout=timeout)
 
     print(f" ⬇️  Downloaded {outfilename}")
 
     return outfilename
 
-def download_data(region, deaths=False, url=JHU_URL, outdir="covid_data"):
+@profiling.timed("download")
+def fetch_all(filenames=None, outdir="covid_data", max_age=MAX_AGE,
+              max_workers=4, timeout=TIMEOUT, sources=SOURCES):
+    """
+    Download several JHU/OWID files concurrently over one keep-alive session.
+    Files that fail to download are reported and left out of the result, so
+    a later get_data call can retry them on its own.
+    Args:
+        filenames (list): Names of files to download, keys of sources. 
+            By default, every file in sources.
+        outdir (str): Name of directory to download data to.
+        max_age (float): Age in seconds under which a local copy is used
+            without contacting upstream.
+        max_workers (int): Maximum number of simultaneous downloads.
+        timeout (float): Connect and read timeout in seconds, per file.
+        sources (dict): For each filename, URL of the directory housing it.
+    Returns:
+        outfilenames (dict): For each filename, path of the downloaded file.
+    """
+
+    if filenames is None:
+        filenames = list(sources)
+    filenames = list(dict.fromkeys(filenames))
+    os.makedirs(outdir, exist_ok=True)
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=max_workers,
+                                            pool_maxsize=max_workers)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    outfilenames = {}
+    with session, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(download_file, filename, sources[filename],
+                               outdir=outdir, max_age=max_age, 
+                               session=session, timeout=timeout): filename
+                   for filename in filenames}
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                outfilenames[filename] = future.result()
+            except (requests.RequestException, OSError) as e:
+                print(f"!!! could not download {filename}: {e}")
+    return outfilenames
+
+@profiling.timed("download")
+def download_vaccine_data(region, url=OWID_URL, outdir="covid_data", max_age=MAX_AGE):
+    """
+    Download CSV file from Our World In Data.
+    Args:
+        region (str): Country of interest. Acceptable values are 'world', 
+            'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
+        url (str): URL of OWID repository+directory that houses CSV files.
+        outdir (str): Name of directory to download data to.
+        max_age (float): Age in seconds under which a local copy is used
+            without contacting upstream.
+    Returns:
+        outfilename (str): Path of downloaded file.
+    """
+
+    filename = data_filename(region, vax=True)
+    return download_file(filename, url, outdir=outdir, max_age=max_age)
+
+@profiling.timed("download")
+def download_data(region, deaths=False, url=JHU_URL, outdir="covid_data", max_age=MAX_AGE):
     """
     Download CSV files from JHU.
     Args:
@@ -56,44 +310,77 @@ def download_data(region, deaths=False, url=JHU_URL, outdir="covid_data"):
         deaths (Bool): If True, download data on deaths.
         url (str): URL of JHU repository+directory that houses CSV files.
         outdir (str): Name of directory to download data to.
+        max_age (float): Age in seconds under which a local copy is used
+            without contacting upstream.
     Returns:
         outfilename (str): Path of downloaded CSV file.
     """
 
+    filename = data_filename(region, deaths=deaths)
+    return download_file(filename, url, outdir=outdir, max_age=max_age)
+
+def population_file(region):
+    """
+    Path of the census file with populations for a region.
+    Args:
+        region (str): Country of interest. Acceptable values are 'world', 
+            'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
+    Returns:
+        filename (str): Path of population CSV file.
+    """
     if region in ["usa", "us", "worst_usa"]:
-        if deaths is True:
-            filename = "time_series_covid19_deaths_US.csv"
-        else:
-            filename = "time_series_covid19_confirmed_US.csv"
+        return US_POP_FILE
     else:
-        if deaths is True:
-            filename = "time_series_covid19_deaths_global.csv"
-        else:
-            filename = "time_series_covid19_confirmed_global.csv"
-   
-    if not os.path.exists(outdir):
-        os.mkdir(outdir)
-    
-    outfilename = os.path.join(outdir, filename)
-    if os.path.exists(outfilename):
-        filetime = os.path.getmtime(outfilename)
-        now = time.time()
-        if now - filetime <= 43200: #43200s = 12 hours
-            print(f"File {outfilename} already up to date")
-            return outfilename
-        else:
-            os.remove(outfilename)
-
-    download = requests.get(os.path.join(url,filename))
+        return WORLD_POP_FILE
 
-    with open(outfilename,'w') as f1:
-        f1.write(download.content.decode())
+def read_pops(region):
+    """
+    Read the census populations for a region.
+    Args:
+        region (str): Country of interest. Acceptable values are 'world', 
+            'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
+    Returns:
+        pops (:obj:`pandas.DataFrame`): One row, one column per state or
+            country (census spelling). Callers may modify it freely.
+    """
+    return _read_pops(population_file(region)).copy()
 
-    print(f" ⬇️  Downloaded {outfilename}")
+@lru_cache(maxsize=None)
+def _read_pops(filename):
+    # The census files never change, so each is only parsed once per process
+    if filename == US_POP_FILE:
+        pops0 = schema.read_us_pops(filename)
+    else:
+        pops0 = schema.read_world_pops(filename)
+        pops0.drop_duplicates(subset="Country", inplace=True) 
+        pops0.drop(columns=['Region'], inplace=True)
+        pops0.set_index("Country", inplace=True)
+    return pops0.T
 
-    return outfilename
+def _cached(reader, filename, region, tag):
+    """
+    Call reader(filename, region), or load its result from the parsed frame
+    cache if neither the CSV file nor the population file changed since.
+    Args:
+        reader (function): Function parsing the CSV file.
+        filename (str): Path of downloaded CSV file.
+        region (str): Country of interest.
+        tag (str): Name of the reader, part of the cache key.
+    Returns:
+        data (:obj:`pandas.DataFrame`): Statistics on region of interest.
+        pops (:obj:`pandas.DataFrame`): Population statistics on region of interest.
+        Any further frames returned by reader follow.
+    """
+    tag = f"{tag}-{region_family(region)}"
+    digest = frame_cache.frames_digest(filename, population_file(region))
+    frames = frame_cache.load_frames(filename, tag, digest)
+    if frames is None:
+        frames = reader(filename, region)
+        frame_cache.save_frames(filename, tag, digest, frames)
+    return tuple(frames)
 
-def read_vaccine_data(filename, region):
+@profiling.timed("read_vaccine_data", rows=profiling.records)
+def read_vaccine_data(filename, region, cache=True):
     """
     Read data from OWID CSV files and format into a pandas DataFrame.
     Global populations from here:
@@ -102,37 +389,39 @@ def read_vaccine_data(filename, region):
         filename (str): Path of downloaded CSV file.
         region (str): Country of interest. Acceptable values are 'world', 
             'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
+        cache (Bool): If True, reuse the result of an earlier call on the
+            same file contents instead of parsing the CSV file again.
     Returns:
         data (:obj:`pandas.DataFrame`): Vaccine statistics on region of interest.
         pops (:obj:`pandas.DataFrame`): Population statistics on region of interst.
     """
+    if cache is True:
+        return _cached(_read_vaccine_data, filename, region, "owid")
+    return _read_vaccine_data(filename, region)
+
+def _read_vaccine_data(filename, region):
+    data = schema.read_owid(filename)
     if region in ["usa", "us", "worst_usa"]:
-        data = pd.read_csv(filename)
         data = fix_owid_df(data, world=False)
-        data.drop(data.loc[data["location"] == "United States"].index, inplace=True)
-        pops0 = pd.read_csv('geo_pop_data/nst-pop2020.csv',index_col='State')
-        pops = pops0.T
+        pops = read_pops(region)
     else:
-        data = pd.read_csv(filename)
         data = fix_owid_df(data)
-        pops0 = pd.read_csv("geo_pop_data/Census_data_2020_world_regions.csv", skiprows=1)
-        pops0.drop_duplicates(subset="Country", inplace=True) 
-        pops0.drop(columns=['Region', 'Year', 'Area (sq. km.)',
-               'Density (persons per sq. km.)'], inplace=True)
-        pops0.set_index("Country", inplace=True)
-        pops = pops0.T
+        pops = read_pops(region)
         pops = fix_census_df(pops, countries=list(set(data["location"])))
 
-    data["date"] = pd.to_datetime(data["date"])
-
     return data, pops
 
+@profiling.timed("vax_by_region", rows=profiling.records)
 def vax_by_region(data):
     """
     Convert the OWID vaccination dataframe so that each column is a country/state,
     and the index is the date. Create a DF for number of people fully vaccinated
     and number of people partially vaccinated.
 
+    Dates and locations are factorized once and both metrics are scattered
+    into one preallocated array, which is then forward filled along the
+    date axis in a single vectorised pass.
+
     Args:
         data (:obj:`pandas.DataFrame`): Vaccine statistics.
     Returns:
@@ -142,23 +431,32 @@ def vax_by_region(data):
             each country/state.
     """
     
-    partial = data[['date', 'location', 'people_vaccinated']].copy()
-    fully = data[['date', 'location', 'people_fully_vaccinated']].copy()
-    fully = fully.pivot(index='date', 
-        columns=[x for x in fully.columns if x not in ['date', 'people_fully_vaccinated']],
-        values='people_fully_vaccinated').reset_index()
-    partial = partial.pivot(index='date', 
-        columns=[x for x in partial.columns if x not in ['date', 'people_vaccinated']],
-        values='people_vaccinated').reset_index()
-    partial.set_index('date', inplace=True)
-    fully.set_index('date', inplace=True)
-    partial = partial.fillna(method='ffill')
-    partial = partial.fillna(0)
-    fully = fully.fillna(method='ffill')
-    fully = fully.fillna(0)
+    date_codes, dates = pd.factorize(data["date"], sort=True)
+    loc_codes, locs = pd.factorize(data["location"], sort=True)
+    values = data[["people_vaccinated", "people_fully_vaccinated"]].to_numpy(dtype=float)
+    valid = (date_codes >= 0) & (loc_codes >= 0)
+    if not valid.all():
+        date_codes, loc_codes, values = date_codes[valid], loc_codes[valid], values[valid]
+    cells = date_codes * len(locs) + loc_codes
+    if len(np.unique(cells)) != len(cells):
+        raise ValueError("Index contains duplicate entries, cannot reshape")
+
+    cube = np.full((2, len(dates), len(locs)), np.nan)
+    cube[:, date_codes, loc_codes] = values.T
+    # Forward fill: index of the last valid date at or before each date
+    last = np.where(np.isnan(cube), 0, np.arange(len(dates))[None, :, None])
+    np.maximum.accumulate(last, axis=1, out=last)
+    cube = np.take_along_axis(cube, last, axis=1)
+    cube[np.isnan(cube)] = 0
+
+    index = pd.DatetimeIndex(dates, name="date")
+    columns = pd.Index(locs, name="location")
+    partial = pd.DataFrame(cube[0], index=index, columns=columns)
+    fully = pd.DataFrame(cube[1], index=index, columns=columns)
     return partial, fully
 
-def read_data(filename, region):
+@profiling.timed("read_data", rows=profiling.records)
+def read_data(filename, region, cache=True, incremental=True, clean=None):
     """
     Read data from JHU CSV files and format into a pandas DataFrame.
     Global populations from here:
@@ -167,34 +465,33 @@ def read_data(filename, region):
         outfilename (str): Path of downloaded CSV file.
         region (str): Country of interest. Acceptable values are 'world', 
             'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
+        cache (Bool): If True, reuse the result of an earlier call on the
+            same file contents instead of parsing the CSV file again.
+        incremental (Bool): If True and the file changed, only parse the
+            date columns added since it was last read (unless JHU revised
+            earlier data).
+        clean (str): If given, fix negative daily counts and backlog dumps
+            with this cleaning strategy (see cleaning.STRATEGIES).
     Returns:
         data (:obj:`pandas.DataFrame`): Covid statistics on region of interest.
         pops (:obj:`pandas.DataFrame`): Population statistics on region of interst.
+        report (:obj:`pandas.DataFrame`): Changes made by cleaning, only
+            returned if clean is given.
     """
+    reader = partial(_read_data, incremental=incremental, clean=clean)
+    if cache is True:
+        tag = "jhu" if clean is None else f"jhu-{clean}"
+        return _cached(reader, filename, region, tag)
+    return reader(filename, region)
+
+def _read_data(filename, region, incremental=True, clean=None):
     if region in ["usa", "us", "worst_usa"]:
-        a = pd.read_csv(filename, index_col='UID')
-        a.drop(columns=['iso2', 'iso3', 'code3', 'FIPS', 'Admin2', 
-                    'Country_Region','Lat','Long_','Combined_Key'], 
-                    inplace=True)
-        b = a.groupby('Province_State').sum()
-        pops0 = pd.read_csv('geo_pop_data/nst-pop2020.csv',index_col='State')
-        pops = pops0.T
+        # State totals of the county store, shared with county-level users
+        b = counties.open_counties(filename, incremental=incremental).state_frame()
     else:
-        a = pd.read_csv(filename)
-        b = a.groupby('Country/Region').sum()
-        b.drop(columns=['Lat','Long'], inplace=True)
-        
-        pops0 = pd.read_csv("geo_pop_data/Census_data_2020_world_regions.csv", skiprows=1)
-        pops0.drop_duplicates(subset="Country", inplace=True) 
-        pops0.drop(columns=['Region', 'Year', 'Area (sq. km.)',
-               'Density (persons per sq. km.)'], inplace=True)
-        pops0.set_index("Country", inplace=True)
-        pops = pops0.T
-    try:
-        b.drop(columns="Population", inplace=True)
-    except KeyError:
-        pass
-    dt_index = pd.to_datetime(b.columns)
+        b = ingest.ingest_jhu(filename, 'Country/Region', incremental=incremental)
+    pops = read_pops(region)
+    dt_index = schema.jhu_dates(b.columns)
     data = b.T
     data.index = dt_index
 
@@ -203,15 +500,85 @@ def read_data(filename, region):
         data = fix_jhu_df(data)
         pops = fix_census_df(pops, countries=list(data.columns))
 
+    if clean is not None:
+        data, report = cleaning.clean(data, clean, cache=False)
+        # Shown with --profile; cleaning_report has the details
+        profiling.count(len(report), "cleaned")
+        return data, pops, report
     return data, pops
 
-def get_data(region, deaths=False, vax=False):
+def region_family(region):
+    """
+    Region family whose files hold the data for a region.
+    Args:
+        region (str): Country of interest. Acceptable values are 'world', 
+            'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
+    Returns:
+        family (str): 'usa' or 'world'.
+    """
+    if region in ["usa", "us", "worst_usa"]:
+        return "usa"
+    else:
+        return "world"
+
+def memo_stats():
+    """
+    Report how many get_data calls were served from memory.
+    Returns:
+        stats (dict): Number of hits and misses of the in-memory cache.
+    """
+    return dict(MEMO_STATS)
+
+def invalidate(filename=None):
+    """
+    Drop parsed files from the in-memory cache of get_data.
+    Args:
+        filename (str): Path of the CSV file to drop. If None, drop all.
+    """
+    if filename is None:
+        _MEMO.clear()
+    else:
+        path = os.path.abspath(filename)
+        _MEMO.clear(lambda key: key[0] == path)
+
+def _memoised(reader, filename, region, kind):
+    """
+    Call reader(filename, region), or reuse the frames of an earlier call
+    on the same file contents for the same region family.
+    Args:
+        reader (function): Function reading the CSV file.
+        filename (str): Path of downloaded CSV file.
+        region (str): Country of interest.
+        kind (str): Name of the reader, part of the cache key.
+    Returns:
+        data (:obj:`pandas.DataFrame`): Statistics on region of interest.
+        pops (:obj:`pandas.DataFrame`): Population statistics on region of interest.
+        Any further frames returned by reader follow.
+    """
+    key = (os.path.abspath(filename),
+           frame_cache.frames_digest(filename, population_file(region)),
+           region_family(region), kind)
+    frames = _MEMO.get(key)
+    if frames is None:
+        frames = tuple(_memo.read_only(df, copy=True) for df in reader(filename, region))
+        _MEMO.put(key, frames)
+    # Callers may add or replace columns without affecting each other
+    return tuple(df.copy(deep=False) for df in frames)
+
+@profiling.timed("get_data")
+def get_data(region, deaths=False, vax=False, clean=None):
     """
     Convenience function to download and read JHU CSV files.
+    Files are parsed once per process (see MEMO_SIZE and invalidate), so
+    regions of the same family share their data. Count data is read-only;
+    copy it before modifying values in place.
     Args:
         region (str): Country of interest. Acceptable values are 'world', 
             'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
         deaths (Bool): If True, download data on deaths.
+        clean (str): If given, fix negative daily counts and backlog dumps
+            of JHU data with this cleaning strategy (see
+            cleaning.STRATEGIES). Vaccination data is never cleaned.
     Returns:
         data (:obj:`pandas.DataFrame`): Covid statistics on region of interest.
         pops (:obj:`pandas.DataFrame`): Population statistics on region of interst.
@@ -219,8 +586,29 @@ def get_data(region, deaths=False, vax=False):
     
     if vax is True:
         filename = download_vaccine_data(region)
-        data, pops = read_vaccine_data(filename, region)
+        data, pops = _memoised(read_vaccine_data, filename, region, "owid")
+    elif clean is None:
+        filename = download_data(region, deaths=deaths)
+        data, pops = _memoised(read_data, filename, region, "jhu")
     else:
         filename = download_data(region, deaths=deaths)
-        data, pops = read_data(filename, region)
+        data, pops, _ = _memoised(partial(read_data, clean=clean),
+                                  filename, region, f"jhu-{clean}")
     return data, pops
+
+def cleaning_report(region, deaths=False, clean="clamp"):
+    """
+    Changes made by cleaning the data of get_data.
+    Args:
+        region (str): Country of interest. Acceptable values are 'world', 
+            'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
+        deaths (Bool): If True, report on the data on deaths.
+        clean (str): Cleaning strategy (see cleaning.STRATEGIES).
+    Returns:
+        report (:obj:`pandas.DataFrame`): One row per changed region and
+            date, see cleaning.clean.
+    """
+    filename = download_data(region, deaths=deaths)
+    data, pops, report = _memoised(partial(read_data, clean=clean),
+                                   filename, region, f"jhu-{clean}")
+    return report
@@ -5,6 +5,8 @@ matplotlib.use('agg')
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import matplotlib.transforms as transforms
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.patches import Rectangle
 from matplotlib.ticker import AutoMinorLocator, MultipleLocator
 import pandas as pd
@@ -12,7 +14,8 @@ import sys
 import argparse
 import datetime
 
-import get_data
+from covidplots import bars, cleaning, get_data, groups, metrics, output, population
+from covidplots import profiling, ranking, render_cache, scheduler, textlayout
 
 stylesheet = "seaborn-dark"
 #stylesheet = "dark_background"
@@ -49,16 +52,8 @@ ABB = ["AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA",
        "SD", "TN", "TX", "UT", "VT", "VA", "WA", "WV", "WI", "WY"]
 STATES_ABB = dict(zip(STATES,ABB))
 
-EU_COUNTRIES = ['Austria','Belgium','Bulgaria','Croatia','Cyprus','Czechia',
-                'Denmark','Estonia','Finland','France','Germany','Greece',
-                'Hungary','Ireland','Italy','Latvia','Lithuania','Luxembourg',
-                'Malta','Netherlands','Poland','Portugal','Romania','Slovakia',
-                'Slovenia','Spain','Sweden']
-
-LATIN_COUNTRIES = ['Argentina','Belize','Bolivia','Brazil','Chile','Colombia',
-                   'Costa Rica','Cuba','Dominican Republic','Ecuador',
-                   'El Salvador','Guatemala','Honduras','Mexico','Nicaragua',
-                   'Panama','Paraguay','Peru','Uruguay','Venezuela']
+EU_COUNTRIES = groups.EU_COUNTRIES
+LATIN_COUNTRIES = groups.LATIN_COUNTRIES
 
 # Taken from matplotlib, and modified 
 # https://matplotlib.org/3.1.0/gallery/text_labels_and_annotations/rainbow_text.html
@@ -118,32 +113,200 @@ def rainbow_text(x, y, strings, colors, styles=None, weights=None,
     if isinstance(weights, str):
         weights = [weights for x in strings]
     
-    canvas = ax.figure.canvas
-
     assert orientation in ['horizontal', 'vertical']
     if orientation == 'vertical':
         kwargs.update(rotation=90, verticalalignment='bottom')
 
-    for i in range(len(strings)):
-        text = ax.text(x, y, strings[i], color=colors[i], 
-                       transform=t, style=styles[i], weight=weights[i], 
-                       **kwargs)
-
-        # Need to draw to update the text position.
-        text.draw(canvas.get_renderer())
+    texts = [ax.text(x, y, strings[i], color=colors[i], transform=t,
+                     style=styles[i], weight=weights[i], **kwargs)
+             for i in range(len(strings))]
+    bbox = place_words(texts, x, y, t, orientation)
+    if returnt is True:
+        return bbox, texts[-1]
+    else:
+        return bbox
 
-        bbox = text.get_window_extent().transformed(t.inverted())
+def place_words(texts, x, y, t, orientation='horizontal'):
+    """
+    Place texts next to each other, e.g. after changing their strings.
+    Args:
+        texts (list): Text artists, in order.
+        x, y (float): Position of the first text in t coordinates.
+        t (:obj:`matplotlib.transforms.Transform`): Transform of the text
+            coordinates.
+        orientation (str): 'horizontal' or 'vertical'.
+    Returns:
+        bbox (:obj:`matplotlib.transforms.Bbox`): Extent of the last text in
+            t coordinates.
+    """
+    for text in texts:
+        text.set_position((x, y))
+        # Measured from cached font metrics, the text is not drawn
+        bbox = textlayout.text_extent(text).transformed(t.inverted())
         if orientation == "horizontal":
             x = bbox.x1
         else:
             y = bbox.y1
-    if returnt is True:
-        return bbox, text
-    else:
-        return bbox
+    return bbox
+
+class GridFigure:
+    """
+    Grid of one panel per state or country that can be redrawn with new data.
+
+    The figure, its axes, tick locators and formatters, panel labels and
+    legend are built once. render() then only replaces the bars and the
+    moving averages, sets the y-limits and changes the text of the labels,
+    so drawing the same grid for a new day or another metric costs a
+    fraction of building it.
+    """
+
+    def __init__(self, subplots, figsize, lw, labelsize, fontsize, xmin,
+                 colors, renderer=None):
+        """
+        Args:
+            subplots (tuple): Number of rows and columns of panels.
+            figsize (tuple): Figure size in inches.
+            lw (float): Line width of the moving averages.
+            labelsize (str): Font size of tick labels.
+            fontsize (str): Font size of panel labels.
+            xmin (:obj:`datetime.date`): First date shown.
+            colors (dict): Colors of the 'bar', 'contrast' (average) and
+                'last' (last value) elements.
+            renderer (str): How to draw the daily bars, one of bars.RENDERERS.
+        """
+        self.xmin = xmin
+        self.colors = colors
+        self.renderer = renderer
+        # Not a pyplot figure, so that plt.close("all") leaves it open
+        self.fig = Figure(figsize=figsize)
+        FigureCanvasAgg(self.fig)
+        self.axes = self.fig.subplots(subplots[0], subplots[1], sharex=True).flatten()
+        self.fig.subplots_adjust(wspace=0.35, hspace=0.35)
+        self.bars = [None] * len(self.axes)
+        self.lines = []
+        self.titles = []
+        self.lasts = []
+        last_colors = ["black", colors["last"], "black", colors["contrast"]]
+        weights = ["normal", "normal", "normal", "bold"]
+        for ax in self.axes:
+            self.lines.append(ax.plot([], [], c=colors["contrast"], lw=lw, zorder=10)[0])
+
+            ax.tick_params(axis="y", which='major', labelsize=labelsize, length=3)
+            # No label on the first tick (0). Hiding the label of the first
+            # Tick object instead would also hide those of Ticks matplotlib
+            # adds when later data need more of them.
+            ax.get_yaxis().set_major_formatter(
+                matplotlib.ticker.FuncFormatter(lambda x, p: format(int(x), ',') if p != 0 else ""))
+            ax.yaxis.set_ticks_position('both')
+            ax.yaxis.set_major_locator(plt.MaxNLocator(5))
+
+            ax.tick_params(axis="x", which='minor', labelsize=labelsize, length=3)
+            ax.xaxis.set_major_locator(mdates.YearLocator())
+            ax.tick_params(axis='x', which="minor", rotation=45)
+            ax.xaxis.set_minor_formatter(mdates.DateFormatter('%b'))
+            ax.xaxis.set_minor_locator(plt.MaxNLocator(10))
+            ax.tick_params(axis="x", which='major', length=0)
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('\n\n%Y'))
+
+            self.titles.append(ax.annotate("", (0.035, 1.05), xycoords="axes fraction",
+                                           size=fontsize))
+            self.lasts.append([ax.text(0.035, .9, "", color=c, transform=ax.transAxes,
+                                       weight=w, size=fontsize, zorder=15)
+                               for c, w in zip(last_colors, weights)])
+
+        # Legend, centred on the figure
+        words = ["Last: ", "value", "/", "7 day average"]
+        t = self.fig.transFigure
+        probe = self.fig.text(0.5, .945, "".join(words), size='x-large', ha="center")
+        x0 = place_words([probe], 0.5, .945, t).x0
+        probe.remove()
+        legend = [self.fig.text(x0, .945, word, color=c, weight=w, size='x-large')
+                  for word, c, w in zip(words, last_colors, weights)]
+        place_words(legend, x0, .945, t)
+
+    def render(self, dailydata, avg, names, titles, suptitle):
+        """
+        Draw new data in every panel.
+        Args:
+            dailydata (:obj:`pandas.DataFrame`): Daily counts, one column
+                per state or country.
+            avg (:obj:`pandas.DataFrame`): 7 day averages of dailydata.
+            names (list): State or country of each panel, in order. Panels
+                of names not in dailydata are left empty.
+            titles (list): Label of each panel.
+            suptitle (str): Title of the figure.
+        """
+        for i, ax in enumerate(self.axes):
+            if self.bars[i] is not None:
+                self.bars[i].remove()
+                self.bars[i] = None
+            if i >= len(names) or names[i] not in dailydata:
+                # Like a new panel: nothing left from an earlier render
+                self.lines[i].set_data([], [])
+                self.titles[i].set_text("")
+                for text in self.lasts[i]:
+                    text.set_text("")
+                ax.set_ylim(0, 1)
+                ax.tick_params(axis="y", labelleft=False)
+                continue
+            name = names[i]
+            ax.tick_params(axis="y", labelleft=True)
+            # Scale the x-axis to the new dates only
+            ax.ignore_existing_data_limits = True
+            ax.set_autoscalex_on(True)
+            self.bars[i] = bars.daily_bars(ax, dailydata.index, dailydata[name],
+                                           renderer=self.renderer,
+                                           color=self.colors["bar"], zorder=5)
+            self.lines[i].set_data(avg.index, avg[name].to_numpy())
+            max_avg = np.nanmax(avg[name])
+            ax.set_ylim(0, max_avg+0.08*max_avg)
+
+            self.titles[i].set_text(titles[i])
+            lastval = int(dailydata[name][-1])
+            avglastval = int(avg[name][-1])
+            words = ["Last: ", f"{lastval:,}", "/", f"{avglastval:,}"]
+            for text, word in zip(self.lasts[i], words):
+                text.set_text(word)
+            place_words(self.lasts[i], 0.035, .9, ax.transAxes)
+        # The x-axis is shared by all panels
+        self.axes[0].autoscale_view(scaley=False)
+        self.axes[0].set_xlim(self.xmin)
+        self.fig.suptitle(suptitle, fontsize='x-large', y=1.01)
+
+    def save(self, outfilename, profile=None):
+        """
+        Save the figure.
+        Args:
+            outfilename (str): Name of output file.
+            profile (str): Output profile, see output.PROFILES.
+        Returns:
+            report (dict): Output file, format, size and time taken, see
+                output.save_figure.
+        """
+        return output.save_figure(self.fig, outfilename, profile, bbox_inches='tight')
 
+# Figures of grid_plot by layout, reused by later calls in the same process
+_GRIDS = {}
+
+def grid_figure(subplots, figsize, lw, labelsize, fontsize, xmin, colors,
+                renderer=None):
+    """
+    Grid figure of a layout, built on first use. See GridFigure for the
+    arguments.
+    Returns:
+        grid (:obj:`GridFigure`): Figure to render.
+    """
+    key = (subplots, figsize, lw, labelsize, fontsize, xmin,
+           tuple(sorted(colors.items())), renderer)
+    if key not in _GRIDS:
+        _GRIDS[key] = GridFigure(subplots, figsize, lw, labelsize, fontsize,
+                                 xmin, colors, renderer)
+    return _GRIDS[key]
+
+@profiling.timed("grid_plot")
 def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots", 
-              deaths=False, *args, **kwargs):
+              deaths=False, mort=None, renderer=None, output_profile=None, *args,
+              **kwargs):
     """
     Make subplot grid plots for each state/country of interest in list.
     Args:
@@ -153,6 +316,15 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
             'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
         outdir (str): Name of directory to save plots to.
         deaths (Bool): If True, download data on deaths.
+        mort (dict): Mortality rate of US and EU in percent, shown in the
+            titles of the 'eu_vs_usa' deaths plot.
+        renderer (str): How to draw the daily bars, one of bars.RENDERERS.
+            Defaults to bars.BAR_RENDERER.
+        output_profile (str): Output profile ('print', 'web' or
+            'thumbnail', see output.PROFILES). If None, write a PDF.
+    Returns:
+        report (dict): Output file, format, size and time taken to write
+            it, see output.save_figure.
     """
   
     eu_usa_pops = {"US": 328, "EU": 445} 
@@ -186,15 +358,19 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
     if fully is True:
         lbl = "vax"
         plottitle = "fully vaccinated"
+        metric = "fully_vaccinated"
     elif onedose is True:
         lbl = "dose"
         plottitle = "partially vaccinated"
+        metric = "partially_vaccinated"
     elif deaths is True:
         lbl = "deaths"
         plottitle = "deaths"
+        metric = "deaths"
     else:
         lbl = "cases"
         plottitle = "cases"
+        metric = "cases"
 
     if vax is True:
         partialdata,fullydata = get_data.vax_by_region(data)
@@ -202,7 +378,9 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
             data = partialdata
         else:
             data = fullydata
-    dailydata = data.diff()
+    popidx = population.PopulationIndex.from_frame(pops, data.columns)
+    layers = metrics.Metrics(data, popidx, metric)
+    dailydata = layers[metrics.layer_name(metric)]
     
     if region == "latin":
         subplots = (4,5)
@@ -221,8 +399,9 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
         fontsize = "x-small"
         filename = f"states_new_{lbl}.pdf"
     elif region == "eu_vs_usa":
-        data["EU"] = data.loc[:,EU_COUNTRIES].sum(axis=1)
-        dailydata = data.diff()
+        data = groups.registry().with_groups(data, ["EU"])
+        layers = metrics.Metrics(data, metric=metric)
+        dailydata = layers[metrics.layer_name(metric)]
         subplots = (2, 1)
         figsize = (15, 11)
         lw = 1.5
@@ -232,19 +411,12 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
         filename = f"EU_vs_USA_{lbl}.pdf"
     elif region in ["worst_usa", "worst_global", "worst_world"]:
         if vax is True:
-            avg = dailydata.rolling(7, center=False, min_periods=2).mean()
             total_data = dailydata.sum()
-            # Only consider countries with population > 5M
-            percvax = total_data/pops * 100.
-            if region == "worst_usa":
-                data_sorted = percvax.T.sort_values(percvax.index[-1], ascending=False).T
-            else:
-                large = pops.columns[(pops > 5000000).all()].values
-                percvax = percvax[large]
-                data_sorted = percvax.T.sort_values(percvax.index[-1], ascending=False).T
-                #fully_sorted = avg_fully.T.sort_values(avg_fully.index[-1], ascending=False).T
-            #fully_statenations = fully_sorted.iloc[:, :10].columns.values
-            statenations = data_sorted.iloc[:, :10].columns.values
+            percvax = total_data/popidx.values * 100.
+            if region != "worst_usa":
+                # Only consider countries with population > 5M
+                percvax = percvax[popidx.values > 5000000]
+            statenations = ranking.top_k(percvax, 10).values
             if region == "worst_usa":
                 filename = f"best_usa_{lbl}.pdf"
             else:
@@ -254,9 +426,8 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
                 else:
                     plottitle = "partially vaccinated (only countries > 5M)"
         else:
-            avg = dailydata.rolling(7, center=False, min_periods=2).mean()
-            data_sorted = avg.T.sort_values(avg.index[-1], ascending=False).T
-            statenations = data_sorted.iloc[:, :10].columns.values
+            avg = layers[metrics.layer_name(metric, window=7)]
+            statenations = ranking.Ranking(avg, k=10).top(10).values
             if region == "worst_usa":
                 filename = f"worst_usa_{lbl}.pdf"
             else:
@@ -269,7 +440,40 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
     else:
         raise KeyError("Region {region} not in acceptable values")
 
-    avg = dailydata.rolling(7, center=False, min_periods=2).mean()
+    avg = layers[metrics.layer_name(metric, window=7)]
+    suptitle = f'New daily {plottitle}\n{dailydata.index[-1]:%B %d, %Y}'
+    if region != "eu_vs_usa":
+        titles = []
+        for name in statenations:
+            if name not in dailydata:
+                titles.append("")
+                continue
+            total = int(dailydata[name].sum())
+            if vax is True:
+                try:
+                    percvax = int(total/popidx[name]*100.)
+                except:
+                    print(f"!!! could not get population for {name}")
+                    percvax = "?"
+                if region == "usa":
+                    region_name = STATES_ABB[name]
+                else:
+                    region_name = name
+                titles.append(f"{region_name}, total: {total:,} ({percvax}%)")
+            else:
+                titles.append(f"{name}, total: {total:,}")
+        if vax is True:
+            xmin = datetime.date(2021, 1, 1)
+        else:
+            xmin = datetime.date(2020, 2, 27)
+        colors = {"bar": BAR_C, "contrast": CONTRAST_C, "last": LAST_C}
+        # The figure of this layout is built once and only updated afterwards
+        grid = grid_figure(subplots, figsize, lw, labelsize, fontsize, xmin,
+                           colors, renderer)
+        grid.render(dailydata, avg, statenations, titles, suptitle)
+        outfilename = os.path.join(outdir, filename)
+        return grid.save(outfilename, output_profile)
+
     fig, axes = plt.subplots(subplots[0], subplots[1],
                              figsize=(figsize[0], figsize[1]),
                              sharex=True)
@@ -281,7 +485,8 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
     for i,ax in enumerate(axes.flatten()):
         if statenations[i] not in dailydata:
             continue
-        ax.bar(dailydata.index, dailydata[statenations[i]], color=BAR_C, zorder=5)
+        bars.daily_bars(ax, dailydata.index, dailydata[statenations[i]],
+                        renderer=renderer, color=BAR_C, zorder=5)
         ax.plot(avg[statenations[i]], c=CONTRAST_C, lw=lw, zorder=10)
         
         total = int(dailydata[statenations[i]].sum())
@@ -302,329 +507,295 @@ def grid_plot(data, pops, region, fully=False, onedose=False, outdir="plots",
         ax.xaxis.set_minor_locator(months)
         ax.tick_params(axis='x', which="minor", rotation=45)
         ax.xaxis.set_minor_formatter(mdates.DateFormatter('%b'))
-        if region != "eu_vs_usa": 
-            ax.xaxis.set_minor_locator(plt.MaxNLocator(10))
-            ax.tick_params(axis="x", which='major', length=0)
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('\n\n%Y'))
-#        ax.xaxis.set_minor_locator(AutoMinorLocator(6))
-        else:
-            ax.tick_params(axis='x', which="major", rotation=45, length=3)
-            ax.xaxis.set_major_formatter(mdates.DateFormatter('%b\n%Y'))
+        ax.tick_params(axis='x', which="major", rotation=45, length=3)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b\n%Y'))
         
-        if region != "eu_vs_usa":
-            max_avg = np.nanmax(avg[statenations[i]])
-            ax.set_ylim(0, max_avg+0.08*max_avg)
-            if vax is True:
-                try:
-                    percvax = int(total/pops[statenations[i]]*100.)
-                except:
-                    print(f"!!! could not get population for {statenations[i]}")
-                    percvax = "?"
-                ax.set_xlim(datetime.date(2021, 1, 1))
-                if region == "usa":
-                    region_name = STATES_ABB[statenations[i]]
-                else:
-                    region_name = statenations[i]
-                ax.annotate(f"{region_name}, total: {total:,} ({percvax}%)", (0.035, 1.05), 
-                    xycoords="axes fraction", size=fontsize)
-            else:
-                ax.set_xlim(datetime.date(2020, 2, 27))
-                ax.annotate(f"{statenations[i]}, total: {total:,}", (0.035, 1.05), 
-                    xycoords="axes fraction", size=fontsize)
-            words = ["Last: ", f"{lastval:,}", "/", f"{avglastval:,}"]
-            colors = ["black", LAST_C, "black", CONTRAST_C]
-            weights = ["normal", "normal", "normal", "bold"]
-            rainbow_text(0.035, .9, words, colors, weights=weights, ax=ax, fig=fig, tstring="axes", size=fontsize, zorder=15)
+        if vax is True:
+            ax.set_xlim(datetime.date(2021, 1, 10), dailydata.index[-1]+datetime.timedelta(days=4))
+            # Use the last 7 days (exluding last 4 days which are unreliable)
+            # to estimate the growth in vax per day, then use that to determine
+            # when country reaches 70 and 90% population vaccinated.
+            x0 = 7
+            total_minus4 = int(dailydata[statenations[i]][:-4].sum())
+            recenty = avg[statenations[i]][-x0-4:-4].values
+            recentx = np.arange(len(recenty))
+            z = np.polyfit(recentx, recenty, 1)
+            if z[0] < 0:
+                z[0] = 0
+            p = np.poly1d(z)
+            pop = eu_usa_pops[statenations[i]] * 1e6
+            perc70 = (pop * 0.7) - total_minus4
+            perc90 = (pop * 0.9) - total_minus4
+            x = np.arange(x0, x0+1095)
+            emp = p(x)
+            # Biden has stated a goal of 5 million doses a day. Let's say
+            # this equates to 2.1 million people fully vaccinated a day.
+            emp = np.where(emp > 2.1e6, 2.1e6, emp)
+            cumul = np.cumsum(emp)
+            ndays70 = int(np.where(cumul > perc70)[0][0]) 
+            ndays90 = int(np.where(cumul > perc90)[0][0])
+            perc70date = dailydata.index[-4] + datetime.timedelta(days=ndays70)
+            perc90date = dailydata.index[-4] + datetime.timedelta(days=ndays90)
         else:
-            if vax is True:
-                ax.set_xlim(datetime.date(2021, 1, 10), dailydata.index[-1]+datetime.timedelta(days=4))
-                # Use the last 7 days (exluding last 4 days which are unreliable)
-                # to estimate the growth in vax per day, then use that to determine
-                # when country reaches 70 and 90% population vaccinated.
-                x0 = 7
-                total_minus4 = int(dailydata[statenations[i]][:-4].sum())
-                recenty = avg[statenations[i]][-x0-4:-4].values
-                recentx = np.arange(len(recenty))
-                z = np.polyfit(recentx, recenty, 1)
-                if z[0] < 0:
-                    z[0] = 0
-                p = np.poly1d(z)
-                pop = eu_usa_pops[statenations[i]] * 1e6
-                perc70 = (pop * 0.7) - total_minus4
-                perc90 = (pop * 0.9) - total_minus4
-                x = np.arange(x0, x0+1095)
-                emp = p(x)
-                # Biden has stated a goal of 5 million doses a day. Let's say
-                # this equates to 2.1 million people fully vaccinated a day.
-                emp = np.where(emp > 2.1e6, 2.1e6, emp)
-                cumul = np.cumsum(emp)
-                ndays70 = int(np.where(cumul > perc70)[0][0]) 
-                ndays90 = int(np.where(cumul > perc90)[0][0])
-                perc70date = dailydata.index[-4] + datetime.timedelta(days=ndays70)
-                perc90date = dailydata.index[-4] + datetime.timedelta(days=ndays90)
-            else:
-                ax.set_xlim(datetime.date(2020, 2, 21), dailydata.index[-1]+datetime.timedelta(days=7))
-            # Get the maximum number of intervals/10,000s of cases so far
-            ndays_thresh = {"days": 15, "d": 6, "num": 3}
-            num_thresh = {"len1": {"long": 10, "tiny": 7}, "len2": {"long": 14, "tiny": 11},
-                          "len3": {"long": 14, "tiny": 11},  
+            ax.set_xlim(datetime.date(2020, 2, 21), dailydata.index[-1]+datetime.timedelta(days=7))
+        # Get the maximum number of intervals/10,000s of cases so far
+        ndays_thresh = {"days": 15, "d": 6, "num": 3}
+        num_thresh = {"len1": {"long": 10, "tiny": 7}, "len2": {"long": 14, "tiny": 11},
+                      "len3": {"long": 14, "tiny": 11},  
+                      "extreme": {"fontsmall": 6, "fontxsmall": 5, "xoff_2": -1, "xoff": -6}}
+        interval0 = 100
+        interval0_lbl = "100"
+        if deaths is True:
+            interval = 100000
+            unit = 1000
+            vline_lbl = "k"
+            vline_lbl_tiny = "k"
+            vline_labels = ["k", "k", "k", ""]
+        elif vax is True:
+            interval = 50000000
+            unit = 1000000
+            vline_lbl = " million"
+            vline_lbl_tiny = " mil"
+            ndays_thresh = {"days": 5, "d": 4, "num": 3}
+            num_thresh = {"len1": {"long": 7, "tiny": 4}, "len2": {"long": 7, "tiny": 4},
+                          "len3": {"long": 7, "tiny": 4}, 
                           "extreme": {"fontsmall": 6, "fontxsmall": 5, "xoff_2": -1, "xoff": -6}}
-            interval0 = 100
-            interval0_lbl = "100"
-            if deaths is True:
-                interval = 100000
-                unit = 1000
-                vline_lbl = "k"
-                vline_lbl_tiny = "k"
-                vline_labels = ["k", "k", "k", ""]
-            elif vax is True:
-                interval = 50000000
-                unit = 1000000
-                vline_lbl = " million"
-                vline_lbl_tiny = " mil"
-                ndays_thresh = {"days": 5, "d": 4, "num": 3}
-                num_thresh = {"len1": {"long": 7, "tiny": 4}, "len2": {"long": 7, "tiny": 4},
-                              "len3": {"long": 7, "tiny": 4}, 
-                              "extreme": {"fontsmall": 6, "fontxsmall": 5, "xoff_2": -1, "xoff": -6}}
-                interval0 = 1e6
-                interval0_lbl = "1 million"
-                vline_labels = ["million", "mil", "m", ""]
-            else: # Cases
-                interval = 5000000
-                unit = 1000000
-                vline_lbl = " mil"
-                vline_lbl_tiny = "m"
-                vline_labels = ["million", "mil", "m", ""]
-            if vax is True:
-                maxinterval = data[statenations[i]][-1] - data[statenations[i]][-1] % interval
-            else:
-                maxinterval = data[statenations[i]][-1] - data[statenations[i]][-1] % interval
-            intervals = np.concatenate((np.array([interval0]),
-                                        np.arange(interval, maxinterval+interval, interval)))
-            # The indices for the next entry after each interval unit
-            if vax is True:
-                intervals_inds = [np.argmax(data[statenations[i]] > x) for x in intervals]
-            else:
-                intervals_inds = [np.argmax(data[statenations[i]] > x) for x in intervals]
-            # Vertical lines will be put at interval0 cases and each million afterward
-            # The last index is for marking the last date, but no vline
-            vline_inds = intervals_inds + [len(dailydata)-1]
-            ndays = np.array(vline_inds)[1:] - np.array(vline_inds)[:-1]
-            # Get the transformation function the data coordinates in X and
-            # axis fraction in Y
-            trans = transforms.blended_transform_factory(ax.transData, ax.transAxes)
-            # Make one continuous line from interval0 cases to last date
-            ax.plot([dailydata.index[[intervals_inds[0]]], dailydata.index[[vline_inds[-1]]]],
-                    [1.03, 1.03], transform=trans, color=OUTSIDE_PLOT_C, lw=.9,  
-                    clip_on=False)
-            skip = False
-            prev_x1 = 0
-            for j in range(len(vline_inds)):
-                # If on the last index (last entry in dataset), we don't plot the vline
-                # or little | symbol
-                if j == len(vline_inds)-1:
-                    continue
-                
-                ant_kwargs = {"size": 8, "color": OUTSIDE_PLOT_C, "va": "center", "ha": "center",
-                              "xycoords": ("data", "axes fraction")}
-                # This makes the | symbol at the end of each time segment
-                ax.annotate("|", xy=(dailydata.index[[vline_inds[j]]], 1.03), 
-                            **ant_kwargs)
-                
-                # Make a vertical line in the plot.
-                # Annotate how many cases/deaths occurred in the interval period.
-                ax.axvline(dailydata.index[[vline_inds[j]]], color=VLINE_C, 
-                           ls="dotted", 
-                           alpha=0.7, zorder=0)
-               
-                # Make the label for the vline (e.g. 8 mil or 200k)
-                # Depending on the number of days in the interval, the unit
-                # label may change
-                number = f"{intervals[j]/unit:.0f}"
-                ant_kwargs = {}
-                time_off = 12
-#                if skip == True:
-#                    lab = ""
-#                    skip = False
-#                lenkey = f"len{len(number)}"
-#                if j == len(vline_inds)-2:
-#                    lab = f"{number}{vline_lbl_tiny}"
-#                elif ndays[j] > num_thresh[lenkey]["long"]: 
-#                    lab = f"{number}{vline_lbl}"
-#                elif ndays[j] > num_thresh[lenkey]["tiny"]:
-#                    lab = f"{number}{vline_lbl_tiny}"
+            interval0 = 1e6
+            interval0_lbl = "1 million"
+            vline_labels = ["million", "mil", "m", ""]
+        else: # Cases
+            interval = 5000000
+            unit = 1000000
+            vline_lbl = " mil"
+            vline_lbl_tiny = "m"
+            vline_labels = ["million", "mil", "m", ""]
+        if vax is True:
+            maxinterval = data[statenations[i]][-1] - data[statenations[i]][-1] % interval
+        else:
+            maxinterval = data[statenations[i]][-1] - data[statenations[i]][-1] % interval
+        intervals = np.concatenate((np.array([interval0]),
+                                    np.arange(interval, maxinterval+interval, interval)))
+        # The indices for the next entry after each interval unit
+        if vax is True:
+            intervals_inds = [np.argmax(data[statenations[i]] > x) for x in intervals]
+        else:
+            intervals_inds = [np.argmax(data[statenations[i]] > x) for x in intervals]
+        # Vertical lines will be put at interval0 cases and each million afterward
+        # The last index is for marking the last date, but no vline
+        vline_inds = intervals_inds + [len(dailydata)-1]
+        ndays = np.array(vline_inds)[1:] - np.array(vline_inds)[:-1]
+        # Get the transformation function the data coordinates in X and
+        # axis fraction in Y
+        trans = transforms.blended_transform_factory(ax.transData, ax.transAxes)
+        # Make one continuous line from interval0 cases to last date
+        ax.plot([dailydata.index[[intervals_inds[0]]], dailydata.index[[vline_inds[-1]]]],
+                [1.03, 1.03], transform=trans, color=OUTSIDE_PLOT_C, lw=.9,  
+                clip_on=False)
+        skip = False
+        prev_x1 = 0
+        for j in range(len(vline_inds)):
+            # If on the last index (last entry in dataset), we don't plot the vline
+            # or little | symbol
+            if j == len(vline_inds)-1:
+                continue
+            
+            ant_kwargs = {"size": 8, "color": OUTSIDE_PLOT_C, "va": "center", "ha": "center",
+                          "xycoords": ("data", "axes fraction")}
+            # This makes the | symbol at the end of each time segment
+            ax.annotate("|", xy=(dailydata.index[[vline_inds[j]]], 1.03), 
+                        **ant_kwargs)
+            
+            # Make a vertical line in the plot.
+            # Annotate how many cases/deaths occurred in the interval period.
+            ax.axvline(dailydata.index[[vline_inds[j]]], color=VLINE_C, 
+                       ls="dotted", 
+                       alpha=0.7, zorder=0)
+           
+            # Make the label for the vline (e.g. 8 mil or 200k)
+            # Depending on the number of days in the interval, the unit
+            # label may change
+            number = f"{intervals[j]/unit:.0f}"
+            ant_kwargs = {}
+            time_off = 12
+#            if skip == True:
+#                lab = ""
+#                skip = False
+#            lenkey = f"len{len(number)}"
+#            if j == len(vline_inds)-2:
+#                lab = f"{number}{vline_lbl_tiny}"
+#            elif ndays[j] > num_thresh[lenkey]["long"]: 
+#                lab = f"{number}{vline_lbl}"
+#            elif ndays[j] > num_thresh[lenkey]["tiny"]:
+#                lab = f"{number}{vline_lbl_tiny}"
+#            else:
+#                lab = f"{number}"
+#                if ndays[j] < num_thresh["extreme"]["fontxsmall"]:
+#                    ant_kwargs = {"size": 8}
+#                elif ndays[j] < num_thresh["extreme"]["fontsmall"]:
+#                    ant_kwargs = {"size": 8.5}
+#                if number[0] == "2":
+#                    time_off = num_thresh["extreme"]["xoff_2"]
 #                else:
-#                    lab = f"{number}"
-#                    if ndays[j] < num_thresh["extreme"]["fontxsmall"]:
-#                        ant_kwargs = {"size": 8}
-#                    elif ndays[j] < num_thresh["extreme"]["fontsmall"]:
-#                        ant_kwargs = {"size": 8.5}
-#                    if number[0] == "2":
-#                        time_off = num_thresh["extreme"]["xoff_2"]
-#                    else:
-#                        time_off = num_thresh["extreme"]["xoff"]
-
-                # The first label is special
-                if j == 0:
-                    lab = f"{interval0_lbl}"
-                    ax.annotate(lab, 
-                            (dailydata.index[[vline_inds[j]]]+datetime.timedelta(hours=time_off), .93),
-                            xycoords=("data", "axes fraction"), 
-                            style="italic", color=VLINE_C, **ant_kwargs)
-                    continue
-
-                # This is for the case/death/vax numbers.
-                toobig = True
-                label_i = 0
-                while toobig is True:
-                    if j == len(vline_inds)-2:
-                        lbl = f"{number}{vline_labels[-2]}"
-                    if label_i == len(vline_labels):
-                        lbl = ""
-                    else:
-                        lbl = f"{number}{vline_labels[label_i]}"
+#                    time_off = num_thresh["extreme"]["xoff"]
+
+            # The first label is special
+            if j == 0:
+                lab = f"{interval0_lbl}"
+                ax.annotate(lab, 
+                        (dailydata.index[[vline_inds[j]]]+datetime.timedelta(hours=time_off), .93),
+                        xycoords=("data", "axes fraction"), 
+                        style="italic", color=VLINE_C, **ant_kwargs)
+                continue
+
+            # This is for the case/death/vax numbers.
+            toobig = True
+            label_i = 0
+            while toobig is True:
+                if j == len(vline_inds)-2:
+                    lbl = f"{number}{vline_labels[-2]}"
+                if label_i == len(vline_labels):
+                    lbl = ""
+                else:
+                    lbl = f"{number}{vline_labels[label_i]}"
+                current_x0 = dailydata.index[[vline_inds[j]]] + datetime.timedelta(hours=time_off)
+                current_y0 = 0.93
+                bbox,t = rainbow_text(current_x0, current_y0, [lbl], colors=[VLINE_C], 
+                                    weights=["normal"], styles="italic",
+                                    t=trans, zorder=100, returnt=True, **ant_kwargs)
+                current_x1 = bbox.x1
+                if j == len(vline_inds)-2:
+                    break
+                next_x0_pd = dailydata.index[[vline_inds[j+1]]] + datetime.timedelta(hours=time_off)
+                next_x0_dt = next_x0_pd.to_pydatetime()
+                next_x0 = next_x0_dt.astype('datetime64[D]').astype(int)[0]
+#                print(next_x0_dt[0], current_x1, next_x0, j, len(vline_inds), label_i, len(vline_labels), lbl, label_i)
+                buffr = 5
+                if (current_x1+buffr) > (next_x0):
+                    t.remove()
+                else:
+                    toobig = False
+                if label_i == len(vline_labels):
+                    toobig = False
+                label_i += 1
+
+            # Annotate how many days elapsed since last interval cases
+            # Extra annotation at the end for last interval -> now
+            # Depending on number of days in the interval, the time unit
+            # will be days, d, no unit at all, or no number at all
+            elapsed_labels = [" days", "days", "d", ""]
+            middle_i = vline_inds[j] + int(ndays[j]/2)
+            toobig = True
+            label_i = 0
+            while toobig is True:
+                current_x0 = dailydata.index[[middle_i]]
+                lbl_kwargs = {"ha": "center"}
+                # Last label
+                if j >= len(vline_inds)-2:
+                    lbl = f"{ndays[j]}{elapsed_labels[-2]}"
                     current_x0 = dailydata.index[[vline_inds[j]]] + datetime.timedelta(hours=time_off)
-                    current_y0 = 0.93
-                    bbox,t = rainbow_text(current_x0, current_y0, [lbl], colors=[VLINE_C], 
-                                        weights=["normal"], styles="italic",
-                                        t=trans, zorder=100, returnt=True, **ant_kwargs)
-                    current_x1 = bbox.x1
-                    if j == len(vline_inds)-2:
-                        break
-                    next_x0_pd = dailydata.index[[vline_inds[j+1]]] + datetime.timedelta(hours=time_off)
-                    next_x0_dt = next_x0_pd.to_pydatetime()
-                    next_x0 = next_x0_dt.astype('datetime64[D]').astype(int)[0]
-#                    print(next_x0_dt[0], current_x1, next_x0, j, len(vline_inds), label_i, len(vline_labels), lbl, label_i)
-                    buffr = 5
-                    if (current_x1+buffr) > (next_x0):
-                        t.remove()
-                    else:
-                        toobig = False
-                    if label_i == len(vline_labels):
-                        toobig = False
-                    label_i += 1
-
-                # Annotate how many days elapsed since last interval cases
-                # Extra annotation at the end for last interval -> now
-                # Depending on number of days in the interval, the time unit
-                # will be days, d, no unit at all, or no number at all
-                elapsed_labels = [" days", "days", "d", ""]
-                middle_i = vline_inds[j] + int(ndays[j]/2)
-                toobig = True
-                label_i = 0
-                while toobig is True:
-                    current_x0 = dailydata.index[[middle_i]]
-                    lbl_kwargs = {"ha": "center"}
-                    # Last label
-                    if j >= len(vline_inds)-2:
-                        lbl = f"{ndays[j]}{elapsed_labels[-2]}"
-                        current_x0 = dailydata.index[[vline_inds[j]]] + datetime.timedelta(hours=time_off)
-                        lbl_kwargs = {"ha": "left"}
-                    if label_i == len(elapsed_labels):
-                        lbl = ""
-                    else:
-                        lbl = f"{ndays[j]}{elapsed_labels[label_i]}"
-                    bbox,t = rainbow_text(current_x0, 1.05, [lbl],
-                                        colors=[OUTSIDE_PLOT_C], weights=["normal"],
-                                        styles="italic", t=trans, returnt=True, **lbl_kwargs)
-                    current_x1 = bbox.x1
-                    if j == len(vline_inds)-2:
-                        break
-                    next_x0_pd = dailydata.index[[vline_inds[j+1]]]
-                    next_x0_dt = next_x0_pd.to_pydatetime()
-                    next_x0 = next_x0_dt.astype('datetime64[D]').astype(int)[0]
-                    #print(next_x0_dt[0], current_x1, next_x0, j, len(vline_inds), label_i, len(elapsed_labels), lbl)
-                    buffr = 2 
-                    if (current_x1+buffr) > (next_x0):
-                        t.remove()
-                    else:
-                        toobig = False
-                    if label_i == len(elapsed_labels):
-                        toobig = False
-                    label_i += 1
-        
+                    lbl_kwargs = {"ha": "left"}
+                if label_i == len(elapsed_labels):
+                    lbl = ""
+                else:
+                    lbl = f"{ndays[j]}{elapsed_labels[label_i]}"
+                bbox,t = rainbow_text(current_x0, 1.05, [lbl],
+                                    colors=[OUTSIDE_PLOT_C], weights=["normal"],
+                                    styles="italic", t=trans, returnt=True, **lbl_kwargs)
+                current_x1 = bbox.x1
+                if j == len(vline_inds)-2:
+                    break
+                next_x0_pd = dailydata.index[[vline_inds[j+1]]]
+                next_x0_dt = next_x0_pd.to_pydatetime()
+                next_x0 = next_x0_dt.astype('datetime64[D]').astype(int)[0]
+                #print(next_x0_dt[0], current_x1, next_x0, j, len(vline_inds), label_i, len(elapsed_labels), lbl)
+                buffr = 2 
+                if (current_x1+buffr) > (next_x0):
+                    t.remove()
+                else:
+                    toobig = False
+                if label_i == len(elapsed_labels):
+                    toobig = False
+                label_i += 1
+    
+    
+        # Define axis fraction coords for the Total and Last annotations
+        # and the box surrounding them
+        text_x0 = 0.027
+        text_x1 = [0]
+        text_y0 = 0.84
+        bbox = rainbow_text(text_x0, text_y0, [f"Total: {total:,}"], ["black"], ax=ax, fig=fig, 
+                            tstring="axes", size=fontsize, styles="italic", ha="left",
+                            va="center", zorder=20)
+        text_x1.append(bbox.x1)
+        text_y1 = 0.75
+        words = ["Last: ", f"{lastval:,}", "/", f"{avglastval:,}"]
+        colors = ["black", LAST_C, "black", CONTRAST_C]
+        weights = ["normal", "normal", "normal", "bold"]
+        bbox = rainbow_text(text_x0, text_y1, words, colors, ax=ax, fig=fig, 
+                            tstring="axes", weights=weights, styles="italic", 
+                            size=fontsize, ha="left", va="center", zorder=20)
+        text_x1.append(bbox.x1)
+        max_x = max(text_x1)
+        box = Rectangle((text_x0-0.003, text_y1-0.03), (max_x-text_x0)+0.006, .08*2, 
+            transform=ax.transAxes, edgecolor=BOX_EDGE_C, facecolor=BOX_FACE_C, alpha=0.5, zorder=20)
+        ax.add_patch(box)
+    
         
-            # Define axis fraction coords for the Total and Last annotations
-            # and the box surrounding them
-            text_x0 = 0.027
-            text_x1 = [0]
-            text_y0 = 0.84
-            bbox = rainbow_text(text_x0, text_y0, [f"Total: {total:,}"], ["black"], ax=ax, fig=fig, 
-                                tstring="axes", size=fontsize, styles="italic", ha="left",
-                                va="center", zorder=20)
+        if vax is True:
+            words70 = ['70%: ', f'{perc70date:%b %d %Y}'] 
+            words90 = [ '90%: ', f'{perc90date:%b %d %Y}']
+            colors = ['black', 'black']
+            weights = ['normal', 'normal']
+            text_y2 = 0.66
+            bbox = rainbow_text(text_x0, text_y2, words70, colors, weights=weights, ax=ax, fig=fig, tstring="axes", size=fontsize, styles='italic', ha='left', va='center', zorder=20)
             text_x1.append(bbox.x1)
-            text_y1 = 0.75
-            words = ["Last: ", f"{lastval:,}", "/", f"{avglastval:,}"]
-            colors = ["black", LAST_C, "black", CONTRAST_C]
-            weights = ["normal", "normal", "normal", "bold"]
-            bbox = rainbow_text(text_x0, text_y1, words, colors, ax=ax, fig=fig, 
-                                tstring="axes", weights=weights, styles="italic", 
-                                size=fontsize, ha="left", va="center", zorder=20)
+            text_y3 = 0.57
+            bbox = rainbow_text(text_x0, text_y3, words90, colors, weights=weights, ax=ax, fig=fig, tstring="axes", size=fontsize, styles='italic', ha='left', va='center', zorder=20)
             text_x1.append(bbox.x1)
             max_x = max(text_x1)
-            box = Rectangle((text_x0-0.003, text_y1-0.03), (max_x-text_x0)+0.006, .08*2, 
+            box = Rectangle((text_x0-0.003, text_y3-0.03), (max_x-text_x0)+0.006, .08*2, 
                 transform=ax.transAxes, edgecolor=BOX_EDGE_C, facecolor=BOX_FACE_C, alpha=0.5, zorder=20)
             ax.add_patch(box)
-        
-            
-            if vax is True:
-                words70 = ['70%: ', f'{perc70date:%b %d %Y}'] 
-                words90 = [ '90%: ', f'{perc90date:%b %d %Y}']
-                colors = ['black', 'black']
-                weights = ['normal', 'normal']
-                text_y2 = 0.66
-                bbox = rainbow_text(text_x0, text_y2, words70, colors, weights=weights, ax=ax, fig=fig, tstring="axes", size=fontsize, styles='italic', ha='left', va='center', zorder=20)
-                text_x1.append(bbox.x1)
-                text_y3 = 0.57
-                bbox = rainbow_text(text_x0, text_y3, words90, colors, weights=weights, ax=ax, fig=fig, tstring="axes", size=fontsize, styles='italic', ha='left', va='center', zorder=20)
-                text_x1.append(bbox.x1)
-                max_x = max(text_x1)
-                box = Rectangle((text_x0-0.003, text_y3-0.03), (max_x-text_x0)+0.006, .08*2, 
-                    transform=ax.transAxes, edgecolor=BOX_EDGE_C, facecolor=BOX_FACE_C, alpha=0.5, zorder=20)
-                ax.add_patch(box)
-
-            # Define US and EU population (in units of intervals) by hand
-            # and write a title
-            if vax is True:
-                vaccinated = round((total / (eu_usa_pops[statenations[i]] * 1e6)) * 100.)
-                lab = f"$\\bf{statenations[i]}$, population: {eu_usa_pops[statenations[i]]:,} million ({vaccinated}% vaccinated)"
-            elif deaths is False:
-                infected = round((total / (eu_usa_pops[statenations[i]] * 1e6)) * 100.)
-                lab = f"$\\bf{statenations[i]}$, population: {eu_usa_pops[statenations[i]]:,} million ({infected}% infected)"
-            else:
-                lab = f"$\\bf{statenations[i]}$, population: {eu_usa_pops[statenations[i]]:,} million ({mort[statenations[i]]}% mortality)"
-            ax.set_title(lab, loc="left", pad=27, fontsize=fontsize)
+
+        # Define US and EU population (in units of intervals) by hand
+        # and write a title
+        if vax is True:
+            vaccinated = round((total / (eu_usa_pops[statenations[i]] * 1e6)) * 100.)
+            lab = f"$\\bf{statenations[i]}$, population: {eu_usa_pops[statenations[i]]:,} million ({vaccinated}% vaccinated)"
+        elif deaths is False:
+            infected = round((total / (eu_usa_pops[statenations[i]] * 1e6)) * 100.)
+            lab = f"$\\bf{statenations[i]}$, population: {eu_usa_pops[statenations[i]]:,} million ({infected}% infected)"
+        elif mort is not None:
+            lab = f"$\\bf{statenations[i]}$, population: {eu_usa_pops[statenations[i]]:,} million ({mort[statenations[i]]}% mortality)"
+        else:
+            lab = f"$\\bf{statenations[i]}$, population: {eu_usa_pops[statenations[i]]:,} million"
+        ax.set_title(lab, loc="left", pad=27, fontsize=fontsize)
   
 
    
-    if region == "eu_vs_usa": 
-        # Set both US and EU ylim maximum to the same value 
-        us_ymax = np.nanmax(avg[statenations[0]])
-        eu_ymax = np.nanmax(avg[statenations[1]])
-        max_max = max(us_ymax, eu_ymax)
-        max_max_buffer = max_max + (0.1 * max_max)
-        # This buffer ensures that the max will not go over the vline text
-        axes[0].set_ylim(0, max_max_buffer)
-        axes[1].set_ylim(0, max_max_buffer)
+    # Set both US and EU ylim maximum to the same value 
+    us_ymax = np.nanmax(avg[statenations[0]])
+    eu_ymax = np.nanmax(avg[statenations[1]])
+    max_max = max(us_ymax, eu_ymax)
+    max_max_buffer = max_max + (0.1 * max_max)
+    # This buffer ensures that the max will not go over the vline text
+    axes[0].set_ylim(0, max_max_buffer)
+    axes[1].set_ylim(0, max_max_buffer)
 
     words = ["Last: ", "value", "/", "7 day average"]
     colors = ["black", LAST_C, "black", CONTRAST_C]
     weights = ["normal", "normal", "normal", "bold"]
     ax = plt.gca()
-    canvas = ax.figure.canvas
     t = fig.transFigure
     text = ax.text(0.5, .945, "".join(words), color="white", 
                    transform=t, size='x-large', ha="center")
-    text.draw(canvas.get_renderer())
-    bbox = text.get_window_extent().transformed(t.inverted())
+    bbox = textlayout.text_extent(text).transformed(t.inverted())
     x0 = bbox.x0
     
     rainbow_text(x0, .945, words, colors, weights=weights, fig=fig, tstring="figure", size='x-large')
-    plt.suptitle(f'New daily {plottitle}\n{dailydata.index[-1]:%B %d, %Y}',
-                 fontsize='x-large', y=1.01)
+    plt.suptitle(suptitle, fontsize='x-large', y=1.01)
     outfilename = os.path.join(outdir, filename)
-    plt.savefig(outfilename, bbox_inches='tight')
-    print(f"Saved {outfilename}")
+    return output.save_figure(fig, outfilename, output_profile, bbox_inches='tight')
 
 def mortality_rate(statenation, d_data, c_data):
     """
@@ -637,13 +808,15 @@ def mortality_rate(statenation, d_data, c_data):
         mort (int): Mortality rate.
     """
 
-    if statenation == "EU": 
-        d_data["EU"] = d_data.loc[:,EU_COUNTRIES].sum(axis=1)
-        c_data["EU"] = c_data.loc[:,EU_COUNTRIES].sum(axis=1)
-    d_dailydata = d_data.diff()
-    c_dailydata = c_data.diff()
-    c_total = int(c_dailydata[statenation].sum())
-    d_total = int(d_dailydata[statenation].sum())
+    registry = groups.registry()
+    if statenation in registry:
+        # Group totals come from the cache, d_data and c_data are left as is
+        d_data = registry.aggregate(d_data, [statenation])
+        c_data = registry.aggregate(c_data, [statenation])
+    d_dailydata = d_data[statenation].diff()
+    c_dailydata = c_data[statenation].diff()
+    c_total = int(c_dailydata.sum())
+    d_total = int(d_dailydata.sum())
     mort = round((d_total / c_total) * 100.)
 
     return mort
@@ -662,8 +835,26 @@ if __name__ == "__main__":
     parser.add_argument("--all", action="store_true",
                         default=False,
                         help="Switch to make all types of plots")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of figures to render in parallel")
     parser.add_argument('--regions', nargs='+')
+    parser.add_argument("--clean", choices=cleaning.STRATEGIES, default=None,
+                        help="Fix negative daily counts and backlog dumps with this strategy")
+    parser.add_argument("--bars", choices=bars.RENDERERS, default=bars.BAR_RENDERER,
+                        help="How to draw daily bars ('poly' draws them as one artist)")
+    parser.add_argument("--output-profile", choices=list(output.PROFILES), default=None,
+                        help="Format, resolution and size budget of the plots (default: PDF)")
+    parser.add_argument("--no-render-cache", action="store_true", default=False,
+                        help="Render every plot, even if its inputs did not change")
+    parser.add_argument("--profile", nargs="?", const=profiling.PROFILE_REPORT, default=None,
+                        metavar="REPORT",
+                        help="Time each stage and write a JSON report (default: profiles/)")
+    parser.add_argument("--cprofile", action="store_true", default=False,
+                        help="With --profile, also run cProfile")
+    parser.add_argument("--trace-memory", action="store_true", default=False,
+                        help="With --profile, also trace the memory each stage allocates (slow)")
     args = parser.parse_args()
+    profiling.start("grid_plots", args.profile, args.cprofile, args.trace_memory)
     
     allowed_regions = ["usa", "latin", "eu_vs_usa", "worst_usa", "worst_global", "worst_world"]
     if args.regions is None:
@@ -676,16 +867,61 @@ if __name__ == "__main__":
             else:
                 print(f"Region {item} not recognized\nAllowed values: {allowed_regions}")
 
-    for item in regions:
-        if args.vax is True or args.dose is True:
-            data, pops = get_data.get_data(item, vax=True)
-        else:
-            data, pops = get_data.get_data(item, deaths=args.deaths)
-        if item == "eu_vs_usa" and args.deaths is True:
-            data2, pops2 = get_data.get_data(item, deaths=False)
-            usa_mort = mortality_rate("US", data, data2)
-            eu_mort = mortality_rate("EU", data, data2)
-            mort = {"US": usa_mort, "EU": eu_mort}
-            grid_plot(data, pops, item, deaths=args.deaths, mort=mort, fully=args.vax, onedose=args.dose)
-        else:
-            grid_plot(data, pops, item, deaths=args.deaths, fully=args.vax, onedose=args.dose)
+    if args.all is True:
+        variants = ["cases", "deaths", "vax", "dose"]
+    elif args.vax is True:
+        variants = ["vax"]
+    elif args.dose is True:
+        variants = ["dose"]
+    elif args.deaths is True:
+        variants = ["deaths"]
+    else:
+        variants = ["cases"]
+
+    # Download every needed file at once, get_data then reuses them
+    needed = []
+    for variant in variants:
+        for item in regions:
+            if variant in ["vax", "dose"]:
+                needed.append(get_data.data_filename(item, vax=True))
+            else:
+                needed.append(get_data.data_filename(item, deaths=variant == "deaths"))
+                if variant == "deaths" and item == "eu_vs_usa":
+                    needed.append(get_data.data_filename(item))
+    get_data.fetch_all(sorted(set(needed)))
+
+    # Regions of the same family share their data, which is sent to each
+    # worker process once
+    datasets = {}
+    jobs = []
+    for variant in variants:
+        for item in regions:
+            key = f"{get_data.region_family(item)}-{variant}"
+            if key not in datasets:
+                if variant in ["vax", "dose"]:
+                    datasets[key] = get_data.get_data(item, vax=True)
+                else:
+                    datasets[key] = get_data.get_data(item, deaths=variant == "deaths",
+                                                      clean=args.clean)
+            data, pops = datasets[key]
+            kwargs = {"deaths": variant == "deaths", "fully": variant == "vax",
+                      "onedose": variant == "dose", "renderer": args.bars,
+                      "output_profile": args.output_profile}
+            if item == "eu_vs_usa" and variant == "deaths":
+                data2, pops2 = get_data.get_data(item, deaths=False, clean=args.clean)
+                kwargs["mort"] = {"US": mortality_rate("US", data, data2),
+                                  "EU": mortality_rate("EU", data, data2)}
+            if args.no_render_cache is True:
+                func, func_args = grid_plot, ()
+            else:
+                # Skip plots whose data and parameters did not change
+                func, func_args = render_cache.render, (grid_plot,)
+            jobs.append(scheduler.RenderJob(f"{item} {variant}", func,
+                                            func_args + (scheduler.Dataset(f"{key}-data"),
+                                                         scheduler.Dataset(f"{key}-pops"), item),
+                                            kwargs))
+    datasets = {f"{key}-{part}": frame for key, frames in datasets.items()
+                for part, frame in zip(["data", "pops"], frames)}
+    results = scheduler.run_jobs(jobs, datasets, n_jobs=args.jobs)
+    if scheduler.failures(results):
+        sys.exit(1)
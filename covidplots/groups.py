@@ -0,0 +1,199 @@
+"""
+Named groups of regions (the EU, Latin America, continents, user-defined
+blocs) and their totals.
+
+A GroupRegistry compiles its groups against the columns of a dataset into
+a (region, group) membership matrix, so the totals of every group on every
+date are one matrix product. Totals are cached by a digest of the dataset
+and returned as new columns; the dataset itself is never modified.
+"""
+
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from covidplots.continents import census_continents
+from covidplots.metrics import dataset_digest
+
+EU_COUNTRIES = ['Austria','Belgium','Bulgaria','Croatia','Cyprus','Czechia',
+                'Denmark','Estonia','Finland','France','Germany','Greece',
+                'Hungary','Ireland','Italy','Latvia','Lithuania','Luxembourg',
+                'Malta','Netherlands','Poland','Portugal','Romania','Slovakia',
+                'Slovenia','Spain','Sweden']
+
+LATIN_COUNTRIES = ['Argentina','Belize','Bolivia','Brazil','Chile','Colombia',
+                   'Costa Rica','Cuba','Dominican Republic','Ecuador',
+                   'El Salvador','Guatemala','Honduras','Mexico','Nicaragua',
+                   'Panama','Paraguay','Peru','Uruguay','Venezuela']
+
+# Number of group totals kept in memory
+AGGREGATE_CACHE_SIZE = 32
+GROUP_STATS = {"hits": 0, "misses": 0}
+
+def group_stats():
+    """
+    Report how many group totals were served from the cache.
+    Returns:
+        stats (dict): Number of cache hits and misses.
+    """
+    return dict(GROUP_STATS)
+
+class GroupRegistry:
+    """
+    Named groups of regions.
+
+    Attributes:
+        version (int): Incremented whenever a group is (re)defined, so that
+            cached totals of older definitions are not reused.
+    """
+
+    def __init__(self):
+        self._groups = OrderedDict()
+        self._matrices = {}
+        self._totals = OrderedDict()
+        self._lock = threading.Lock()
+        self.version = 0
+
+    def __contains__(self, name):
+        return name in self._groups
+
+    def register(self, name, members):
+        """
+        Define (or redefine) a group.
+        Args:
+            name (str): Group name, used as column name of its totals.
+            members (list): Names of the regions in the group.
+        """
+        with self._lock:
+            self._groups[name] = tuple(members)
+            self.version += 1
+            self._matrices.clear()
+
+    def names(self):
+        """
+        Names of all groups, in order of definition.
+        Returns:
+            names (list): Group names.
+        """
+        return list(self._groups)
+
+    def members(self, name):
+        """
+        Members of a group.
+        Args:
+            name (str): Group name.
+        Returns:
+            members (list): Region names.
+        """
+        return list(self._groups[name])
+
+    def membership(self, columns, names=None, strict=False):
+        """
+        Membership matrix of groups over the columns of a dataset.
+        Args:
+            columns (:obj:`pandas.Index`): Region names.
+            names (list): Groups to include. Defaults to all.
+            strict (Bool): If True, raise KeyError when a member of a group
+                is not among the columns; otherwise it is left out.
+        Returns:
+            matrix (:obj:`numpy.ndarray`): Array of shape (region, group),
+                1 where a region belongs to a group.
+        """
+        names = tuple(self.names() if names is None else names)
+        key = (names, tuple(columns), strict)
+        with self._lock:
+            matrix = self._matrices.get(key)
+        if matrix is not None:
+            return matrix
+        columns = pd.Index(columns)
+        matrix = np.zeros((len(columns), len(names)))
+        for j, name in enumerate(names):
+            pos = columns.get_indexer(self._groups[name])
+            if strict is True and (pos < 0).any():
+                missing = np.asarray(self._groups[name])[pos < 0]
+                raise KeyError(f"{list(missing)} of group {name} not in data")
+            matrix[pos[pos >= 0], j] = 1.
+        matrix.flags.writeable = False
+        with self._lock:
+            self._matrices[key] = matrix
+        return matrix
+
+    def aggregate(self, data, names=None, strict=False):
+        """
+        Totals of groups on every date.
+        Args:
+            data (:obj:`pandas.DataFrame`): One column per region, one row
+                per date.
+            names (list): Groups to total. Defaults to all.
+            strict (Bool): If True, raise KeyError when a member of a group
+                is not in data.
+        Returns:
+            totals (:obj:`pandas.DataFrame`): One column per group, same
+                index as data. Missing values count as 0.
+        """
+        names = tuple(self.names() if names is None else names)
+        data = data.select_dtypes("number")
+        key = (dataset_digest(data), self.version, names, strict)
+        with self._lock:
+            totals = self._totals.get(key)
+            if totals is not None:
+                self._totals.move_to_end(key)
+                GROUP_STATS["hits"] += 1
+        if totals is None:
+            matrix = self.membership(data.columns, names, strict)
+            values = np.nan_to_num(data.to_numpy(dtype=float)) @ matrix
+            if all(pd.api.types.is_integer_dtype(t) for t in data.dtypes):
+                values = values.astype(np.int64)
+            values.flags.writeable = False
+            totals = pd.DataFrame(values, index=data.index, columns=list(names))
+            with self._lock:
+                GROUP_STATS["misses"] += 1
+                self._totals[key] = totals
+                while len(self._totals) > AGGREGATE_CACHE_SIZE:
+                    self._totals.popitem(last=False)
+        return totals.copy(deep=False)
+
+    def with_groups(self, data, names=None, strict=False):
+        """
+        A dataset with group totals as extra columns.
+        Args:
+            data (:obj:`pandas.DataFrame`): One column per region, one row
+                per date. It is not modified.
+            names (list): Groups to add. Defaults to all.
+            strict (Bool): If True, raise KeyError when a member of a group
+                is not in data.
+        Returns:
+            data (:obj:`pandas.DataFrame`): New frame with the columns of
+                data followed by one column per group.
+        """
+        totals = self.aggregate(data, names, strict)
+        return pd.concat([data, totals], axis=1)
+
+    def add_continents(self, filename=None):
+        """
+        Define one group per continent of the census regions file.
+        Args:
+            filename (str): Name of census CSV file. Defaults to the one
+                census_continents reads.
+        """
+        by_cont = census_continents() if filename is None else census_continents(filename)
+        for cont, countries in by_cont.items():
+            if cont != "All":
+                self.register(cont, countries)
+
+@lru_cache(maxsize=None)
+def registry():
+    """
+    Registry shared by the package, with the groups 'EU' and
+    'Latin America'. Add continents with registry().add_continents() and
+    custom blocs with registry().register().
+    Returns:
+        registry (:obj:`GroupRegistry`): Shared registry.
+    """
+    groups = GroupRegistry()
+    groups.register("EU", EU_COUNTRIES)
+    groups.register("Latin America", LATIN_COUNTRIES)
+    return groups
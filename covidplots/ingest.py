@@ -0,0 +1,212 @@
+"""
+Incremental ingestion of the wide JHU time series files.
+
+Every day JHU appends one date column to each row of its CSV files. Rather
+than parsing all ~1,100 date columns on every refresh, the aggregated
+matrix from the previous run is kept on disk together with a hash of the
+file it came from. On the next run, if stripping the new columns off every
+line of the new file reproduces that hash, history was not revised and only
+the new columns are read (straight from the tail of every line), aggregated
+and appended.
+
+The matrix is stored date-major in a raw file next to the state
+(*.ingest.bin), so appending a day writes one row of totals at the end of
+it instead of rewriting the whole matrix, and it is read back as a memory
+map. Checking that history was not revised still needs one pass over the
+bytes of the file (see scan).
+"""
+
+import csv
+import hashlib
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from covidplots import frame_cache, schema
+
+DATE_COLUMN = re.compile(r"^\d{1,2}/\d{1,2}/\d{2}$")
+INGEST_STATS = {"full": 0, "incremental": 0, "unchanged": 0}
+
+def ingest_stats():
+    """
+    Report how JHU files were ingested.
+    Returns:
+        stats (dict): Number of full parses, incremental appends, and files
+            found unchanged since the last ingest.
+    """
+    return dict(INGEST_STATS)
+
+def state_path(filename, key):
+    """
+    Path of the stored ingest state for a file.
+    Args:
+        filename (str): Path of the source CSV file.
+        key (str): Column the rows are aggregated by.
+    Returns:
+        path (str): Path of .npz state file.
+    """
+    cachedir = os.path.join(os.path.dirname(filename), frame_cache.CACHE_SUBDIR)
+    basename = os.path.basename(filename)
+    tag = re.sub(r"\W", "_", key)
+    return os.path.join(cachedir, f"{basename}.{tag}.ingest.npz")
+
+def values_path(path):
+    """
+    Path of the stored matrix of an ingest state.
+    Args:
+        path (str): Path of .npz state file, see state_path.
+    Returns:
+        path (str): Path of the raw date-major matrix.
+    """
+    return f"{os.path.splitext(path)[0]}.bin"
+
+def read_header(filename):
+    """
+    Read the column names of a CSV file.
+    Args:
+        filename (str): Path of the CSV file.
+    Returns:
+        header (list): Column names.
+    """
+    with open(filename, newline="") as f1:
+        return next(csv.reader(f1))
+
+def scan(filename, n_new=0):
+    """
+    Hash a CSV file as it is, and as it looked before its last n_new columns
+    were added, collecting the values of those columns on the way. This
+    needs a single pass over the raw bytes and no CSV parsing.
+    Args:
+        filename (str): Path of the CSV file.
+        n_new (int): Number of trailing columns to strip from every line.
+    Returns:
+        before (str): Hex SHA1 digest of the file without the new columns.
+        after (str): Hex SHA1 digest of the whole file.
+        new (:obj:`numpy.ndarray`): Values of the new columns, one row per
+            data row of the file (NaN where empty).
+    """
+    before = hashlib.sha1()
+    after = hashlib.sha1()
+    tails = []
+    with open(filename, "rb") as f1:
+        for line in f1:
+            line = line.rstrip(b"\r\n")
+            after.update(line + b"\n")
+            if n_new > 0:
+                fields = line.rsplit(b",", n_new)
+                line = fields[0]
+                tails.extend(fields[1:])
+            before.update(line + b"\n")
+    # Wide enough to hold "nan" in place of empty cells
+    new = np.array(tails[n_new:], dtype=bytes)
+    new = new.astype(f"S{max(new.dtype.itemsize, 3)}")
+    new[new == b""] = b"nan"
+    new = new.astype(float).reshape(-1, n_new) if n_new > 0 else None
+    return before.hexdigest(), after.hexdigest(), new
+
+def _load_state(path):
+    try:
+        with np.load(path, allow_pickle=False) as state:
+            state = {k: state[k] for k in state.files}
+        n_dates, n_regions = state["shape"]
+        # Copy on write, callers may modify the frame they are given
+        values = np.memmap(values_path(path), dtype=str(state["dtype"]), mode="c",
+                           shape=(int(n_dates), int(n_regions)))
+    except (OSError, ValueError, KeyError):
+        return None
+    state["values"] = values.T
+    return state
+
+def _save_meta(path, regions, rows, header, digest, shape, dtype):
+    tmppath = f"{path}.{os.getpid()}.tmp"
+    with open(tmppath, "wb") as f1:
+        np.savez(f1, regions=np.asarray(regions, dtype=str), rows=rows,
+                 header=np.asarray(header, dtype=str), digest=np.array(digest),
+                 shape=np.asarray(shape), dtype=np.array(str(dtype)))
+    os.replace(tmppath, path)
+
+def _save_state(path, values, regions, rows, header, digest):
+    """ Write the whole matrix (regions x dates) and its state. """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    binpath = values_path(path)
+    tmppath = f"{binpath}.{os.getpid()}.tmp"
+    with open(tmppath, "wb") as f1:
+        f1.write(np.ascontiguousarray(values.T).tobytes())
+    os.replace(tmppath, binpath)
+    _save_meta(path, regions, rows, header, digest, values.T.shape, values.dtype)
+
+def _append_state(path, totals, state, header, digest):
+    """ Write the totals of new dates at the end of the stored matrix. """
+    n_dates, n_regions = state["shape"]
+    dtype = state["values"].dtype
+    with open(values_path(path), "r+b") as f1:
+        # Past any bytes left by an append whose state was not saved
+        f1.seek(int(n_dates) * int(n_regions) * dtype.itemsize)
+        f1.write(np.ascontiguousarray(totals.T, dtype=dtype).tobytes())
+        f1.truncate()
+    _save_meta(path, state["regions"], state["rows"], header, digest,
+               (int(n_dates) + totals.shape[1], int(n_regions)), dtype)
+
+def ingest_jhu(filename, key, incremental=True):
+    """
+    Read a wide JHU time series file, aggregated by one of its columns.
+    Args:
+        filename (str): Path of the CSV file.
+        key (str): Column to aggregate rows by, e.g. 'Province_State' or
+            'Country/Region'.
+        incremental (Bool): If True, only parse date columns added since the
+            last ingest of this file, when history was not revised.
+    Returns:
+        b (:obj:`pandas.DataFrame`): One row per key value, one column per
+            date (labelled as in the CSV header).
+    """
+    header = read_header(filename)
+    dates = [col for col in header if DATE_COLUMN.match(col)]
+    path = state_path(filename, key)
+    state = _load_state(path) if incremental is True else None
+
+    if state is not None:
+        old_header = state["header"].tolist()
+        appended = header[len(old_header):]
+        if header[:len(old_header)] == old_header and \
+                all(DATE_COLUMN.match(col) for col in appended):
+            before, after, new = scan(filename, len(appended))
+            if before == str(state["digest"]):
+                # Same rows in the same order as last time, so each row
+                # still belongs to the same region
+                regions = pd.Index(state["regions"], name=key)
+                values = state["values"]
+                if new is None:
+                    INGEST_STATS["unchanged"] += 1
+                    return pd.DataFrame(values, index=regions, columns=dates)
+                rows = state["rows"]
+                known = rows >= 0
+                totals = np.zeros((len(regions), new.shape[1]))
+                np.add.at(totals, rows[known], np.nan_to_num(new[known]))
+                # A full parse reads the file as floats if any cell is empty
+                # (see schema.read_jhu) or any count fractional
+                as_float = np.isnan(new).any() or not np.array_equal(totals, np.round(totals))
+                if values.dtype.kind == "f" or not as_float:
+                    _append_state(path, totals, state, header, after)
+                    values = _load_state(path)["values"]
+                else:
+                    # Floats in an integer matrix, store it again as floats
+                    values = np.hstack([values, totals])
+                    _save_state(path, values, regions, rows, header, after)
+                INGEST_STATS["incremental"] += 1
+                return pd.DataFrame(values, index=regions, columns=dates)
+
+    # First ingest, or JHU revised earlier data: parse everything
+    a = schema.read_jhu(filename, key, dates)
+    b = a.groupby(key, observed=True)[dates].sum()
+    # Aggregated counts are small, keep them at full width downstream
+    b = b.astype("int64" if pd.api.types.is_integer_dtype(b.dtypes.iloc[0]) else "float64")
+    b.index = pd.Index(b.index.astype(object), name=key)
+    b = b.sort_index()
+    if incremental is True:
+        rows = b.index.get_indexer(a[key].to_numpy())
+        _save_state(path, b.to_numpy(), b.index, rows, header, scan(filename)[1])
+    INGEST_STATS["full"] += 1
+    return b
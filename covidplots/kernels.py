@@ -0,0 +1,228 @@
+"""
+Smoothing kernels over whole (date, region) matrices.
+
+Every function takes a 2-D array with one row per date and one column per
+region (or a DataFrame shaped like that) and smooths all regions in one
+call, with the same NaN and min_periods semantics as the pandas method it
+replaces:
+
+    rolling_mean  DataFrame.rolling(window, center, min_periods).mean()
+    ewma          DataFrame.ewm(span/alpha, adjust, ignore_na).mean()
+
+Rolling means use cumulative sums, so their cost does not depend on the
+window length. Sums of integer counts are exact in float64, so for daily
+case and death numbers the results are identical to pandas; for other
+data they agree to rounding error.
+"""
+
+import numpy as np
+import pandas as pd
+
+def _as_array(values):
+    """ Return values as a 2-D float array and a function restoring the input type. """
+    if isinstance(values, pd.DataFrame):
+        frame = values
+        return frame.to_numpy(dtype=float), \
+            lambda out: pd.DataFrame(out, index=frame.index, columns=frame.columns)
+    if isinstance(values, pd.Series):
+        series = values
+        return series.to_numpy(dtype=float)[:, None], \
+            lambda out: pd.Series(out[:, 0], index=series.index, name=series.name)
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        return values[:, None], lambda out: out[:, 0]
+    return values, lambda out: out
+
+def rolling_sum_count(values, window, center=False):
+    """
+    Windowed sums of the non-NaN values, and how many there are.
+    Args:
+        values (:obj:`numpy.ndarray`): Array of shape (date, region).
+        window (int): Window length in rows.
+        center (Bool): If True, center the window on each row, as pandas
+            does; otherwise the window ends at each row.
+    Returns:
+        sums (:obj:`numpy.ndarray`): Sum of each window.
+        counts (:obj:`numpy.ndarray`): Number of non-NaN values in each
+            window, or a 1-D array of shape (date,) if there are no NaN.
+    """
+    n = values.shape[0]
+    # Work along the contiguous axis: DataFrames hand out column-major arrays
+    by_region = values.T
+    valid = ~np.isnan(by_region)
+    has_nan = not valid.all()
+    csum = np.zeros(by_region.shape[:-1] + (n + 1,))
+    np.cumsum(np.where(valid, by_region, 0.) if has_nan else by_region,
+              axis=-1, out=csum[..., 1:])
+    # Window of row i covers rows [i - window + 1 + offset, i + offset]
+    offset = (window - 1) // 2 if center is True else 0
+    ends = np.clip(np.arange(n) + offset + 1, 0, n)
+    starts = np.clip(np.arange(n) + offset + 1 - window, 0, n)
+    sums = np.take(csum, ends, axis=-1)
+    sums -= np.take(csum, starts, axis=-1)
+    if has_nan is False:
+        return sums.T, ends - starts
+    ccount = np.zeros(csum.shape, dtype=np.int32)
+    np.cumsum(valid, axis=-1, out=ccount[..., 1:])
+    counts = np.take(ccount, ends, axis=-1)
+    counts -= np.take(ccount, starts, axis=-1)
+    return sums.T, counts.T
+
+def rolling_mean(values, window, center=False, min_periods=None):
+    """
+    N-day mean of every region, like DataFrame.rolling(...).mean().
+    Args:
+        values: Array of shape (date, region), or a DataFrame or Series.
+        window (int): Window length in rows.
+        center (Bool): If True, center the window on each row.
+        min_periods (int): Minimum number of non-NaN values in a window,
+            below which the mean is NaN. Defaults to window.
+    Returns:
+        means: Same type and shape as values.
+    """
+    values, restore = _as_array(values)
+    if min_periods is None:
+        min_periods = window
+    sums, counts = rolling_sum_count(values, window, center)
+    if counts.ndim == 1:
+        counts = counts[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.divide(sums, counts, out=sums)
+    means[np.broadcast_to(counts < max(min_periods, 1), means.shape)] = np.nan
+    return restore(means)
+
+def ewma(values, span=None, alpha=None, adjust=True, ignore_na=False,
+         min_periods=0):
+    """
+    Exponentially weighted mean of every region, like
+    DataFrame.ewm(...).mean(). Regions are processed together, one date at
+    a time.
+    Args:
+        values: Array of shape (date, region), or a DataFrame or Series.
+        span (float): Decay in terms of span, alpha = 2 / (span + 1).
+        alpha (float): Smoothing factor, if span is not given.
+        adjust (Bool): Divide by decaying adjustment factors in beginning
+            periods, as pandas does by default.
+        ignore_na (Bool): Ignore missing values when calculating weights.
+        min_periods (int): Minimum number of observations, below which the
+            mean is NaN.
+    Returns:
+        means: Same type and shape as values.
+    """
+    values, restore = _as_array(values)
+    if span is not None:
+        alpha = 2. / (span + 1.)
+    if alpha is None or not 0 < alpha <= 1:
+        raise ValueError("Give span >= 1 or 0 < alpha <= 1")
+    old_wt_factor = 1. - alpha
+    if adjust is True and ignore_na is False and alpha < 1:
+        return restore(_ewma_adjusted(values, old_wt_factor, min_periods))
+    new_wt = 1. if adjust is True else alpha
+    out = np.empty_like(values)
+    if len(values) == 0:
+        return restore(out)
+    weighted = values[0].copy()
+    nobs = (~np.isnan(weighted)).astype(int)
+    old_wt = np.ones(values.shape[1])
+    out[0] = np.where(nobs >= max(min_periods, 1), weighted, np.nan)
+    for i in range(1, len(values)):
+        cur = values[i]
+        is_obs = ~np.isnan(cur)
+        nobs += is_obs
+        started = ~np.isnan(weighted)
+        if ignore_na is True:
+            decay = started & is_obs
+        else:
+            decay = started
+        old_wt = np.where(decay, old_wt * old_wt_factor, old_wt)
+        update = started & is_obs
+        with np.errstate(invalid="ignore"):
+            blended = (old_wt * weighted + new_wt * cur) / (old_wt + new_wt)
+        weighted = np.where(update & (weighted != cur), blended, weighted)
+        if adjust is True:
+            old_wt = np.where(update, old_wt + new_wt, old_wt)
+        else:
+            old_wt = np.where(update, 1., old_wt)
+        weighted = np.where(~started & is_obs, cur, weighted)
+        out[i] = np.where(nobs >= max(min_periods, 1), weighted, np.nan)
+    return restore(out)
+
+def _ewma_adjusted(values, decay, min_periods):
+    """
+    ewma with adjust=True and ignore_na=False: the weighted sum of the
+    observations divided by the sum of their weights, where both decay by
+    the same factor every row (NaN rows included) and each observation adds
+    weight 1. The two sums are linear recursions over rows.
+    """
+    values = np.ascontiguousarray(values)
+    valid = ~np.isnan(values)
+    sums = np.where(valid, values, 0.)
+    weights = valid.astype(float)
+    for i in range(1, len(values)):
+        sums[i] += decay * sums[i - 1]
+        weights[i] += decay * weights[i - 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = np.divide(sums, weights, out=sums)
+    nobs = np.cumsum(valid, axis=0)
+    means[nobs < max(min_periods, 1)] = np.nan
+    return means
+
+def weekday_factors(values, dates, weeks=None, window=7):
+    """
+    Typical ratio of each weekday's value to the centred weekly mean, for
+    every region (e.g. low counts reported on Sundays, catch-up on Mondays).
+    Args:
+        values: Daily values, array of shape (date, region) or a DataFrame.
+        dates (:obj:`pandas.DatetimeIndex`): Date of each row.
+        weeks (int): Only use the last this many weeks. Defaults to all.
+        window (int): Length of the centred mean the ratios are taken to.
+    Returns:
+        factors (:obj:`numpy.ndarray`): Array of shape (7, region), one row
+            per weekday (Monday first), averaging to 1 over the week.
+    """
+    values, restore = _as_array(values)
+    weekday = pd.DatetimeIndex(dates).weekday.to_numpy()
+    means = rolling_mean(values, window, center=True, min_periods=window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratios = values / means
+    ratios[~np.isfinite(ratios)] = np.nan
+    if weeks is not None:
+        ratios = ratios[-7 * weeks:]
+        weekday = weekday[-7 * weeks:]
+    # Mean ratio per weekday, ignoring NaN
+    valid = ~np.isnan(ratios)
+    filled = np.where(valid, ratios, 0.)
+    factors = np.full((7, values.shape[1]), np.nan)
+    for day in range(7):
+        rows = weekday == day
+        with np.errstate(invalid="ignore", divide="ignore"):
+            factors[day] = filled[rows].sum(axis=0) / valid[rows].sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        factors /= np.nanmean(factors, axis=0)
+    factors[~np.isfinite(factors) | (factors <= 0)] = 1.
+    return factors
+
+def weekday_adjusted(values, dates, weeks=None, window=None,
+                     min_periods=None):
+    """
+    Daily values with the weekly reporting pattern divided out, optionally
+    followed by a trailing mean.
+    Args:
+        values: Daily values, array of shape (date, region), a DataFrame or
+            a Series.
+        dates (:obj:`pandas.DatetimeIndex`): Date of each row.
+        weeks (int): Only use the last this many weeks to estimate the
+            weekday pattern. Defaults to all.
+        window (int): Length of the trailing mean applied afterwards, if
+            any.
+        min_periods (int): Passed on to rolling_mean.
+    Returns:
+        adjusted: Same type and shape as values.
+    """
+    values, restore = _as_array(values)
+    factors = weekday_factors(values, dates, weeks=weeks)
+    weekday = pd.DatetimeIndex(dates).weekday.to_numpy()
+    adjusted = values / factors[weekday]
+    if window is not None:
+        adjusted = rolling_mean(adjusted, window, min_periods=min_periods)
+    return restore(adjusted)
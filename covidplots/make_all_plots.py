@@ -1,35 +1,81 @@
 import argparse
+import sys
 
-import get_data
 import grid_plots
 import overlaid_plots
+from covidplots import cleaning, get_data, output, profiling, render_cache, scheduler
 
-def make_all_plots(deaths=False):
+def make_all_plots(deaths=False, clean=None, jobs=1, output_profile=None,
+                   use_cache=True):
     """
     Make overlaid and grid plots.
     Args:
         deaths (Bool): If True, download data on deaths.
+        clean (str): If given, fix negative daily counts and backlog dumps
+            with this cleaning strategy.
+        jobs (int): Number of plots to render in parallel.
+        output_profile (str): Output profile of the plots, see
+            output.PROFILES. If None, grid plots are PDFs and overlaid
+            plots PNGs.
+        use_cache (Bool): If True, skip plots whose data and parameters
+            did not change since they were last rendered.
+    Returns:
+        results (list): Timing and failure of each plot, see
+            scheduler.run_jobs.
     """
     
     # Get all data
-    data_usa, pops_usa = get_data.get_data("usa", deaths=deaths)
-    data_world, pops_world = get_data.get_data("world", deaths=deaths)
+    get_data.fetch_all([get_data.data_filename("usa", deaths=deaths),
+                        get_data.data_filename("world", deaths=deaths)])
+    data_usa, pops_usa = get_data.get_data("usa", deaths=deaths, clean=clean)
+    data_world, pops_world = get_data.get_data("world", deaths=deaths, clean=clean)
+    datasets = {"usa": data_usa, "usa_pops": pops_usa,
+                "world": data_world, "world_pops": pops_world}
 
-    regions = ["world", "usa", "latin", "eu_vs_usa"]
-    datas = [data_world, data_usa, data_world, data_world]
-    pops = [pops_world, pops_usa, pops_world, pops_world]
-    # Make grid plots
-    for r,d,p in zip(regions, datas, pops):
-        grid_plots.grid_plot(d, r, deaths=deaths)
+    def job(name, func, args, kwargs):
+        if use_cache is True:
+            return scheduler.RenderJob(name, render_cache.render, (func,) + args, kwargs)
+        return scheduler.RenderJob(name, func, args, kwargs)
+
+    # Make grid plots, each from the data of its region family
+    render = []
+    for r in ["usa", "latin", "eu_vs_usa", "worst_usa", "worst_global"]:
+        family = get_data.region_family(r)
+        render.append(job(f"grid {r}", grid_plots.grid_plot,
+                          (scheduler.Dataset(family),
+                           scheduler.Dataset(f"{family}_pops"), r),
+                          {"deaths": deaths, "output_profile": output_profile}))
 
     # Make overlaid plots
-    overlaid_plots.overlaid_plots("usa", data_usa, pops_usa, deaths=deaths)
+    render.append(job("overlaid usa", overlaid_plots.overlaid_plots,
+                      ("usa", scheduler.Dataset("usa"), scheduler.Dataset("usa_pops")),
+                      {"deaths": deaths, "output_profile": output_profile}))
+    return scheduler.run_jobs(render, datasets, n_jobs=jobs)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--deaths", action="store_true",
                         default=False,
                         help="Switch to plot deaths instead of cases")
+    parser.add_argument("--clean", choices=cleaning.STRATEGIES, default=None,
+                        help="Fix negative daily counts and backlog dumps with this strategy")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of plots to render in parallel")
+    parser.add_argument("--output-profile", choices=list(output.PROFILES), default=None,
+                        help="Format, resolution and size budget of the plots")
+    parser.add_argument("--no-render-cache", action="store_true", default=False,
+                        help="Render every plot, even if its inputs did not change")
+    parser.add_argument("--profile", nargs="?", const=profiling.PROFILE_REPORT, default=None,
+                        metavar="REPORT",
+                        help="Time each stage and write a JSON report (default: profiles/)")
+    parser.add_argument("--cprofile", action="store_true", default=False,
+                        help="With --profile, also run cProfile")
+    parser.add_argument("--trace-memory", action="store_true", default=False,
+                        help="With --profile, also trace the memory each stage allocates (slow)")
     args = parser.parse_args()
+    profiling.start("make_all_plots", args.profile, args.cprofile, args.trace_memory)
 
-    make_all_plots(args.deaths) 
+    results = make_all_plots(args.deaths, args.clean, args.jobs, args.output_profile,
+                             not args.no_render_cache)
+    if scheduler.failures(results):
+        sys.exit(1)
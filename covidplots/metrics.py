@@ -0,0 +1,199 @@
+"""
+Derived layers of the Covid data, computed once per dataset and served by
+name.
+
+A dataset is a frame of cumulative counts (one column per region, one row
+per date) as returned by get_data.get_data or datastore.DataStore.frame.
+Its derived layers are whole-matrix operations on it, named after what
+they hold:
+
+    new_cases                daily differences
+    new_cases_7d             trailing 7 day mean of new_cases
+    new_cases_7d_centred     centred 7 day mean of new_cases
+    new_cases_7d_per100k     ... per 100,000 people
+    new_cases_ewm7           exponentially weighted mean of new_cases, span 7
+    new_cases_wdadj          new_cases with the weekday reporting pattern removed
+    new_cases_wdadj_7d       trailing 7 day mean of new_cases_wdadj
+    cases_per1m              cumulative counts per million people
+    fully_vaccinated_pct     cumulative counts per 100 people
+
+Layers are cached in memory by a digest of the dataset contents (and
+populations), so every consumer of the same data shares one computation.
+"""
+
+import hashlib
+import re
+
+import numpy as np
+import pandas as pd
+
+from covidplots import _memo, kernels, profiling
+from covidplots.population import PopulationIndex
+
+# Number of layers kept in memory
+LAYER_CACHE_SIZE = 64
+LAYER_STATS = {"hits": 0, "misses": 0}
+WINDOW_MIN_PERIODS = 2
+_LAYERS = _memo.Memo(LAYER_CACHE_SIZE, LAYER_STATS)
+LAYER_NAME = re.compile(r"^(?P<new>new_)?(?P<metric>[a-z_]+?)(?P<wdadj>_wdadj)?"
+                        r"(?:_(?P<window>\d+)d(?P<centred>_centred)?|_ewm(?P<span>\d+))?"
+                        r"(?:_per(?P<per>\d+[km]?)|(?P<pct>_pct))?$")
+SCALE_SUFFIXES = {"": 1, "k": 1000, "m": 1000000}
+
+def layer_stats():
+    """
+    Report how many layers were served from the cache.
+    Returns:
+        stats (dict): Number of cache hits and misses.
+    """
+    return dict(LAYER_STATS)
+
+def capita_label(capita):
+    """
+    Suffix of layer names for a per-capita scale.
+    Args:
+        capita (int): Report values per this many people, e.g. 100000.
+    Returns:
+        label (str): E.g. '100k', '1m' or '100'.
+    """
+    capita = int(capita)
+    for suffix, scale in [("m", 1000000), ("k", 1000)]:
+        if capita >= scale and capita % scale == 0:
+            return f"{capita // scale}{suffix}"
+    return str(capita)
+
+def layer_name(metric, new=True, window=None, centred=False, capita=None,
+               weekday=False, span=None):
+    """
+    Name of a derived layer.
+    Args:
+        metric (str): Name of the dataset, e.g. 'cases' or 'fully_vaccinated'.
+        new (Bool): If True, daily differences instead of cumulative counts.
+        window (int): Length in days of the rolling mean, if any.
+        centred (Bool): If True, the rolling mean is centred on each day.
+        capita (int): Report values per this many people, if not None.
+        weekday (Bool): If True, remove the weekday reporting pattern first.
+        span (int): Span in days of an exponentially weighted mean, used
+            instead of window.
+    Returns:
+        name (str): Layer name, e.g. 'new_cases_7d_per100k'.
+    """
+    name = f"new_{metric}" if new is True else metric
+    if weekday is True:
+        name += "_wdadj"
+    if span is not None:
+        name += f"_ewm{span}"
+    elif window is not None:
+        name += f"_{window}d"
+        if centred is True:
+            name += "_centred"
+    if capita is not None:
+        name += f"_per{capita_label(capita)}"
+    return name
+
+def dataset_digest(data, pops=None):
+    """
+    Digest identifying the contents of a dataset.
+    Args:
+        data (:obj:`pandas.DataFrame`): Cumulative counts.
+        pops (:obj:`PopulationIndex`): Populations aligned with data.
+    Returns:
+        digest (str): Hex SHA1 digest.
+    """
+    h = hashlib.sha1()
+    h.update(str(data.shape).encode())
+    h.update(np.ascontiguousarray(data.to_numpy(dtype=float)).tobytes())
+    h.update(np.ascontiguousarray(data.index.asi8).tobytes()
+             if isinstance(data.index, pd.DatetimeIndex)
+             else "\0".join(map(str, data.index)).encode())
+    h.update("\0".join(map(str, data.columns)).encode())
+    if pops is not None:
+        h.update(np.ascontiguousarray(pops.values).tobytes())
+    return h.hexdigest()
+
+class Metrics:
+    """
+    Derived layers of one dataset.
+
+    Attributes:
+        data (:obj:`pandas.DataFrame`): Cumulative counts.
+        metric (str): Name of the dataset, used in layer names.
+        pops (:obj:`PopulationIndex`): Populations aligned with the data
+            columns, or None.
+    """
+
+    def __init__(self, data, pops=None, metric="cases"):
+        """
+        Args:
+            data (:obj:`pandas.DataFrame`): Cumulative counts.
+            pops (:obj:`pandas.DataFrame` or :obj:`PopulationIndex`):
+                Populations, needed for per-capita layers.
+            metric (str): Name of the dataset, e.g. 'cases', 'deaths',
+                'fully_vaccinated' or 'partially_vaccinated'.
+        """
+        if isinstance(pops, pd.DataFrame):
+            pops = PopulationIndex.from_frame(pops, data.columns)
+        elif pops is not None:
+            pops = PopulationIndex(data.columns, pops.aligned(data.columns))
+        self.data = data
+        self.pops = pops
+        self.metric = metric
+        self._digest = None
+
+    @property
+    def digest(self):
+        if self._digest is None:
+            self._digest = dataset_digest(self.data, self.pops)
+        return self._digest
+
+    def __getitem__(self, name):
+        return self.layer(name)
+
+    def layer(self, name):
+        """
+        Derived layer by name, computed on first use.
+        Args:
+            name (str): Layer name, see the module docstring.
+        Returns:
+            layer (:obj:`pandas.DataFrame`): One column per region. Values
+                are shared with other users of the same layer and are
+                read-only; columns may be added freely.
+        """
+        key = (self.digest, name)
+        layer = _LAYERS.get(key)
+        if layer is None:
+            layer = _memo.read_only(self._compute(name))
+            _LAYERS.put(key, layer)
+        return layer.copy(deep=False)
+
+    @profiling.timed("derive", rows=profiling.records)
+    def _compute(self, name):
+        match = LAYER_NAME.match(name)
+        if match is None or match["metric"] != self.metric:
+            raise KeyError(f"Layer {name} not available for {self.metric}")
+        if match["per"] is not None or match["pct"] is not None:
+            # Scale the unscaled layer, which is cached too
+            base = name[:match.start("per") - len("_per")] if match["per"] \
+                else name[:match.start("pct")]
+            if self.pops is None:
+                raise KeyError(f"Layer {name} needs populations")
+            if match["pct"] is not None:
+                capita = 100
+            else:
+                per = match["per"]
+                capita = int(per.rstrip("km")) * SCALE_SUFFIXES[per.lstrip("0123456789")]
+            return self.pops.per_capita(self.layer(base), capita)
+        if match["window"] is not None:
+            base = name[:match.start("window") - 1]
+            centred = match["centred"] is not None
+            return kernels.rolling_mean(self.layer(base), int(match["window"]),
+                                        center=centred, min_periods=WINDOW_MIN_PERIODS)
+        if match["span"] is not None:
+            base = name[:match.start("span") - len("_ewm")]
+            return kernels.ewma(self.layer(base), span=int(match["span"]))
+        if match["wdadj"] is not None:
+            base = name[:match.start("wdadj")]
+            return kernels.weekday_adjusted(self.layer(base), self.data.index)
+        if match["new"] is not None:
+            return self.data.diff()
+        return self.data
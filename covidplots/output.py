@@ -0,0 +1,167 @@
+"""
+Output profiles: how a figure is written for a given use.
+
+A profile lists the (format, dpi) pairs it accepts, best first, and a
+budget in bytes per file. save_figure writes the first candidate that fits
+the budget (or, if none does, the smallest). In vector formats the data
+layers (bars, lines, patches) of a profile with rasterize=True are written
+as images at the profile's dpi while text, ticks and frames stay vector,
+so a grid of 50 panels of ~1,100 bars each is a few images instead of tens
+of thousands of paths.
+
+    print      PDF with rasterised data layers, for printing and zooming
+    web        WebP (or PNG) for the dashboard
+    thumbnail  small WebP (or PNG) previews
+
+Every save reports the format, size and time it took, so profiles can be
+compared.
+"""
+
+import io
+import os
+import time
+from collections import namedtuple
+
+from matplotlib.patches import Patch
+
+from covidplots import profiling
+
+# candidates: list of (format, dpi), best first. max_bytes: budget per
+# file, None for no budget.
+Profile = namedtuple("Profile", ["name", "candidates", "rasterize", "max_bytes"])
+
+PROFILES = {
+    "print": Profile("print", [("pdf", 300), ("pdf", 200), ("pdf", 150)],
+                     True, 2000000),
+    "web": Profile("web", [("webp", 150), ("webp", 100), ("png", 100), ("webp", 72)],
+                   True, 500000),
+    "thumbnail": Profile("thumbnail", [("webp", 50), ("png", 50), ("webp", 30)],
+                         True, 60000),
+}
+VECTOR_FORMATS = ["pdf", "svg", "eps", "ps"]
+
+def _rasterize_data(fig):
+    """
+    Rasterise the data layers of every axes of a figure: collections,
+    lines and patches drawn in data coordinates. The axes background and
+    artists placed in axes or figure coordinates (annotation boxes, frames)
+    stay vector.
+    Returns:
+        changed (list): Artists whose rasterized flag was set, to restore
+            it after saving.
+    """
+    changed = []
+    for ax in fig.axes:
+        overlays = (ax.transAxes, fig.transFigure)
+        for artist in list(ax.collections) + list(ax.lines) + list(ax.patches):
+            # Of patches, the transform of their coordinates, not that of
+            # their shape
+            transform = artist.get_data_transform() if isinstance(artist, Patch) \
+                else artist.get_transform()
+            if artist is ax.patch or transform in overlays:
+                continue
+            if not artist.get_rasterized():
+                artist.set_rasterized(True)
+                changed.append(artist)
+    return changed
+
+def _render(fig, fmt, dpi, rasterize, pngs, **kwargs):
+    """
+    Render a figure to bytes.
+    Args:
+        fmt (str): File format.
+        dpi (float): Resolution.
+        rasterize (Bool): If True, rasterise the data layers of vector
+            formats.
+        pngs (dict): PNG renders by dpi. Other raster formats are converted
+            from them, since drawing the figure costs the same at any dpi
+            while encoding is cheap.
+    Returns:
+        data (bytes): File contents.
+    """
+    if fmt not in VECTOR_FORMATS:
+        if dpi not in pngs:
+            buf = io.BytesIO()
+            fig.savefig(buf, format="png", dpi=dpi, **kwargs)
+            pngs[dpi] = buf.getvalue()
+        if fmt == "png":
+            return pngs[dpi]
+        # Only needed for formats matplotlib does not write itself
+        from PIL import Image
+        buf = io.BytesIO()
+        with Image.open(io.BytesIO(pngs[dpi])) as image:
+            image.save(buf, format=fmt)
+        return buf.getvalue()
+    changed = _rasterize_data(fig) if rasterize is True else []
+    try:
+        buf = io.BytesIO()
+        fig.savefig(buf, format=fmt, dpi=dpi, **kwargs)
+    finally:
+        # Figures may be reused (see grid_plots.GridFigure)
+        for artist in changed:
+            artist.set_rasterized(False)
+    return buf.getvalue()
+
+@profiling.timed("save")
+def save_figure(fig, filename, profile=None, max_bytes=None, **kwargs):
+    """
+    Save a figure, with an output profile if given.
+    Args:
+        fig (:obj:`matplotlib.figure.Figure`): Figure to save.
+        filename (str): Output file. With a profile, its extension is
+            replaced by that of the format chosen.
+        profile (str): One of PROFILES. If None, the figure is saved to
+            filename as is, with kwargs.
+        max_bytes (int): Budget per file, overriding that of the profile.
+        kwargs: Passed to savefig, e.g. bbox_inches. With a profile, dpi
+            and format are chosen by the profile.
+    Returns:
+        report (dict): filename, profile, format, dpi, bytes, seconds and
+            the number of candidates tried (tries).
+    """
+    t0 = time.perf_counter()
+    root, ext = os.path.splitext(filename)
+    # Written to a new file and moved into place, so that readers never see
+    # a partial file and hard links to the old one (see render_cache) are
+    # left untouched
+    tmppath = f"{root}.{os.getpid()}.tmp{ext}"
+    if profile is None:
+        fig.savefig(tmppath, **kwargs)
+        os.replace(tmppath, filename)
+        fmt = ext.lstrip(".")
+        report = {"filename": filename, "profile": None, "format": fmt,
+                  "dpi": kwargs.get("dpi", fig.dpi), "bytes": os.path.getsize(filename),
+                  "tries": 1}
+    else:
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown output profile {profile}, use one of {list(PROFILES)}")
+        prof = PROFILES[profile]
+        budget = prof.max_bytes if max_bytes is None else max_bytes
+        kwargs.pop("dpi", None)
+        kwargs.pop("format", None)
+        best = None
+        tries = 0
+        pngs = {}
+        for fmt, dpi in prof.candidates:
+            data = _render(fig, fmt, dpi, prof.rasterize, pngs, **kwargs)
+            tries += 1
+            if best is None or len(data) < len(best[2]):
+                best = (fmt, dpi, data)
+            if budget is None or len(data) <= budget:
+                best = (fmt, dpi, data)
+                break
+        fmt, dpi, data = best
+        filename = f"{root}.{fmt}"
+        with open(tmppath, "wb") as f1:
+            f1.write(data)
+        os.replace(tmppath, filename)
+        report = {"filename": filename, "profile": profile, "format": fmt, "dpi": dpi,
+                  "bytes": len(data), "tries": tries}
+        if budget is not None and len(data) > budget:
+            print(f"!!! {filename} is {len(data):,} bytes, over the {budget:,} byte "
+                  f"budget of profile {profile}")
+    report["seconds"] = time.perf_counter() - t0
+    profiling.count(report["bytes"], "bytes")
+    print(f"Saved {report['filename']} ({report['bytes']/1e3:,.0f} kB, "
+          f"{report['format']} at {report['dpi']:.0f} dpi, {report['seconds']:.1f}s)")
+    return report
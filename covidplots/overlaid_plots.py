@@ -7,7 +7,7 @@ from matplotlib.ticker import ScalarFormatter
 import datetime
 import argparse
 
-import get_data
+from covidplots import cleaning, get_data, metrics, output, population, profiling
 
 matplotlib.use('agg')
 matplotlib.style.use('ggplot')
@@ -19,8 +19,9 @@ SUBSET_COUNTIRES = ['China','El Salvador','Iran','Italy','Japan',
                     'Korea, South','Spain','Taiwan*','US']
 N_MIN = 100
 
+@profiling.timed("overlaid_plots")
 def overlaid_plots(region, all_data, pops, region_subset=None, outdir="plots",
-                   deaths=False):
+                   deaths=False, output_profile=None):
     """
     Make plots with a subset of states/nations overplotted in one scatter plot. 
         region (str): Country/state of interest. Acceptable values are 'world', 
@@ -29,6 +30,11 @@ def overlaid_plots(region, all_data, pops, region_subset=None, outdir="plots",
         region_subset (list): States/nations of interest.
         outdir (str): Name of directory to save plots to.
         deaths (Bool): If True, download data on deaths.
+        output_profile (str): Output profile ('print', 'web' or
+            'thumbnail', see output.PROFILES). If None, write PNGs.
+    Returns:
+        reports (list): Output file, format, size and time taken to write
+            it, of each plot, see output.save_figure.
     """
     
     if deaths is True:
@@ -48,15 +54,20 @@ def overlaid_plots(region, all_data, pops, region_subset=None, outdir="plots",
    
     clist = plt.cm.tab20(np.linspace(0, 1, len(region_subset)))
     data_subset = all_data[region_subset]
-    data_subset_capita = capita * data_subset.div(pops[region_subset].iloc[0], 
-                                          axis="columns")
+    popidx = population.PopulationIndex.from_frame(pops, region_subset)
+    layers = metrics.Metrics(data_subset, popidx, lbl)
+    data_subset_capita = layers[metrics.layer_name(lbl, new=False, capita=capita)]
 
+    # From the data rather than the clock, so the figure only depends on
+    # its inputs (see render_cache)
+    xright = data_subset.index[-1] + datetime.timedelta(days=2)
+    reports = []
     for log in [False, True]:
         fig, ax = plt.subplots(1, 1, figsize=(12, 8))
         ax.set_xlabel("Date", fontsize="large")
         ax.set_ylabel(f'Number of {lbl} per {capita:,}', fontsize='large')
         data_subset_capita.plot(ax=ax, marker="o", ms=5, colormap="tab20")
-        ax.set_xlim(datetime.date(2020, 3, 1), datetime.datetime.now() + datetime.timedelta(days=2))
+        ax.set_xlim(datetime.date(2020, 3, 1), xright)
         if log is True:
             ax.set_ylim(bottom=1)
             ax.semilogy()
@@ -67,14 +78,13 @@ def overlaid_plots(region, all_data, pops, region_subset=None, outdir="plots",
             filename = os.path.join(outdir, f"{region}_{lbl}_capita_date.png")
             title = f"Number of {lbl} per {capita:,} by Date"
         fig.suptitle(title)
-        fig.savefig(filename, bbox_inches="tight")
-        print(f"Saved {filename}")
+        reports.append(output.save_figure(fig, filename, output_profile, bbox_inches="tight"))
 
         fig, ax = plt.subplots(1, 1, figsize=(12, 8))
         ax.set_xlabel("Date", fontsize="large")
         ax.set_ylabel(f'Number of {lbl}', fontsize='large')
         data_subset.plot(ax=ax, marker="o", ms=5, colormap="tab20")
-        ax.set_xlim(datetime.date(2020, 3, 1), datetime.datetime.now() + datetime.timedelta(days=2))
+        ax.set_xlim(datetime.date(2020, 3, 1), xright)
         if log is True:
             ax.semilogy()
             filename = os.path.join(outdir, f"{region}_{lbl}_date_log.png")
@@ -83,8 +93,7 @@ def overlaid_plots(region, all_data, pops, region_subset=None, outdir="plots",
             filename = os.path.join(outdir, f"{region}_{lbl}_date.png")
             title = f"Number of {lbl} by Date"
         fig.suptitle(title)
-        fig.savefig(filename, bbox_inches="tight")
-        print(f"Saved {filename}")
+        reports.append(output.save_figure(fig, filename, output_profile, bbox_inches="tight"))
 
         fig1, ax1 = plt.subplots(1, 1, figsize=(12, 8))
         fig2, ax2 = plt.subplots(1, 1, figsize=(12, 8))
@@ -94,7 +103,7 @@ def overlaid_plots(region, all_data, pops, region_subset=None, outdir="plots",
         ax2.set_ylabel(f'Number of {lbl} Per {capita:,}', fontsize='large')
         for i,statenation in enumerate(region_subset):
             data_subset_date = data_subset.loc[lambda df: df[statenation] > N_MIN, statenation]
-            data_subset_capita_date = capita * data_subset_date.div(pops[statenation].iloc[0])
+            data_subset_capita_date = data_subset_date * (capita / popidx[statenation])
             ax1.plot(data_subset_date.values, label=statenation, 
                      marker="o", ms=5, c=clist[i]) 
             ax2.plot(data_subset_capita_date.values, label=statenation,
@@ -118,19 +127,31 @@ def overlaid_plots(region, all_data, pops, region_subset=None, outdir="plots",
         fig2.suptitle(title2)
         ax1.legend()
         ax2.legend()
-        fig1.savefig(filename1, bbox_inches="tight")
-        print(f"Saved {filename1}")
-        fig2.savefig(filename2, bbox_inches="tight")
-        print(f"Saved {filename2}")
+        reports.append(output.save_figure(fig1, filename1, output_profile, bbox_inches="tight"))
+        reports.append(output.save_figure(fig2, filename2, output_profile, bbox_inches="tight"))
+    return reports
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-d", "--deaths", action="store_true",
                         default=False,
                         help="Switch to plot deaths instead of cases")
+    parser.add_argument("--clean", choices=cleaning.STRATEGIES, default=None,
+                        help="Fix negative daily counts and backlog dumps with this strategy")
+    parser.add_argument("--output-profile", choices=list(output.PROFILES), default=None,
+                        help="Format, resolution and size budget of the plots (default: PNG)")
+    parser.add_argument("--profile", nargs="?", const=profiling.PROFILE_REPORT, default=None,
+                        metavar="REPORT",
+                        help="Time each stage and write a JSON report (default: profiles/)")
+    parser.add_argument("--cprofile", action="store_true", default=False,
+                        help="With --profile, also run cProfile")
+    parser.add_argument("--trace-memory", action="store_true", default=False,
+                        help="With --profile, also trace the memory each stage allocates (slow)")
     args = parser.parse_args()
+    profiling.start("overlaid_plots", args.profile, args.cprofile, args.trace_memory)
 
     regions = ["usa"]
     for item in regions:
-        data, pops = get_data.get_data(item, deaths=args.deaths)
-        overlaid_plots(item, data, pops, deaths=args.deaths)
+        data, pops = get_data.get_data(item, deaths=args.deaths, clean=args.clean)
+        overlaid_plots(item, data, pops, deaths=args.deaths,
+                       output_profile=args.output_profile)
@@ -5,7 +5,7 @@ import matplotlib
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 
-import get_data
+from covidplots import bars, cleaning, get_data, metrics, output, profiling, render_cache
 
 stylesheet = "seaborn-dark"
 #stylesheet = "dark_background"
@@ -19,8 +19,9 @@ else:
     contrast_c = "crimson"
     alpha = 0.3
 
+@profiling.timed("plot_by_region")
 def plot_by_region(region, data_world, data_usa, pops_world, pops_usa, 
-                   outdir="plots", deaths=False):
+                   outdir="plots", deaths=False, renderer=None, output_profile=None):
     """
     Plot a bar plot of daily new cases or deaths for a single state or country.
     Args:
@@ -32,6 +33,13 @@ def plot_by_region(region, data_world, data_usa, pops_world, pops_usa,
         data_usa (:obj:`pandas.DataFrame`): USA state populations..
         outdir (str): Name of directory to save plots to.
         deaths (Bool): If True, download data on deaths.
+        renderer (str): How to draw the daily bars, one of bars.RENDERERS.
+            Defaults to bars.BAR_RENDERER.
+        output_profile (str): Output profile ('print', 'web' or
+            'thumbnail', see output.PROFILES). If None, write a 200 dpi PNG.
+    Returns:
+        report (dict): Output file, format, size and time taken to write
+            it, see output.save_figure.
     """
 
     if deaths is True:
@@ -39,20 +47,22 @@ def plot_by_region(region, data_world, data_usa, pops_world, pops_usa,
     else:
         lbl = "cases"
 
-    try:
-        data_region = data_world[region].diff()
+    if region in data_world:
+        layers = metrics.Metrics(data_world, metric=lbl)
         if region == "US":
             population = 328000000
         else:
             population = None
-    except:
-        data_region = data_usa[region].diff()
+    else:
+        layers = metrics.Metrics(data_usa, metric=lbl)
         population = pops_usa[region][0]
+    data_region = layers[metrics.layer_name(lbl)][region]
+    avg_region = layers[metrics.layer_name(lbl, window=7, centred=True)][region]
     
     fig, ax = plt.subplots(1, 1, figsize=(10,5))
-    ax.bar(data_region.index, data_region, color=bar_c, alpha=alpha)
-    ax.plot(data_region.rolling(7, center=True, min_periods=2).mean(), 
-                c=contrast_c, lw=2)
+    bars.daily_bars(ax, data_region.index, data_region, renderer=renderer,
+                    color=bar_c, alpha=alpha)
+    ax.plot(avg_region, c=contrast_c, lw=2)
     lastval = int(data_region[-1])
     future1day = data_region.index[-1] + datetime.timedelta(days=1)
     future3day = data_region.index[-1] + datetime.timedelta(days=3)
@@ -89,8 +99,7 @@ def plot_by_region(region, data_world, data_usa, pops_world, pops_usa,
     if not os.path.exists(outdir):
         os.mkdir(outdir)
     outfilename = os.path.join(outdir, f"{region}_new_{lbl}.png")
-    plt.savefig(outfilename, bbox_index='tight', dpi=200)
-    print(f"Saved {outfilename}")
+    return output.save_figure(fig, outfilename, output_profile, bbox_inches='tight', dpi=200)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -99,10 +108,42 @@ if __name__ == "__main__":
     parser.add_argument("-d", "--deaths", action="store_true",
                         default=False,
                         help="Switch to plot deaths instead of cases")
+    parser.add_argument("--clean", choices=cleaning.STRATEGIES, default=None,
+                        help="Fix negative daily counts and backlog dumps with this strategy")
+    parser.add_argument("--bars", choices=bars.RENDERERS, default=bars.BAR_RENDERER,
+                        help="How to draw daily bars ('poly' draws them as one artist)")
+    parser.add_argument("--output-profile", choices=list(output.PROFILES), default=None,
+                        help="Format, resolution and size budget of the plot (default: PNG)")
+    parser.add_argument("--no-render-cache", action="store_true", default=False,
+                        help="Render the plot, even if its inputs did not change")
+    parser.add_argument("--profile", nargs="?", const=profiling.PROFILE_REPORT, default=None,
+                        metavar="REPORT",
+                        help="Time each stage and write a JSON report (default: profiles/)")
+    parser.add_argument("--cprofile", action="store_true", default=False,
+                        help="With --profile, also run cProfile")
+    parser.add_argument("--trace-memory", action="store_true", default=False,
+                        help="With --profile, also trace the memory each stage allocates (slow)")
     args = parser.parse_args()
+    profiling.start("plot_by_region", args.profile, args.cprofile, args.trace_memory)
 
-    data_usa, pops_usa = get_data.get_data("usa", deaths=args.deaths)
-    data_world, pops_world = get_data.get_data("world", deaths=args.deaths)
-    plot_by_region(args.region, data_world, data_usa, pops_world, pops_usa, 
-                   deaths=args.deaths)
+    get_data.fetch_all([get_data.data_filename("usa", deaths=args.deaths),
+                        get_data.data_filename("world", deaths=args.deaths)])
+    data_usa, pops_usa = get_data.get_data("usa", deaths=args.deaths, clean=args.clean)
+    data_world, pops_world = get_data.get_data("world", deaths=args.deaths, clean=args.clean)
+    if args.no_render_cache is True:
+        plot_by_region(args.region, data_world, data_usa, pops_world, pops_usa, 
+                       deaths=args.deaths, renderer=args.bars,
+                       output_profile=args.output_profile)
+    else:
+        # Only the series of the region goes into the cache key, so the plot
+        # is reused when other regions changed
+        if args.region in data_world:
+            data_world, data_usa = data_world[[args.region]], data_usa.iloc[:, :0]
+            pops_usa = pops_usa.iloc[:, :0]
+        else:
+            data_world, data_usa = data_world.iloc[:, :0], data_usa[[args.region]]
+            pops_usa = pops_usa[[args.region]]
+        render_cache.render(plot_by_region, args.region, data_world, data_usa,
+                            pops_world.iloc[:, :0], pops_usa, deaths=args.deaths,
+                            renderer=args.bars, output_profile=args.output_profile)
 
@@ -0,0 +1,115 @@
+"""
+Population lookups aligned with the columns of the Covid data.
+
+The census files are read once per process. A PopulationIndex holds the
+populations of a set of states or countries as a float array, in the same
+order as the data columns, so per-capita scaling of every region is a
+single vectorised division, plus a dict for looking up single regions.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from covidplots import get_data, regions
+
+class PopulationIndex:
+    """
+    Populations of a set of regions.
+
+    Attributes:
+        names (:obj:`pandas.Index`): Region names.
+        values (:obj:`numpy.ndarray`): Population of each region, in the
+            order of names (NaN where unknown).
+        lookup (dict): Population of each region, by name.
+    """
+
+    def __init__(self, names, values):
+        self.names = pd.Index(names)
+        self.values = np.asarray(values, dtype=float)
+        self.values.flags.writeable = False
+        self.lookup = dict(zip(self.names, self.values))
+
+    @classmethod
+    def from_frame(cls, pops, columns=None):
+        """
+        Build an index from populations as returned by get_data.get_data.
+        Args:
+            pops (:obj:`pandas.DataFrame`): One row, one column per region.
+            columns (list): Regions to align with. Defaults to the columns
+                of pops.
+        Returns:
+            index (:obj:`PopulationIndex`): Population index.
+        """
+        if columns is None:
+            columns = pops.columns
+        values = pops.iloc[0].reindex(columns).to_numpy(dtype=float)
+        return cls(columns, values)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, name):
+        return name in self.lookup
+
+    def __getitem__(self, name):
+        """ Population of one region, NaN if unknown. """
+        return self.lookup.get(name, np.nan)
+
+    def aligned(self, columns):
+        """
+        Populations in the order of columns.
+        Args:
+            columns (list): Region names.
+        Returns:
+            values (:obj:`numpy.ndarray`): Populations (NaN where unknown).
+        """
+        if self.names.equals(pd.Index(columns)):
+            return self.values
+        inds = self.names.get_indexer(columns)
+        return np.where(inds >= 0, self.values[inds], np.nan)
+
+    def per_capita(self, data, capita=1):
+        """
+        Scale every column of data by the population of its region.
+        Args:
+            data (:obj:`pandas.DataFrame`): One column per region.
+            capita (int): Report values per this many people.
+        Returns:
+            scaled (:obj:`pandas.DataFrame`): data * capita / population.
+        """
+        factors = capita / self.aligned(data.columns)
+        return pd.DataFrame(data.to_numpy() * factors, index=data.index,
+                            columns=data.columns)
+
+@lru_cache(maxsize=None)
+def _census_by_id(family):
+    registry = regions.registry(family)
+    pops = get_data.read_pops(family)
+    ids = registry.ids(pops.columns, "census")
+    by_id, present = registry.collect(pops.to_numpy(dtype=float), ids, fill=np.nan)
+    return by_id[0]
+
+@lru_cache(maxsize=32)
+def _population_index(family, columns):
+    by_id = _census_by_id(family)
+    ids = regions.registry(family).ids(columns, add=False)
+    return PopulationIndex(columns, regions.gather(by_id, ids))
+
+def population_index(region, columns):
+    """
+    Population index for the columns of a data frame, built once per
+    process for each distinct set of columns.
+    Args:
+        region (str): Country of interest. Acceptable values are 'world',
+            'usa', 'latin', 'eu_vs_usa', 'worst_usa', 'worst_global'.
+        columns (list): Region names (JHU spelling), e.g. data.columns.
+    Returns:
+        index (:obj:`PopulationIndex`): Populations aligned with columns.
+    """
+    if region in ["usa", "us", "worst_usa"]:
+        family = "usa"
+    else:
+        family = "world"
+    return _population_index(family, tuple(columns))
@@ -0,0 +1,306 @@
+"""
+Stage timers for the plotting pipeline.
+
+A refresh downloads files, parses them, derives layers (daily counts,
+averages, per-capita values), builds figures and saves them. Each of these
+is a named stage: a function decorated with timed() or a block inside
+stage(). Stages nest, and are recorded by path, e.g.
+"grid_plot/derive" for layers computed while building a grid plot, so the
+self time of a plotting function is the time spent drawing it.
+
+For every stage path the table holds the number of calls, wall and CPU
+time, self wall time (minus nested stages), counters such as the number of
+records processed (one per date and region) and memory: the peak resident
+size of the process when the stage ended, and optionally the peak memory
+allocated while it ran (traced with tracemalloc, which makes pandas and
+matplotlib code several times slower).
+
+Timers are off unless enabled, and then cost a function call per stage.
+The plotting scripts enable them with --profile, which writes a JSON
+report when the script exits (see start), and --cprofile, which also runs
+cProfile in the main process.
+
+    > python grid_plots.py --regions usa --profile
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+# Default report path, formatted with the script name and start time
+PROFILE_REPORT = os.path.join("profiles", "{script}-{time:%Y%m%d-%H%M%S}.json")
+# Number of functions listed from the cProfile statistics
+CPROFILE_TOP = 25
+ENABLED = False
+_STAGES = {}
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+_SESSION = {}
+
+def enable(trace_memory=False):
+    """
+    Start recording stages.
+    Args:
+        trace_memory (Bool): If True, also record the peak memory allocated
+            by each stage. Tracing allocations slows Python code down
+            several times.
+    """
+    global ENABLED
+    ENABLED = True
+    if trace_memory is True and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def disable():
+    """ Stop recording stages. Recorded stages are kept. """
+    global ENABLED
+    ENABLED = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def _stack():
+    stack = getattr(_LOCAL, "stack", None)
+    if stack is None:
+        stack = _LOCAL.stack = []
+    return stack
+
+def _max_rss(children=False):
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children is True else resource.RUSAGE_SELF
+    # Kilobytes on Linux, bytes on macOS
+    return resource.getrusage(who).ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+def _record(path, calls, wall, self_wall, cpu, rss, peak, counters):
+    with _LOCK:
+        rec = _STAGES.setdefault(path, {"calls": 0, "wall": 0., "self_wall": 0., "cpu": 0.,
+                                        "max_rss_bytes": None, "peak_bytes": None,
+                                        "counters": {}})
+        rec["calls"] += calls
+        rec["wall"] += wall
+        rec["self_wall"] += self_wall
+        rec["cpu"] += cpu
+        if rss is not None:
+            rec["max_rss_bytes"] = max(rss, rec["max_rss_bytes"] or 0)
+        if peak is not None:
+            rec["peak_bytes"] = max(peak, rec["peak_bytes"] or 0)
+        for name, n in counters.items():
+            rec["counters"][name] = rec["counters"].get(name, 0) + n
+
+@contextmanager
+def stage(name):
+    """
+    Time a block as a stage, nested in the current one.
+    Args:
+        name (str): Stage name. A stage directly inside one of the same
+            name (e.g. a recursive function) is part of it.
+    """
+    stack = _stack()
+    if ENABLED is False or (stack and stack[-1]["name"] == name):
+        yield
+        return
+    path = f"{stack[-1]['path']}/{name}" if stack else name
+    frame = {"name": name, "path": path, "counters": {}, "child_wall": 0.,
+             "child_peak": 0, "base": None}
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            stack[-1]["child_peak"] = max(stack[-1]["child_peak"], peak)
+        tracemalloc.reset_peak()
+        frame["base"] = current
+    stack.append(frame)
+    t0 = time.perf_counter()
+    c0 = time.process_time()
+    try:
+        yield
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - c0
+        stack.pop()
+        peak = None
+        if frame["base"] is not None and tracemalloc.is_tracing():
+            top = max(tracemalloc.get_traced_memory()[1], frame["child_peak"])
+            peak = top - frame["base"]
+            if stack:
+                stack[-1]["child_peak"] = max(stack[-1]["child_peak"], top)
+        if stack:
+            stack[-1]["child_wall"] += wall
+        _record(path, 1, wall, wall - frame["child_wall"], cpu, _max_rss(), peak,
+                frame["counters"])
+
+def count(n, counter="rows"):
+    """
+    Add to a counter of the current stage.
+    Args:
+        n (int): Amount to add.
+        counter (str): Counter name, e.g. 'rows' or 'bytes'.
+    """
+    stack = _stack()
+    if ENABLED is True and stack:
+        counters = stack[-1]["counters"]
+        counters[counter] = counters.get(counter, 0) + int(n)
+
+def records(result):
+    """
+    Number of records in the result of a data function: one per date and
+    region, i.e. the rows of a long frame (with a date column) or the
+    values of a wide one. Of several frames, the first is counted.
+    """
+    if isinstance(result, tuple):
+        result = result[0]
+    if hasattr(result, "columns") and "date" in result.columns:
+        return len(result)
+    return getattr(result, "size", 0)
+
+def timed(name, rows=None):
+    """
+    Decorator recording every call of a function as a stage.
+    Args:
+        name (str): Stage name.
+        rows (function): If given, called on the result of the function
+            to count the records it processed, e.g. records.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if ENABLED is False:
+                return func(*args, **kwargs)
+            with stage(name):
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    count(rows(result))
+            return result
+        return wrapper
+    return decorator
+
+def stages():
+    """
+    Stages recorded so far.
+    Returns:
+        stages (dict): For each stage path, calls, wall, self_wall and cpu
+            (seconds), max_rss_bytes (peak resident size of the process
+            when the stage ended), peak_bytes (peak memory allocated while
+            it ran, None if allocations were not traced) and counters.
+    """
+    with _LOCK:
+        return {path: dict(rec, counters=dict(rec["counters"]))
+                for path, rec in _STAGES.items()}
+
+def collect():
+    """
+    Stages recorded so far, which are then cleared. Used by worker
+    processes to send their stages to the main process, see merge.
+    Returns:
+        stages (dict): See stages.
+    """
+    with _LOCK:
+        recorded = dict(_STAGES)
+        _STAGES.clear()
+    return recorded
+
+def merge(recorded):
+    """
+    Add stages recorded elsewhere, e.g. in a worker process, below the
+    current stage.
+    Args:
+        recorded (dict): Result of collect.
+    """
+    stack = _stack()
+    for path, rec in recorded.items():
+        if stack:
+            path = f"{stack[-1]['path']}/{path}"
+        _record(path, rec["calls"], rec["wall"], rec["self_wall"], rec["cpu"],
+                rec["max_rss_bytes"], rec["peak_bytes"], rec["counters"])
+
+def start(script, report=None, cprofile=False, trace_memory=False):
+    """
+    Record stages until the process exits, then write a JSON report and
+    print a summary.
+    Args:
+        script (str): Name of the script, part of the default report path.
+        report (str): Path of the report, see PROFILE_REPORT for the fields
+            it may use. If None, nothing is recorded.
+        cprofile (Bool): If True, also run cProfile in this process and
+            save its statistics next to the report (.prof).
+        trace_memory (Bool): If True, also trace allocations, see enable.
+    Returns:
+        report (str): Path of the report, or None.
+    """
+    if report is None:
+        return None
+    started = datetime.now()
+    report = report.format(script=script, time=started)
+    profiler = None
+    if cprofile is True:
+        profiler = cProfile.Profile()
+    _SESSION.update(script=script, report=report, profiler=profiler, argv=list(sys.argv),
+                    started=started, wall=time.perf_counter(), cpu=time.process_time())
+    enable(trace_memory)
+    if profiler is not None:
+        profiler.enable()
+    atexit.register(stop)
+    return report
+
+def stop():
+    """
+    End the session begun by start: write its report and print a summary.
+    Returns:
+        report (dict): Contents of the report, or None without a session.
+    """
+    if not _SESSION:
+        return None
+    session = dict(_SESSION)
+    _SESSION.clear()
+    profiler = session["profiler"]
+    if profiler is not None:
+        profiler.disable()
+    disable()
+    report = {"script": session["script"], "argv": session["argv"],
+              "started": session["started"].isoformat(timespec="seconds"),
+              "wall": time.perf_counter() - session["wall"],
+              "cpu": time.process_time() - session["cpu"],
+              "max_rss_bytes": _max_rss(), "children_max_rss_bytes": _max_rss(True),
+              "cprofile": None, "stages": stages()}
+    outdir = os.path.dirname(session["report"])
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)
+    if profiler is not None:
+        report["cprofile"] = f"{os.path.splitext(session['report'])[0]}.prof"
+        profiler.dump_stats(report["cprofile"])
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(CPROFILE_TOP)
+    with open(session["report"], "w") as f1:
+        json.dump(report, f1, indent=1)
+    print_stages(report["stages"])
+    print(f"{session['script']}: {report['wall']:.1f}s wall, {report['cpu']:.1f}s CPU, "
+          f"profile written to {session['report']}")
+    return report
+
+def print_stages(recorded):
+    """
+    Print a table of stages, nested stages indented below their parent.
+    Args:
+        recorded (dict): See stages.
+    """
+    print(f"{'stage':32s} {'calls':>6s} {'wall':>8s} {'self':>8s} {'cpu':>8s} "
+          f"{'rows':>12s} {'max rss':>9s} {'alloc':>9s}")
+    for path in sorted(recorded, key=lambda p: p.split("/")):
+        rec = recorded[path]
+        name = "  " * path.count("/") + path.rsplit("/", 1)[-1]
+        rows = rec["counters"].get("rows")
+        rows = "" if rows is None else f"{rows:,}"
+        rss, alloc = [("" if rec[key] is None else f"{rec[key]/1e6:,.0f}MB")
+                      for key in ["max_rss_bytes", "peak_bytes"]]
+        print(f"{name:32s} {rec['calls']:6d} {rec['wall']:7.2f}s {rec['self_wall']:7.2f}s "
+              f"{rec['cpu']:7.2f}s {rows:>12s} {rss:>9s} {alloc:>9s}")
@@ -0,0 +1,147 @@
+"""
+Rank regions against each other on every date at once.
+
+A Ranking sorts the region axis of a (date, region) matrix for all dates
+in one vectorised call and keeps the resulting order and rank arrays, so
+the worst (or best) K regions as of any date are a slice of a stored row
+instead of a transpose and sort of the whole frame.
+"""
+
+import numpy as np
+import pandas as pd
+
+class Ranking:
+    """
+    Order of regions on every date, highest value first. Regions without a
+    value (NaN) on a date come last.
+
+    Attributes:
+        dates (:obj:`pandas.Index`): Dates (rows of the ranked data).
+        regions (:obj:`pandas.Index`): Regions (columns of the ranked data).
+        order (:obj:`numpy.ndarray`): Array of shape (date, K) holding the
+            region positions of each date, highest first.
+        rank (:obj:`numpy.ndarray`): Array of shape (date, region) holding
+            the rank of each region on each date (0 for the highest), or
+            None if only the top K were ranked.
+        n_valid (:obj:`numpy.ndarray`): Number of regions with a value on
+            each date.
+    """
+
+    def __init__(self, data, k=None):
+        """
+        Args:
+            data (:obj:`pandas.DataFrame`): One column per region, one row
+                per date. Non-numeric columns are ignored.
+            k (int): If given, only rank the top k regions of each date,
+                using a partial sort.
+        """
+        data = data.select_dtypes("number")
+        self.dates = data.index
+        self.regions = data.columns
+        values = data.to_numpy(dtype=float)
+        valid = ~np.isnan(values)
+        self.n_valid = valid.sum(axis=1)
+        # Sort descending, with NaN last
+        key = np.where(valid, -values, np.inf)
+        n = key.shape[1]
+        if k is not None and k < n:
+            # k-th smallest key of each date. Of the regions tied with it,
+            # keep those of the lowest column positions, as a stable sort
+            # would, then list the chosen ones in column order
+            kth = np.partition(key, k - 1, axis=1)[:, k - 1:k]
+            below = key < kth
+            tied = key == kth
+            room = k - below.sum(axis=1, keepdims=True)
+            chosen = below | (tied & (np.cumsum(tied, axis=1) <= room))
+            part = np.flatnonzero(chosen).reshape(-1, k) % n
+            part_key = np.take_along_axis(key, part, axis=1)
+            sub = np.argsort(part_key, axis=1, kind="stable")
+            self.order = np.take_along_axis(part, sub, axis=1).astype(np.int32)
+            self.rank = None
+        else:
+            self.order = np.argsort(key, axis=1, kind="stable").astype(np.int32)
+            self.rank = np.empty_like(self.order)
+            np.put_along_axis(self.rank, self.order,
+                              np.arange(n, dtype=np.int32)[None, :], axis=1)
+
+    def row(self, date=None):
+        """
+        Row of a date.
+        Args:
+            date: Date of interest. Defaults to the last date. Dates that
+                are not in the data fall back to the last earlier date.
+        Returns:
+            row (int): Row position.
+        """
+        if date is None:
+            return len(self.dates) - 1
+        if isinstance(self.dates, pd.DatetimeIndex):
+            date = pd.Timestamp(date)
+        row = self.dates.searchsorted(date, side="right") - 1
+        if row < 0:
+            raise KeyError(f"No data as of {date}")
+        return row
+
+    def top(self, k, date=None, among=None):
+        """
+        Regions with the highest values as of a date.
+        Args:
+            k (int): Number of regions.
+            date: Date of interest. Defaults to the last date.
+            among (list): Only consider these regions.
+        Returns:
+            names (:obj:`pandas.Index`): Region names, highest first.
+        """
+        if self.rank is None and among is not None:
+            raise ValueError("top with among needs a full ranking, create it without k")
+        if self.rank is None and k > self.order.shape[1]:
+            raise ValueError(f"Only the top {self.order.shape[1]} regions were ranked, "
+                             f"create the ranking with k >= {k}")
+        order = self.order[self.row(date)]
+        if among is not None:
+            order = order[self.regions.isin(among)[order]]
+        return self.regions[order[:k]]
+
+    def bottom(self, k, date=None, among=None):
+        """
+        Regions with the lowest values as of a date, ignoring regions
+        without a value.
+        Args:
+            k (int): Number of regions.
+            date: Date of interest. Defaults to the last date.
+            among (list): Only consider these regions.
+        Returns:
+            names (:obj:`pandas.Index`): Region names, highest first (like
+                the tail of a descending sort).
+        """
+        if self.rank is None:
+            raise ValueError("bottom needs a full ranking, create it without k")
+        row = self.row(date)
+        order = self.order[row, :self.n_valid[row]]
+        if among is not None:
+            order = order[self.regions.isin(among)[order]]
+        return self.regions[order[max(len(order) - k, 0):]]
+
+    def rank_of(self, region, date=None):
+        """
+        Rank of one region as of a date.
+        Args:
+            region (str): Region name.
+            date: Date of interest. Defaults to the last date.
+        Returns:
+            rank (int): 0 for the highest value.
+        """
+        if self.rank is None:
+            raise ValueError("rank_of needs a full ranking, create it without k")
+        return int(self.rank[self.row(date), self.regions.get_loc(region)])
+
+def top_k(values, k):
+    """
+    Labels of the k highest values of a Series, highest first (NaN last).
+    Args:
+        values (:obj:`pandas.Series`): Values by region.
+        k (int): Number of regions.
+    Returns:
+        names (:obj:`pandas.Index`): Region names.
+    """
+    return Ranking(values.to_frame().T, k=k).top(k)
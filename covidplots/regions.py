@@ -0,0 +1,386 @@
+"""
+Registry of region names and the integer IDs they map to.
+
+JHU, the census and OWID spell some states and countries differently
+(e.g. "Taiwan*", "Korea, South", "Faeroe Islands"), and report entities
+that are not regions at all (cruise ships, continents, income groups).
+Each source's spelling is mapped to one canonical name (the sanitized JHU
+spelling) and from there to an integer ID. Names are translated once per
+file, for the unique values only, and joins between sources then become
+integer gathers instead of string matching.
+
+IDs are assigned in registration order and are only meaningful within one
+process; anything stored on disk keeps the canonical names.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Sanitized list of countries that JHU tracks (e.g. Taiwan* is now Taiwan)
+JHU_COUNTRIES = [
+    'Afghanistan',
+    'Albania',
+    'Algeria',
+    'Andorra',
+    'Angola',
+    'Antigua and Barbuda',
+    'Argentina',
+    'Armenia',
+    'Australia',
+    'Austria',
+    'Azerbaijan',
+    'Bahamas',
+    'Bahrain',
+    'Bangladesh',
+    'Barbados',
+    'Belarus',
+    'Belgium',
+    'Belize',
+    'Benin',
+    'Bhutan',
+    'Bolivia',
+    'Bosnia and Herzegovina',
+    'Botswana',
+    'Brazil',
+    'Brunei',
+    'Bulgaria',
+    'Burkina Faso',
+    'Burma',
+    'Burundi',
+    'Cabo Verde',
+    'Cambodia',
+    'Cameroon',
+    'Canada',
+    'Central African Republic',
+    'Chad',
+    'Chile',
+    'China',
+    'Colombia',
+    'Comoros',
+    'Congo (Brazzaville)',
+    'Congo (Kinshasa)',
+    'Costa Rica',
+    "Cote d'Ivoire",
+    'Croatia',
+    'Cuba',
+    'Cyprus',
+    'Czechia',
+    'Denmark',
+    'Djibouti',
+    'Dominica',
+    'Dominican Republic',
+    'Ecuador',
+    'Egypt',
+    'El Salvador',
+    'Equatorial Guinea',
+    'Eritrea',
+    'Estonia',
+    'Eswatini',
+    'Ethiopia',
+    'Fiji',
+    'Finland',
+    'France',
+    'Gabon',
+    'Gambia',
+    'Georgia',
+    'Germany',
+    'Ghana',
+    'Greece',
+    'Grenada',
+    'Guatemala',
+    'Guinea',
+    'Guinea-Bissau',
+    'Guyana',
+    'Haiti',
+    'Honduras',
+    'Hungary',
+    'Iceland',
+    'India',
+    'Indonesia',
+    'Iran',
+    'Iraq',
+    'Ireland',
+    'Israel',
+    'Italy',
+    'Jamaica',
+    'Japan',
+    'Jordan',
+    'Kazakhstan',
+    'Kenya',
+    'South Korea',
+    'Kosovo',
+    'Kuwait',
+    'Kyrgyzstan',
+    'Laos',
+    'Latvia',
+    'Lebanon',
+    'Lesotho',
+    'Liberia',
+    'Libya',
+    'Liechtenstein',
+    'Lithuania',
+    'Luxembourg',
+    'Madagascar',
+    'Malawi',
+    'Malaysia',
+    'Maldives',
+    'Mali',
+    'Malta',
+    'Mauritania',
+    'Mauritius',
+    'Mexico',
+    'Moldova',
+    'Monaco',
+    'Mongolia',
+    'Montenegro',
+    'Morocco',
+    'Mozambique',
+    'Namibia',
+    'Nepal',
+    'Netherlands',
+    'New Zealand',
+    'Nicaragua',
+    'Niger',
+    'Nigeria',
+    'North Macedonia',
+    'Norway',
+    'Oman',
+    'Pakistan',
+    'Panama',
+    'Papua New Guinea',
+    'Paraguay',
+    'Peru',
+    'Philippines',
+    'Poland',
+    'Portugal',
+    'Qatar',
+    'Romania',
+    'Russia',
+    'Rwanda',
+    'Saint Kitts and Nevis',
+    'Saint Lucia',
+    'Saint Vincent and the Grenadines',
+    'San Marino',
+    'Sao Tome and Principe',
+    'Saudi Arabia',
+    'Senegal',
+    'Serbia',
+    'Seychelles',
+    'Sierra Leone',
+    'Singapore',
+    'Slovakia',
+    'Slovenia',
+    'Somalia',
+    'South Africa',
+    'South Sudan',
+    'Spain',
+    'Sri Lanka',
+    'Sudan',
+    'Suriname',
+    'Sweden',
+    'Switzerland',
+    'Syria',
+    'Taiwan',
+    'Tajikistan',
+    'Tanzania',
+    'Thailand',
+    'Timor-Leste',
+    'Togo',
+    'Trinidad and Tobago',
+    'Tunisia',
+    'Turkey',
+    'US',
+    'Uganda',
+    'Ukraine',
+    'United Arab Emirates',
+    'United Kingdom',
+    'Uruguay',
+    'Uzbekistan',
+    'Venezuela',
+    'Vietnam',
+    'West Bank and Gaza',
+    'Yemen',
+    'Zambia',
+    'Zimbabwe'
+]
+
+# Spellings of each source that differ from the canonical names
+ALIASES = {
+    "world": {
+        "jhu": {"Taiwan*": "Taiwan", "Korea, South": "South Korea",
+                "Korea, North": "North Korea"},
+        "census": {"United States": "US", "Bahamas, The": "Bahamas",
+                   "Gambia, The": "Gambia",
+                   "Virgin Islands, British": "British Virgin Islands",
+                   "Virgin Islands, U.S.": "U.S. Virgin Islands",
+                   "Korea, North": "North Korea", "Korea, South": "South Korea",
+                   "Micronesia, Federated States of": "Micronesia",
+                   # JHU reports these together
+                   "Gaza Strip": "West Bank and Gaza",
+                   "West Bank": "West Bank and Gaza"},
+        "owid": {"Myanmar": "Burma", "United States": "US",
+                 "Korea, South": "South Korea", "Cape Verde": "Cabo Verde",
+                 "Faeroe Islands": "Faroe Islands", "Macao": "Macau",
+                 "Timor": "Timor-Leste", "Congo": "Congo (Brazzaville)",
+                 "Democratic Republic of Congo": "Congo (Kinshasa)",
+                 "Micronesia (country)": "Micronesia"},
+    },
+    "usa": {
+        "owid": {"New York State": "New York"},
+    },
+}
+
+# Entities of each source that are not regions of the family
+EXCLUDED = {
+    "world": {
+        "jhu": ["Diamond Princess", "MS Zaandam", "Holy See"],
+        "owid": ["Africa", "Asia", "European Union", "Europe", "North America",
+                 "Oceania", "South America", "World", "Upper middle income",
+                 "High income", "Low income", "Lower middle income",
+                 "Bonaire Sint Eustatius and Saba", "England", "Falkland Islands",
+                 "Niue", "Northern Cyprus", "Northern Ireland", "Palestine",
+                 "Pitcairn", "Saint Helena", "Scotland",
+                 "Sint Maarten (Dutch part)", "Wales"],
+    },
+    "usa": {
+        "owid": ["United States"],
+    },
+}
+
+class RegionRegistry:
+    """
+    Canonical names and integer IDs of the regions of one family.
+
+    Attributes:
+        family (str): 'usa' or 'world'.
+        names (:obj:`pandas.Index`): Canonical name of each ID.
+    """
+
+    def __init__(self, family, names=()):
+        self.family = family
+        self.names = pd.Index([], dtype=object)
+        self._aliases = ALIASES.get(family, {})
+        self._excluded = {source: set(names) for source, names in
+                          EXCLUDED.get(family, {}).items()}
+        self.register(names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def register(self, names):
+        """
+        Add canonical names that are not registered yet.
+        Args:
+            names (list): Canonical names.
+        """
+        new = pd.Index(pd.unique(np.asarray(names, dtype=object)))
+        new = new[~new.isin(self.names)]
+        if len(new) > 0:
+            self.names = self.names.append(new)
+
+    def canonical(self, names, source=None):
+        """
+        Translate names to canonical spelling.
+        Args:
+            names (list): Names as spelled by source.
+            source (str): 'jhu', 'census' or 'owid', or None if names are
+                canonical already.
+        Returns:
+            names (:obj:`numpy.ndarray`): Canonical names, None where the
+                name is excluded for this source.
+        """
+        codes, uniques = pd.factorize(np.asarray(names, dtype=object))
+        aliases = self._aliases.get(source, {})
+        excluded = self._excluded.get(source, set())
+        canon = np.array([None if name in excluded else aliases.get(name, name)
+                          for name in uniques] + [None], dtype=object)
+        # Missing names have code -1, which picks the trailing None
+        return canon[codes]
+
+    def ids(self, names, source=None, add=True):
+        """
+        Translate names to region IDs, with one lookup per unique name.
+        Args:
+            names (list): Names as spelled by source.
+            source (str): 'jhu', 'census' or 'owid', or None if names are
+                canonical already.
+            add (Bool): If True, register names that are not known yet
+                (new JHU countries, OWID territories). If False, they get
+                ID -1.
+        Returns:
+            ids (:obj:`numpy.ndarray`): Region IDs, -1 for excluded (and,
+                unless add is True, unknown) names.
+        """
+        codes, uniques = pd.factorize(self.canonical(names, source))
+        if add is True:
+            self.register(uniques)
+        uids = np.append(self.names.get_indexer(uniques), -1)
+        return uids[codes]
+
+    def take(self, ids):
+        """
+        Canonical names of region IDs.
+        Args:
+            ids (array-like): Region IDs, none of them -1.
+        Returns:
+            names (:obj:`pandas.Index`): Canonical names.
+        """
+        return self.names.take(ids)
+
+    def collect(self, values, ids, fill=0):
+        """
+        Scatter per-column values into arrays indexed by region ID, adding
+        up columns that map to the same region.
+        Args:
+            values (array-like): Array of shape (n, len(ids)).
+            ids (array-like): Region ID of each column, -1 to skip it.
+            fill: Value of regions without any column.
+        Returns:
+            by_id (:obj:`numpy.ndarray`): Array of shape (n, len(self)).
+            present (:obj:`numpy.ndarray`): Bool, True for regions that had
+                at least one column.
+        """
+        values = np.asarray(values)
+        ids = np.asarray(ids)
+        keep = ids >= 0
+        by_id = np.zeros((values.shape[0], len(self)), dtype=values.dtype)
+        np.add.at(by_id.T, ids[keep], values[:, keep].T)
+        present = np.zeros(len(self), dtype=bool)
+        present[ids[keep]] = True
+        by_id[:, ~present] = fill
+        return by_id, present
+
+def gather(by_id, ids, fill=np.nan):
+    """
+    Look up per-region values for a list of region IDs.
+    Args:
+        by_id (:obj:`numpy.ndarray`): Values indexed by region ID along the
+            last axis.
+        ids (array-like): Region IDs, -1 where unknown.
+        fill: Value for unknown regions.
+    Returns:
+        values (:obj:`numpy.ndarray`): by_id[..., ids], fill where ids is
+            -1 or beyond the end of by_id.
+    """
+    ids = np.asarray(ids)
+    valid = (ids >= 0) & (ids < by_id.shape[-1])
+    values = by_id[..., np.where(valid, ids, 0)]
+    if not valid.all():
+        values = values.astype(np.result_type(values.dtype, np.min_scalar_type(fill)))
+        values[..., ~valid] = fill
+    return values
+
+@lru_cache(maxsize=None)
+def registry(family):
+    """
+    The registry of a region family, shared by the whole process.
+    Args:
+        family (str): 'usa' or 'world'.
+    Returns:
+        registry (:obj:`RegionRegistry`): Region registry.
+    """
+    if family == "world":
+        return RegionRegistry(family, JHU_COUNTRIES)
+    return RegionRegistry(family)
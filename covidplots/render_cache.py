@@ -0,0 +1,169 @@
+"""
+Content-addressed cache of rendered figures.
+
+A figure is identified by a hash of everything that determines it: the
+plotting function, the exact data it is given (see metrics.dataset_digest),
+its other parameters, the source code of the package and the matplotlib
+version. When a plotting function is called through render() with inputs
+seen last time, e.g. the worst_usa grid on a day JHU did not update, it
+is not called at all: its previous output files are hard-linked into
+place instead. Functions rendered this way must not depend on anything
+else, such as the current date (derive axis limits from the data).
+
+Entries are kept in a .render_cache/ directory inside the output
+directory, one per figure (function and parameters); a new rendering of
+the same figure replaces the previous one. Output files are always
+written to a new inode (see output.save_figure), so the linked copies in
+the cache are never modified.
+"""
+
+import glob
+import hashlib
+import inspect
+import json
+import os
+import shutil
+from functools import lru_cache
+
+import matplotlib
+import pandas as pd
+
+from covidplots.metrics import dataset_digest
+
+# Bump when the layout of cache entries changes
+RENDER_CACHE_VERSION = 1
+RENDER_CACHE_SUBDIR = ".render_cache"
+RENDER_STATS = {"hits": 0, "misses": 0, "uncacheable": 0}
+
+def render_stats():
+    """
+    Report how many figures were served from the render cache.
+    Returns:
+        stats (dict): Number of cache hits, misses, and calls whose outputs
+            could not be cached.
+    """
+    return dict(RENDER_STATS)
+
+@lru_cache(maxsize=None)
+def code_version():
+    """
+    Digest of the code figures depend on: every module of the package
+    (including the plotting scripts next to it) and the matplotlib version.
+    Returns:
+        digest (str): Hex SHA1 digest.
+    """
+    h = hashlib.sha1(f"v{RENDER_CACHE_VERSION}-{matplotlib.__version__}".encode())
+    for filename in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "*.py"))):
+        with open(filename, "rb") as f1:
+            h.update(os.path.basename(filename).encode())
+            h.update(f1.read())
+    return h.hexdigest()
+
+def _digest(value):
+    """ Digest of a data argument, or its repr for anything else. """
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        return f"frame:{dataset_digest(value)}"
+    return repr(value)
+
+def figure_keys(func, args, kwargs):
+    """
+    Identify a figure and its inputs.
+    Args:
+        func (function): Plotting function.
+        args (tuple): Its positional arguments.
+        kwargs (dict): Its keyword arguments.
+    Returns:
+        slot (str): Digest of the function and its parameters other than
+            data, the same for every version of the figure.
+        key (str): Digest of the slot, the data and the code version.
+    """
+    # By file rather than module name, which is __main__ in scripts, and of
+    # the function itself rather than a decorator (see profiling.timed)
+    func = inspect.unwrap(func)
+    params = [f"{os.path.basename(func.__code__.co_filename)}:{func.__qualname__}"]
+    data = [code_version()]
+    for name, value in list(enumerate(args)) + sorted(kwargs.items()):
+        digest = _digest(value)
+        (data if digest.startswith("frame:") else params).append(f"{name}={digest}")
+    slot = hashlib.sha1("\0".join(params).encode()).hexdigest()[:16]
+    key = hashlib.sha1("\0".join([slot] + data).encode()).hexdigest()
+    return slot, key
+
+def _link(src, dst):
+    """ Put a file at dst sharing src's contents, replacing dst atomically. """
+    try:
+        if os.path.samefile(src, dst):
+            return
+    except OSError:
+        pass
+    tmppath = f"{dst}.{os.getpid()}.tmp"
+    try:
+        os.link(src, tmppath)
+    except OSError:
+        # e.g. a file system without hard links
+        shutil.copyfile(src, tmppath)
+    os.replace(tmppath, dst)
+
+def _filenames(result):
+    """ Output files listed in the report(s) returned by a plotting function. """
+    reports = [result] if isinstance(result, dict) else result
+    if not isinstance(reports, list) or not reports or \
+            not all(isinstance(r, dict) and "filename" in r for r in reports):
+        return None
+    return [r["filename"] for r in reports]
+
+def render(func, *args, **kwargs):
+    """
+    Call a plotting function, unless the same figure was already rendered
+    from the same inputs.
+    Args:
+        func (function): Plotting function. It must write its files to its
+            outdir keyword argument (default "plots") and return the
+            report, or list of reports, of output.save_figure.
+        args, kwargs: Arguments of func.
+    Returns:
+        result: What func returned, or on a cache hit the reports of the
+            previous rendering.
+    """
+    outdir = kwargs.get("outdir", "plots")
+    slot, key = figure_keys(func, args, kwargs)
+    entry = os.path.join(outdir, RENDER_CACHE_SUBDIR, f"{slot}.{key}")
+    manifest = os.path.join(entry, "manifest.json")
+    try:
+        with open(manifest) as f1:
+            result = json.load(f1)
+        for rel in result["files"]:
+            _link(os.path.join(entry, os.path.basename(rel)), os.path.join(outdir, rel))
+    except (OSError, ValueError, KeyError):
+        pass
+    else:
+        RENDER_STATS["hits"] += 1
+        for rel in result["files"]:
+            print(f"Unchanged {os.path.join(outdir, rel)}, reused from the render cache")
+        return result["result"]
+
+    result = func(*args, **kwargs)
+    filenames = _filenames(result)
+    if filenames is None:
+        RENDER_STATS["uncacheable"] += 1
+        return result
+    RENDER_STATS["misses"] += 1
+    # Store the new entry, then drop older versions of the same figure
+    stale = glob.glob(os.path.join(outdir, RENDER_CACHE_SUBDIR, f"{slot}.*"))
+    tmpentry = f"{entry}.{os.getpid()}.tmp"
+    os.makedirs(tmpentry, exist_ok=True)
+    files = []
+    for filename in filenames:
+        rel = os.path.relpath(filename, outdir)
+        files.append(rel)
+        _link(filename, os.path.join(tmpentry, os.path.basename(rel)))
+    with open(os.path.join(tmpentry, "manifest.json"), "w") as f1:
+        json.dump({"files": files, "result": result}, f1)
+    shutil.rmtree(entry, ignore_errors=True)
+    os.replace(tmpentry, entry)
+    for oldentry in stale:
+        if oldentry != entry and not oldentry.endswith(".tmp"):
+            shutil.rmtree(oldentry, ignore_errors=True)
+    return result
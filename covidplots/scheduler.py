@@ -0,0 +1,148 @@
+"""
+Render plots in parallel.
+
+Each figure is a RenderJob: a plotting function with its arguments. Jobs
+are fanned out to a pool of worker processes, which receive every dataset
+once when they start (rather than downloading or parsing it again) and
+look up their inputs by name. The scheduler times every job and collects
+failures instead of stopping at the first one, so a full refresh takes
+about as long as the slowest figure when there are enough cores. When
+stage timers are on (see profiling), workers record their stages too and
+send them back with each result.
+"""
+
+import os
+import time
+import traceback
+import tracemalloc
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from covidplots import profiling
+
+# A figure to render: func(*args, **kwargs), where func must be importable
+# by worker processes and Dataset arguments are replaced by the datasets
+# they name. The name is used in reports.
+RenderJob = namedtuple("RenderJob", ["name", "func", "args", "kwargs"])
+
+class Dataset:
+    """
+    Reference to a dataset shipped to every worker once, e.g. the frame
+    returned by get_data.get_data.
+    """
+
+    def __init__(self, key):
+        """
+        Args:
+            key (str): Name of the dataset in the datasets dict given to
+                run_jobs.
+        """
+        self.key = key
+
+    def __repr__(self):
+        return f"Dataset({self.key!r})"
+
+_DATASETS = {}
+
+def _init_worker(datasets, profile=False, trace_memory=False):
+    _DATASETS.update(datasets)
+    if profile is True:
+        profiling.enable(trace_memory)
+        # Drop stages inherited from the parent (fork), it reports them itself
+        profiling.collect()
+
+def _resolve(value):
+    if isinstance(value, Dataset):
+        return _DATASETS[value.key]
+    return value
+
+def _run(job, collect=False):
+    """
+    Render one job in the current process.
+    Args:
+        job (:obj:`RenderJob`): Job to render.
+        collect (Bool): If True, return the stages recorded while rendering
+            (in a worker process, see profiling.collect).
+    Returns:
+        result (dict): Job name, seconds taken, process ID and the
+            traceback if the job failed (None otherwise), and stages if
+            collected.
+    """
+    t0 = time.perf_counter()
+    error = None
+    try:
+        args = [_resolve(arg) for arg in job.args]
+        kwargs = {k: _resolve(v) for k, v in job.kwargs.items()}
+        job.func(*args, **kwargs)
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        # Workers render many figures, do not keep them all open
+        import matplotlib.pyplot as plt
+        plt.close("all")
+    result = {"name": job.name, "seconds": time.perf_counter() - t0,
+              "pid": os.getpid(), "error": error}
+    if collect is True:
+        result["stages"] = profiling.collect()
+    return result
+
+def run_jobs(jobs, datasets=None, n_jobs=1):
+    """
+    Render jobs, in parallel if n_jobs > 1.
+    Args:
+        jobs (list): RenderJob instances.
+        datasets (dict): Datasets referenced by the jobs, by key.
+        n_jobs (int): Number of worker processes. With 1, jobs are rendered
+            one after another in this process.
+    Returns:
+        results (list): One dict per job, in the order of jobs, with keys
+            name, seconds, pid and error (a traceback string, or None).
+    """
+    datasets = {} if datasets is None else datasets
+    t0 = time.perf_counter()
+    if n_jobs <= 1 or len(jobs) <= 1:
+        _init_worker(datasets)
+        results = []
+        for job in jobs:
+            results.append(_run(job))
+            _report(results[-1])
+    else:
+        results = [None] * len(jobs)
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(jobs)),
+                                 initializer=_init_worker,
+                                 initargs=(datasets, profiling.ENABLED,
+                                           tracemalloc.is_tracing())) as pool:
+            futures = {pool.submit(_run, job, profiling.ENABLED): i
+                       for i, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                    profiling.merge(results[i].pop("stages", {}))
+                except Exception:
+                    # The worker itself died, e.g. it could not unpickle the job
+                    results[i] = {"name": jobs[i].name, "seconds": float("nan"),
+                                  "pid": None, "error": traceback.format_exc()}
+                _report(results[i])
+    elapsed = time.perf_counter() - t0
+    failed = [r for r in results if r["error"] is not None]
+    slowest = max([r["seconds"] for r in results], default=0.)
+    print(f"Rendered {len(results) - len(failed)}/{len(results)} jobs in "
+          f"{elapsed:.1f}s with {max(n_jobs, 1)} process(es), slowest job {slowest:.1f}s")
+    return results
+
+def _report(result):
+    if result["error"] is None:
+        print(f"Finished {result['name']} in {result['seconds']:.1f}s")
+    else:
+        print(f"FAILED {result['name']} after {result['seconds']:.1f}s:\n{result['error']}")
+
+def failures(results):
+    """
+    Names of the jobs that failed.
+    Args:
+        results (list): Results of run_jobs.
+    Returns:
+        names (list): Names of failed jobs.
+    """
+    return [r["name"] for r in results if r["error"] is not None]
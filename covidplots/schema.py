@@ -0,0 +1,107 @@
+"""
+Column schemas of the CSV files read by the package.
+
+Each schema lists the only columns that are read, their dtypes and how
+dates are formatted, so that pandas does not have to infer any of them.
+Counts are parsed as int32 (no JHU cell comes near 2**31) and names as
+categoricals, which keeps the wide JHU files small while they are parsed.
+"""
+
+import pandas as pd
+
+JHU_DATE_FORMAT = "%m/%d/%y"
+OWID_DATE_FORMAT = "%Y-%m-%d"
+COUNT_DTYPE = "int32"
+
+OWID_COLUMNS = ["date", "location", "people_vaccinated", "people_fully_vaccinated"]
+OWID_DTYPES = {"location": "category", "people_vaccinated": "float64",
+               "people_fully_vaccinated": "float64"}
+
+US_POP_COLUMNS = ["State", "Population"]
+WORLD_POP_COLUMNS = ["Region", "Country", "Population"]
+POP_DTYPES = {"Population": "int64"}
+
+COUNTY_COLUMNS = ["FIPS", "Combined_Key"]
+COUNTY_DTYPES = {"FIPS": "float64", "Combined_Key": "str"}
+
+def jhu_dtypes(key, dates, count_dtype=COUNT_DTYPE):
+    """
+    Dtypes of the columns read from a JHU time series file.
+    Args:
+        key (str): Name column the rows are grouped by.
+        dates (list): Date columns to read.
+        count_dtype (str): Dtype of the date columns.
+    Returns:
+        dtypes (dict): Dtype of each column.
+    """
+    dtypes = dict.fromkeys(dates, count_dtype)
+    dtypes[key] = "category"
+    return dtypes
+
+def read_jhu(filename, key, dates, **kwargs):
+    """
+    Read a name column and date columns of a JHU time series file.
+    Args:
+        filename (str): Path of the CSV file.
+        key (str): Name column to read along with the dates, e.g.
+            'Province_State', 'Country/Region' or 'FIPS'.
+        dates (list): Date columns to read.
+        kwargs: Passed on to pandas.read_csv.
+    Returns:
+        data (:obj:`pandas.DataFrame`): One row per line of the file.
+    """
+    dtypes = jhu_dtypes(key, dates)
+    dtypes.update(kwargs.pop("dtype", {}))
+    usecols = [key] + [col for col in kwargs.pop("usecols", []) if col != key]
+    try:
+        return pd.read_csv(filename, usecols=usecols + dates, dtype=dtypes, **kwargs)
+    except ValueError:
+        # JHU occasionally leaves cells empty, which int32 cannot hold
+        dtypes.update(dict.fromkeys(dates, "float64"))
+        return pd.read_csv(filename, usecols=usecols + dates, dtype=dtypes, **kwargs)
+
+def jhu_dates(columns):
+    """
+    Parse JHU date column labels.
+    Args:
+        columns (list): Labels like '1/22/20'.
+    Returns:
+        dates (:obj:`pandas.DatetimeIndex`): Parsed dates.
+    """
+    return pd.to_datetime(columns, format=JHU_DATE_FORMAT)
+
+def read_owid(filename):
+    """
+    Read the columns of an OWID vaccinations file that the package uses.
+    Args:
+        filename (str): Path of the CSV file.
+    Returns:
+        data (:obj:`pandas.DataFrame`): Columns date (datetime), location
+            (categorical), people_vaccinated and people_fully_vaccinated.
+    """
+    data = pd.read_csv(filename, usecols=OWID_COLUMNS, dtype=OWID_DTYPES)
+    data["date"] = pd.to_datetime(data["date"], format=OWID_DATE_FORMAT)
+    return data
+
+def read_us_pops(filename):
+    """
+    Read the state populations file.
+    Args:
+        filename (str): Path of the census CSV file.
+    Returns:
+        pops0 (:obj:`pandas.DataFrame`): Populations indexed by state.
+    """
+    return pd.read_csv(filename, usecols=US_POP_COLUMNS, dtype=POP_DTYPES,
+                       index_col="State")
+
+def read_world_pops(filename):
+    """
+    Read the country populations file.
+    Args:
+        filename (str): Path of the census CSV file.
+    Returns:
+        pops0 (:obj:`pandas.DataFrame`): Columns Region, Country and
+            Population.
+    """
+    return pd.read_csv(filename, skiprows=1, usecols=WORLD_POP_COLUMNS,
+                       dtype=POP_DTYPES)
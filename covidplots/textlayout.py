@@ -0,0 +1,116 @@
+"""
+Measure text without drawing it.
+
+Multi-colored labels (see grid_plots.rainbow_text) are one Text per word,
+each placed at the end of the previous one. Finding that end used to mean
+drawing every word and asking for its window extent, i.e. rasterising
+each word just to measure it. text_extent computes the same extent from
+the width, height and descent of the string, kept in a table by string,
+font and resolution, so words like "Last: " or "/" are measured once per
+process and no word is drawn before the figure is saved.
+"""
+
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib import cbook
+from matplotlib.backends.backend_agg import RendererAgg
+from matplotlib.transforms import Bbox
+
+# Number of (string, font, dpi) metrics kept in memory
+METRICS_CACHE_SIZE = 4096
+METRICS_STATS = {"hits": 0, "misses": 0}
+_METRICS = OrderedDict()
+_RENDERERS = {}
+
+def metrics_stats():
+    """
+    Report how many text metrics were served from the table.
+    Returns:
+        stats (dict): Number of cache hits and misses.
+    """
+    return dict(METRICS_STATS)
+
+def text_metrics(string, prop, dpi):
+    """
+    Size of a single line of text, as measured by the Agg renderer (which
+    is what a drawn Text uses on the Agg canvas).
+    Args:
+        string (str): Text, without math.
+        prop (:obj:`matplotlib.font_manager.FontProperties`): Font.
+        dpi (float): Resolution of the figure.
+    Returns:
+        width, height, descent (float): Size in pixels.
+    """
+    key = (string, hash(prop), dpi)
+    size = _METRICS.get(key)
+    if size is not None:
+        METRICS_STATS["hits"] += 1
+        _METRICS.move_to_end(key)
+        return size
+    METRICS_STATS["misses"] += 1
+    if dpi not in _RENDERERS:
+        _RENDERERS[dpi] = RendererAgg(1, 1, dpi)
+    size = _RENDERERS[dpi].get_text_width_height_descent(string, prop, ismath=False)
+    _METRICS[key] = size
+    while len(_METRICS) > METRICS_CACHE_SIZE:
+        _METRICS.popitem(last=False)
+    return size
+
+def _measurable(text):
+    # Single-line, unrotated plain text; anything else is left to matplotlib
+    string = text.get_text()
+    return (text.get_rotation() == 0 and "\n" not in string
+            and not text.get_wrap() and not text.get_usetex()
+            and not (text.get_parse_math() and cbook.is_math_text(string)))
+
+def text_extent(text, renderer=None):
+    """
+    Window extent of a Text, without drawing it.
+    Args:
+        text (:obj:`matplotlib.text.Text`): Text in a figure.
+        renderer: Renderer to measure rotated, multi-line or math text
+            with. Defaults to the canvas renderer.
+    Returns:
+        bbox (:obj:`matplotlib.transforms.Bbox`): Extent in display
+            coordinates, the same as text.get_window_extent() after
+            drawing it on the Agg canvas.
+    """
+    if not _measurable(text):
+        if renderer is None:
+            renderer = text.figure.canvas.get_renderer()
+        return text.get_window_extent(renderer)
+    prop = text.get_fontproperties()
+    dpi = text.figure.dpi
+    # Like matplotlib, a line is at least as high as "lp"
+    lp_w, lp_h, lp_d = text_metrics("lp", prop, dpi)
+    string = text.get_text()
+    if string:
+        w, h, d = text_metrics(string, prop, dpi)
+    else:
+        w = h = d = 0
+    h = max(h, lp_h)
+    d = max(d, lp_d)
+
+    posx = np.ravel(text.convert_xunits(text.get_position()[0]))[0]
+    posy = np.ravel(text.convert_yunits(text.get_position()[1]))[0]
+    x, y = text.get_transform().transform((posx, posy))
+    halign = text.get_horizontalalignment()
+    if halign == "center":
+        x0 = x - w / 2
+    elif halign == "right":
+        x0 = x - w
+    else:
+        x0 = x
+    valign = text.get_verticalalignment()
+    if valign == "top":
+        y0 = y - h
+    elif valign == "center":
+        y0 = y - h / 2
+    elif valign == "baseline":
+        y0 = y - d
+    elif valign == "center_baseline":
+        y0 = y - (h - d) / 2 - d
+    else:
+        y0 = y
+    return Bbox([[x0, y0], [x0 + w, y0 + h]])
@@ -5,9 +5,13 @@ Run instructions:
 From the Covid19scripts/covidplots directory, run:
 > bokeh serve --show interactive
 
-This will open a tab in your browser with the plot. 
+This will open a tab in your browser with the plot. JHU counts are shown as
+reported; to fix negative daily counts and backlog dumps first, pass a
+cleaning strategy (see cleaning.STRATEGIES):
+> bokeh serve --show usa_interactive --args --clean envelope
 """
 
+import argparse
 import datetime
 import pandas as pd
 import numpy as np
@@ -19,7 +23,7 @@ from bokeh.models.widgets import CheckboxGroup, Button, RadioButtonGroup
 from bokeh.layouts import column, row
 from bokeh.palettes import Category20, Category20c, Category20b
 
-from covidplots import get_data
+from covidplots import cleaning, datastore, metrics, ranking
 
 #-----------------------------------------------------------------------------#
 # Define constants
@@ -46,6 +50,12 @@ all_regions2 = all_regions[25:]
 # Define per capita number
 CAPITA = 100000
 
+# How negative daily counts and backlog dumps in JHU data are fixed, if at all
+parser = argparse.ArgumentParser()
+parser.add_argument("--clean", choices=cleaning.STRATEGIES, default=None,
+                    help="Fix negative daily counts and backlog dumps with this strategy")
+CLEAN_STRATEGY = parser.parse_args().clean
+
 # Define immutable colors for each state
 colors_l = Category20[20] + Category20b[20] +  Category20c[20]
 colors_d = dict(zip(all_regions, colors_l[:len(all_regions)]))
@@ -58,44 +68,48 @@ xright = datetime.datetime.now() + datetime.timedelta(days=1)
 #-----------------------------------------------------------------------------#
 # Read and handle data
 
-# Read in data for USA
-dtype_kwargs = {"cases": {"deaths": False, "vax": False}, 
-          "deaths": {"deaths": True, "vax": False}, 
-          "vax": {"deaths": False, "vax": True},
-          "percvax": {"deaths": False, "vax": True}}
+# Read in data for USA, shared with other sessions through the data store
+dtype_metrics = {"cases": "cases", 
+          "deaths": "deaths", 
+          "vax": "fully_vaccinated",
+          "percvax": "fully_vaccinated"}
+store = datastore.open_store("usa")
+popidx = store.population_index(STATES)
 data_d = {}
-for dtype in dtype_kwargs:
-    kwargs = dtype_kwargs[dtype]
-    data, pops = get_data.get_data("usa", **kwargs)
-    if dtype in ["vax", "percvax"]:
-        partialdata,data = get_data.vax_by_region(data)
-        data = data[STATES]
-        pops = pops[STATES]
+for dtype in dtype_metrics:
+    metric = dtype_metrics[dtype]
+    frame = store.frame(metric)[STATES]
+    if metric in ["cases", "deaths"] and CLEAN_STRATEGY is not None:
+        frame, report = cleaning.clean(frame, CLEAN_STRATEGY)
+    layers = metrics.Metrics(frame, popidx, metric)
     if dtype == "percvax":
-        data = data/pops.values[0] * 100.
+        data = layers[f"{metric}_pct"]
+        data_capita = popidx.per_capita(data, CAPITA)
     else:
-        data = data[STATES]
-        pops = pops[STATES]
-        data = data.diff()
         # Use 7 day average as the defacto data
-        data = data.rolling(7, center=False, min_periods=2).mean()
+        data = layers[metrics.layer_name(metric, window=7)]
+        data_capita = layers[metrics.layer_name(metric, window=7, capita=CAPITA)]
     
     data_d[dtype] = {"data": data}
-    # Sort and determine worst and best 9 states, both raw and per capita
+    # Rank states on every date, then determine worst and best 9 states,
+    # both raw and per capita
+    rank = ranking.Ranking(data)
+    rank_capita = ranking.Ranking(data_capita)
+    data_d[dtype]["ranking"] = rank
+    data_d[dtype]["ranking_capita"] = rank_capita
     if dtype in ["vax", "percvax"]:
-        subs = {"best": [0,9], "worst": [-9,len(data)]}
+        subs = {"best": "top", "worst": "bottom"}
     else: 
-        subs = {"worst": [0,9], "best": [-9,len(data)]} 
+        subs = {"worst": "top", "best": "bottom"} 
     for rang in subs:
-        data_sorted = data.T.sort_values(data.index[-1], ascending=False).T
-        sub = data_sorted.iloc[:, subs[rang][0]:subs[rang][1]]
-        names = sub.columns.values
+        if subs[rang] == "top":
+            names = rank.top(9)
+            names_capita = rank_capita.top(9)
+        else:
+            names = rank.bottom(9)
+            names_capita = rank_capita.bottom(9)
         inds1 = [x for x in range(len(all_regions1)) if all_regions1[x] in names]
         inds2 = [x for x in range(len(all_regions2)) if all_regions2[x] in names]
-        data_capita = CAPITA * data.div(pops.iloc[0], axis="columns")
-        data_capita_sorted = data_capita.T.sort_values(data_capita.index[-1], ascending=False).T
-        sub_capita = data_capita_sorted.iloc[:, subs[rang][0]:subs[rang][1]] 
-        names_capita = sub_capita.columns.values
         inds1_capita = [x for x in range(len(all_regions1)) if all_regions1[x] in names_capita]
         inds2_capita = [x for x in range(len(all_regions2)) if all_regions2[x] in names_capita]
         data_d[dtype][f"{rang}9inds1"] = inds1
@@ -128,7 +142,7 @@ def make_data_src(region_list, percapita=False, dtype="cases"):
 
     xs = [data["date"] for x in range(len(region_list))]
     if percapita is True:
-        ys = [CAPITA * data[region].div(pops[region].iloc[0]) for region in region_list] 
+        ys = [data[region].values * (CAPITA / popidx[region]) for region in region_list] 
     else:
         ys = [data[region].values for region in region_list]          
     names = [np.array([region]) for region in region_list]
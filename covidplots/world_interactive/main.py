@@ -5,9 +5,13 @@ Run instructions:
 From the Covid19scripts/covidplots directory, run:
 > bokeh serve --show interactive
 
-This will open a tab in your browser with the plot. 
+This will open a tab in your browser with the plot. JHU counts are shown as
+reported; to fix negative daily counts and backlog dumps first, pass a
+cleaning strategy (see cleaning.STRATEGIES):
+> bokeh serve --show world_interactive --args --clean envelope
 """
 
+import argparse
 import datetime
 import pandas as pd
 import numpy as np
@@ -19,7 +23,7 @@ from bokeh.models.widgets import CheckboxGroup, Button, RadioButtonGroup, Panel,
 from bokeh.layouts import column, row
 from bokeh.palettes import Category20, Category20c, Category20b
 
-from covidplots import get_data
+from covidplots import cleaning, datastore, metrics, ranking
 from covidplots.continents import census_continents
 
 #-----------------------------------------------------------------------------#
@@ -31,6 +35,12 @@ worstx = 5
 # Define per capita number
 capita = 1000000
 
+# How negative daily counts and backlog dumps in JHU data are fixed, if at all
+parser = argparse.ArgumentParser()
+parser.add_argument("--clean", choices=cleaning.STRATEGIES, default=None,
+                    help="Fix negative daily counts and backlog dumps with this strategy")
+clean_strategy = parser.parse_args().clean
+
 # Define list of colors to use  
 colors_l = Category20[20] + Category20b[20] +  Category20c[20]
 
@@ -48,21 +58,31 @@ by_cont = census_continents()
 all_countries = by_cont["All"]
 all_conts = by_cont.keys().to_list()
 
-# Read in data for world
+# Read in data for world, shared with other sessions through the data store
+store = datastore.open_store("world")
+popidx = store.population_index()
 data_d = {}
 for deaths in [False, True]:
-    data, pops = get_data.get_data("world", deaths=deaths)
-    data = data.diff()
+    if deaths is True:
+        metric = "deaths"
+    else:
+        metric = "cases"
+    frame = store.frame(metric)
+    if clean_strategy is not None:
+        frame, report = cleaning.clean(frame, clean_strategy)
+    layers = metrics.Metrics(frame, popidx, metric)
     # Use 7 day average as the defacto data
-    data = data.rolling(7, center=False, min_periods=2).mean()
+    data = layers[metrics.layer_name(metric, window=7)]
     
-    # Calculate per capita values
-    data_capita = capita * data.div(pops.iloc[0], axis="columns")
+    # Per capita values
+    data_capita = layers[metrics.layer_name(metric, window=7, capita=capita)]
     
     # Add the index (date) as a column for convenience
     data["date"] = data.index
 
     data_d[deaths] = {"data": data, "data_capita": data_capita, 
+                      "ranking": ranking.Ranking(data),
+                      "ranking_capita": ranking.Ranking(data_capita),
                       "worstinds_d": {}, "worstinds_capita_d": {}}
 
 #-----------------------------------------------------------------------------#
@@ -86,7 +106,7 @@ def make_data_src(region_list, percapita=False, deaths=False):
 
     xs = [data["date"] for x in range(len(region_list))]
     if percapita is True:
-        ys = [capita * data[region].div(pops[region].iloc[0]) for region in region_list] 
+        ys = [data[region].values * (capita / popidx[region]) for region in region_list] 
     else:
         ys = [data[region].values for region in region_list]          
     names = [np.array([region]) for region in region_list]
@@ -246,20 +266,19 @@ def unselect_all_update():
 
 #-----------------------------------------------------------------------------#
 
-def get_worst(cont, data=data, worstx=worstx):
+def get_worst(cont, rank, worstx=worstx, date=None):
     """
     Get the worst X regions (by default, 5).
     Args:
         cont (str): Continent name.
+        rank (:obj:`ranking.Ranking`): Ranking of all countries.
         worstx (int): Get worst countries 1 - worstx, be default 5. 
+        date: Rank as of this date, by default the last available date.
     Returns:
         worstnames (list): Names of worst countries.
     """
 
-    data_cont = data.loc[:, by_cont[cont]]
-    data_sorted = data_cont.T.sort_values(data_cont.index[-1], ascending=False).T
-    topworst = data_sorted.iloc[:, :worstx] 
-    worstnames = topworst.columns.values
+    worstnames = rank.top(worstx, date=date, among=by_cont[cont]).values
     return worstnames
 
 #-----------------------------------------------------------------------------#
@@ -408,11 +427,11 @@ for cont in all_conts:
     for deaths in [False, True]:
         # Get worst countries
         if cont == "All":
-            worstnames = get_worst(cont, data_d[deaths]["data"], 9)
-            worstnames_capita = get_worst(cont, data_d[deaths]["data_capita"], 9)
+            worstnames = get_worst(cont, data_d[deaths]["ranking"], 9)
+            worstnames_capita = get_worst(cont, data_d[deaths]["ranking_capita"], 9)
         else: 
-            worstnames = get_worst(cont, data_d[deaths]["data"], worstx) 
-            worstnames_capita = get_worst(cont, data_d[deaths]["data_capita"], worstx) 
+            worstnames = get_worst(cont, data_d[deaths]["ranking"], worstx) 
+            worstnames_capita = get_worst(cont, data_d[deaths]["ranking_capita"], worstx) 
         worstinds1 = [x for x in range(len(all_regions1)) if all_regions1[x] in worstnames]
         worstinds2 = [x for x in range(len(all_regions2)) if all_regions2[x] in worstnames]
         worstinds1_capita = [x for x in range(len(all_regions1)) if all_regions1[x] in worstnames_capita]
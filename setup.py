@@ -4,7 +4,7 @@ setup(
     name = "covidplots",
     version = "0.1",
     description = "Plot the demise of the USA",
-    packages = find_packages(),
+    packages = find_packages(exclude=["benchmarks", "benchmarks.*"]),
     install_requires = ["pandas",
                         "requests",
                         "bokeh>=2.3"]
@@ -0,0 +1,63 @@
+"""
+Cleaning strategies on small hand-made series.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from covidplots import cleaning
+
+# Small enough for a 10 day series: dumps are days of at least 100 counts
+# and more than 10 times the mean of the (up to) 4 days before
+PARAMS = {"window": 4, "min_count": 100}
+
+@pytest.fixture
+def data():
+    dates = pd.date_range("2021-01-01", periods=10)
+    # A: a revision of -5 on day 3. B: 10 a day, and a dump of 500 on day 8
+    a = [0, 10, 20, 15, 25, 35, 45, 55, 65, 75]
+    b = [0, 10, 20, 30, 40, 50, 60, 70, 570, 580]
+    return pd.DataFrame({"A": a, "B": b}, index=dates, dtype=float)
+
+def report_rows(report):
+    return [(date.day, r.region, r.kind) for date, r in report.iterrows()]
+
+def test_clamp(data):
+    cleaned, report = cleaning.clean(data, "clamp", **PARAMS)
+    # As county_movies did before: negative daily counts set to 0
+    daily = data.diff()
+    daily[daily < 0.] = 0.
+    pd.testing.assert_frame_equal(cleaned.diff().iloc[1:], daily.iloc[1:])
+    assert report_rows(report) == [(4, "A", "negative"), (9, "B", "dump")]
+    assert report.iloc[0][["before", "after"]].tolist() == [-5., 0.]
+    # Dumps are only reported
+    assert report.iloc[1][["before", "after"]].tolist() == [500., 500.]
+
+def test_envelope(data):
+    cleaned, report = cleaning.clean(data, "envelope", **PARAMS)
+    assert (cleaned.diff().iloc[1:] >= 0).all().all()
+    assert (cleaned <= data).all().all()
+    pd.testing.assert_series_equal(cleaned.iloc[-1], data.iloc[-1])
+    assert cleaned["A"].tolist() == [0, 10, 15, 15, 25, 35, 45, 55, 65, 75]
+    assert report_rows(report) == [(3, "A", "envelope"), (4, "A", "negative"),
+                                   (9, "B", "dump")]
+
+def test_redistribute(data):
+    cleaned, report = cleaning.clean(data, "redistribute", **PARAMS)
+    daily = cleaned.diff().iloc[1:]
+    assert (daily >= 0).all().all()
+    pd.testing.assert_series_equal(cleaned.iloc[-1], data.iloc[-1])
+    # The 490 counts above the baseline of B's dump go to the 4 days before
+    assert daily["B"].max() < 500
+    np.testing.assert_allclose(daily["B"].loc["2021-01-05":"2021-01-08"], 10 + 490 / 4)
+    assert daily["B"].loc["2021-01-09"] == pytest.approx(10)
+    rows = report_rows(report)
+    assert (4, "A", "negative") in rows
+    assert (9, "B", "dump") in rows
+    assert [(day, kind) for day, region, kind in rows if region == "B"] == \
+        [(5, "spread"), (6, "spread"), (7, "spread"), (8, "spread"), (9, "dump")]
+
+def test_unknown_strategy(data):
+    with pytest.raises(ValueError):
+        cleaning.clean(data, "smooth")
@@ -0,0 +1,74 @@
+"""
+County store against plain pandas reads of the same JHU US file.
+"""
+
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from covidplots import counties
+
+HEADER = ["UID", "iso2", "iso3", "code3", "FIPS", "Admin2", "Province_State",
+          "Country_Region", "Lat", "Long_", "Combined_Key"]
+# Lines of two states interleaved, and a line without a FIPS code
+LINES = [["84001001", "1001.0", "Autauga", "Alabama", [1, 3, 6]],
+         ["84004001", "4001.0", "Apache", "Arizona", [0, 2, 2]],
+         ["84001003", "1003.0", "Baldwin", "Alabama", [5, 5, 9]],
+         ["84088888", "", "", "Arizona", [0, 0, 1]],
+         ["84004003", "4003.0", "Cochise", "Arizona", [2, 4, 8]]]
+DATES = ["1/22/20", "1/23/20", "1/24/20"]
+
+def write(filename, extra=()):
+    rows = [",".join(HEADER + DATES + [date for date, _ in extra])]
+    for i, (uid, fips, county, state, counts) in enumerate(LINES):
+        name = f'"{county}, {state}, US"' if county else f'"{state}, US"'
+        values = list(counts) + [values[i] for _, values in extra]
+        rows.append(",".join([uid, "US", "USA", "840", fips, county, state, "US",
+                              "33.0", "-86.0", name] + [str(v) for v in values]))
+    filename.write_text("\n".join(rows) + "\n")
+
+@pytest.fixture
+def filename(tmp_path):
+    filename = tmp_path / "time_series_covid19_confirmed_US.csv"
+    write(filename)
+    return filename
+
+def test_state_frame(filename):
+    store = counties.open_counties(str(filename))
+    expected = pd.read_csv(filename).groupby("Province_State")[DATES].sum()
+    pd.testing.assert_frame_equal(store.state_frame(), expected)
+    assert store.national().tolist() == expected.sum().tolist()
+
+def test_county_frame(filename):
+    store = counties.open_counties(str(filename))
+    expected = pd.read_csv(filename, index_col="FIPS")
+    covid = store.county_frame()
+    # Lines without a FIPS code get negative keys
+    assert (covid.index < 0).sum() == expected.index.isna().sum() == 1
+    # Counts are read as int32 (see schema.COUNT_DTYPE)
+    pd.testing.assert_frame_equal(covid[covid.index >= 0].sort_index(),
+                                  expected.loc[expected.index.notna(), DATES].sort_index(),
+                                  check_dtype=False)
+    names = store.county_names()
+    assert names.loc[1003.] == "Baldwin, Alabama, US"
+
+def test_append(filename, tmp_path):
+    counties.open_counties(str(filename))
+    extra = [("1/25/20", [7, 3, 9, 1, 9]), ("1/26/20", [8, 3, 11, 1, 12])]
+    write(filename, extra)
+    before = counties.store_stats()
+    store = counties.open_counties(str(filename))
+    assert counties.store_stats()["incremental"] == before["incremental"] + 1
+
+    # A full parse of the same file elsewhere
+    fulldir = tmp_path / "full"
+    fulldir.mkdir()
+    shutil.copy(filename, fulldir / filename.name)
+    full = counties.open_counties(str(fulldir / filename.name), incremental=False)
+    pd.testing.assert_frame_equal(store.state_frame(), full.state_frame())
+    pd.testing.assert_frame_equal(store.county_frame(), full.county_frame())
+    assert store.state_frame().loc["Arizona", "1/26/20"] == 16
+    np.testing.assert_array_equal(store.county_frame().loc[1003.].to_numpy(),
+                                  [5, 5, 9, 9, 11])
@@ -0,0 +1,67 @@
+"""
+Conditional downloads of get_data against a local stand-in for upstream.
+"""
+
+import functools
+import os
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from covidplots import get_data
+
+FILENAME = "time_series_covid19_confirmed_US.csv"
+
+class RecordingHandler(SimpleHTTPRequestHandler):
+    """ Serves a directory and records the status code of every response. """
+    codes = []
+
+    def log_request(self, code="-", size="-"):
+        self.codes.append(int(code))
+
+@pytest.fixture
+def upstream(tmp_path):
+    served = tmp_path / "upstream"
+    served.mkdir()
+    (served / FILENAME).write_text("UID,1/22/20\n84001001,0\n")
+    RecordingHandler.codes = []
+    handler = functools.partial(RecordingHandler, directory=str(served))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+def test_download_then_not_modified(upstream, tmp_path):
+    outdir = str(tmp_path / "covid_data")
+    before = get_data.cache_stats()
+
+    path = get_data.download_file(FILENAME, upstream, outdir=outdir, max_age=0)
+    assert RecordingHandler.codes == [200]
+    with open(path) as f1:
+        assert f1.read() == "UID,1/22/20\n84001001,0\n"
+    after_miss = get_data.cache_stats()
+    assert after_miss["misses"] == before["misses"] + 1
+    assert after_miss["hits"] == before["hits"]
+
+    inode = os.stat(path).st_ino
+    path2 = get_data.download_file(FILENAME, upstream, outdir=outdir, max_age=0)
+    assert path2 == path
+    assert RecordingHandler.codes == [200, 304]
+    # The local copy is kept as is
+    assert os.stat(path).st_ino == inode
+    with open(path) as f1:
+        assert f1.read() == "UID,1/22/20\n84001001,0\n"
+    after_hit = get_data.cache_stats()
+    assert after_hit["hits"] == after_miss["hits"] + 1
+    assert after_hit["misses"] == after_miss["misses"]
+
+def test_fresh_copy_skips_upstream(upstream, tmp_path):
+    outdir = str(tmp_path / "covid_data")
+    get_data.download_file(FILENAME, upstream, outdir=outdir, max_age=0)
+    hits = get_data.cache_stats()["hits"]
+    get_data.download_file(FILENAME, upstream, outdir=outdir, max_age=3600)
+    assert RecordingHandler.codes == [200]
+    assert get_data.cache_stats()["hits"] == hits + 1
@@ -0,0 +1,64 @@
+"""
+Incremental ingestion of JHU files against a full parse of the same file.
+"""
+
+import pandas as pd
+import pytest
+
+from covidplots import ingest
+
+KEY = "Country/Region"
+HEADER = ["Province/State", KEY, "Lat", "Long"]
+ROWS = [["", "Chile", "-35.7", "-71.5"],
+        ["Ontario", "Canada", "51.3", "-85.3"],
+        ["Quebec", "Canada", "52.9", "-73.5"],
+        ["", "Peru", "-9.2", "-75.0"]]
+COUNTS = {"1/22/20": [1, 2, 3, 4], "1/23/20": [2, 4, 6, 8], "1/24/20": [3, 5, 9, 9]}
+
+def write(filename, counts):
+    lines = [",".join(HEADER + list(counts))]
+    for i, row in enumerate(ROWS):
+        lines.append(",".join(row + [str(values[i]) for values in counts.values()]))
+    filename.write_text("\n".join(lines) + "\n")
+
+def check(filename, kind):
+    """ Ingest a file, check it matches a full parse and how it was read. """
+    before = ingest.ingest_stats()
+    b = ingest.ingest_jhu(str(filename), KEY)
+    after = ingest.ingest_stats()
+    assert after[kind] == before[kind] + 1
+    pd.testing.assert_frame_equal(b, ingest.ingest_jhu(str(filename), KEY, incremental=False))
+    return b
+
+@pytest.fixture
+def filename(tmp_path):
+    filename = tmp_path / "time_series_covid19_confirmed_global.csv"
+    write(filename, COUNTS)
+    check(filename, "full")
+    return filename
+
+def test_append(filename):
+    write(filename, dict(COUNTS, **{"1/25/20": [4, 6, 10, 12], "1/26/20": [5, 7, 11, 13]}))
+    b = check(filename, "incremental")
+    assert b.loc["Canada", "1/26/20"] == 18
+    assert b.dtypes.iloc[0] == "int64"
+
+def test_unchanged(filename):
+    b = check(filename, "unchanged")
+    assert list(b.index) == ["Canada", "Chile", "Peru"]
+    assert b.loc["Canada"].tolist() == [5, 10, 14]
+
+def test_revised_history(filename):
+    revised = dict(COUNTS, **{"1/22/20": [0, 2, 3, 4], "1/25/20": [4, 6, 10, 12]})
+    write(filename, revised)
+    b = check(filename, "full")
+    assert b.loc["Chile", "1/22/20"] == 0
+
+def test_empty_new_cells(filename):
+    write(filename, dict(COUNTS, **{"1/25/20": [4, "", 10, 12]}))
+    b = check(filename, "incremental")
+    assert b.dtypes.iloc[0] == "float64"
+    assert b.loc["Canada", "1/25/20"] == 10.
+    # Later appends keep the floats
+    write(filename, dict(COUNTS, **{"1/25/20": [4, "", 10, 12], "1/26/20": [5, 7, 11, 13]}))
+    check(filename, "incremental")
@@ -0,0 +1,66 @@
+"""
+Rankings of regions against a plain descending sort of each date.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from covidplots import ranking
+
+@pytest.fixture
+def data():
+    # Ties within and across the top k, and NaN on some dates
+    values = np.array([[5., 3., 5., np.nan, 1., 3.],
+                       [2., 2., 2., 2., np.nan, 2.],
+                       [np.nan, 7., 1., 7., 7., 0.],
+                       [4., 9., 4., 4., 1., 4.]])
+    return pd.DataFrame(values, index=pd.date_range("2021-01-01", periods=4),
+                        columns=["Alabama", "Michigan", "Nevada", "North Dakota",
+                                 "Ohio", "Texas"])
+
+def expected(data, date, k):
+    row = data.loc[date].sort_values(ascending=False, kind="stable")
+    return list(row.index[:k])
+
+@pytest.mark.parametrize("k", [1, 2, 3, 4, 5])
+def test_partial_matches_sort(data, k):
+    full = ranking.Ranking(data)
+    partial = ranking.Ranking(data, k=k)
+    for date in data.index:
+        assert list(full.top(k, date)) == expected(data, date, k)
+        assert list(partial.top(k, date)) == expected(data, date, k)
+
+def test_full_bottom_and_rank(data):
+    full = ranking.Ranking(data)
+    date = data.index[0]
+    # NaN last, and ignored by bottom
+    assert list(full.top(6, date)) == expected(data, date, 6)
+    assert list(full.bottom(2, date)) == ["Texas", "Ohio"]
+    assert full.rank_of("Nevada", date) == 1
+    assert list(full.top(2, date, among=["Michigan", "Texas", "Ohio"])) == \
+        ["Michigan", "Texas"]
+
+def test_top_k(data):
+    last = data.iloc[-1]
+    assert list(ranking.top_k(last, 3)) == expected(data, data.index[-1], 3)
+
+def test_partial_refuses_what_it_cannot_answer(data):
+    partial = ranking.Ranking(data, k=2)
+    with pytest.raises(ValueError):
+        partial.top(5)
+    with pytest.raises(ValueError):
+        partial.top(2, among=["Ohio", "Texas"])
+    with pytest.raises(ValueError):
+        partial.bottom(2)
+    with pytest.raises(ValueError):
+        partial.rank_of("Ohio")
+
+def test_partial_matches_sort_many_ties():
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 4, size=(50, 40)).astype(float)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    data = pd.DataFrame(values, columns=[f"r{i:02d}" for i in range(40)])
+    partial = ranking.Ranking(data, k=9)
+    for date in data.index:
+        assert list(partial.top(9, date)) == expected(data, date, 9)
@@ -0,0 +1,87 @@
+"""
+Names of the region registry and the continents.py fixes built on it.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import covidplots
+from covidplots import continents, regions, schema
+
+CENSUS_FILE = os.path.join(os.path.dirname(covidplots.__file__), "geo_pop_data",
+                           "Census_data_2020_world_regions.csv")
+
+@pytest.mark.parametrize("source, name, canonical", [
+    ("jhu", "Taiwan*", "Taiwan"),
+    ("jhu", "Korea, South", "South Korea"),
+    ("census", "Korea, South", "South Korea"),
+    ("census", "Bahamas, The", "Bahamas"),
+    ("census", "United States", "US"),
+    ("census", "Gaza Strip", "West Bank and Gaza"),
+    ("census", "Micronesia, Federated States of", "Micronesia"),
+    ("owid", "Myanmar", "Burma"),
+    ("owid", "Congo", "Congo (Brazzaville)"),
+    ("owid", "Democratic Republic of Congo", "Congo (Kinshasa)"),
+    ("owid", "Faeroe Islands", "Faroe Islands"),
+    ("owid", "Micronesia (country)", "Micronesia"),
+    ("jhu", "France", "France"),
+])
+def test_aliases(source, name, canonical):
+    registry = regions.registry("world")
+    assert registry.canonical([name], source)[0] == canonical
+    assert registry.ids([name], source)[0] == registry.ids([canonical])[0]
+
+@pytest.mark.parametrize("source, name", [
+    ("jhu", "Diamond Princess"), ("jhu", "MS Zaandam"), ("owid", "World"),
+    ("owid", "European Union"), ("owid", "High income"),
+])
+def test_excluded(source, name):
+    registry = regions.registry("world")
+    assert registry.canonical([name], source)[0] is None
+    assert registry.ids([name], source)[0] == -1
+
+def test_usa_aliases():
+    registry = regions.registry("usa")
+    assert registry.canonical(["New York State", "Texas"], "owid").tolist() == \
+        ["New York", "Texas"]
+    assert registry.ids(["United States"], "owid")[0] == -1
+
+def test_fix_jhu_df():
+    jhu = pd.DataFrame([[1, 2, 3, 4]], columns=["Taiwan*", "Diamond Princess",
+                                                "Korea, South", "Chile"])
+    fixed = continents.fix_jhu_df(jhu)
+    assert fixed.columns.tolist() == ["Chile", "South Korea", "Taiwan"]
+    assert fixed.iloc[0].tolist() == [4, 3, 1]
+
+def test_fix_owid_df():
+    owid = pd.DataFrame({"location": ["World", "Myanmar", "Congo", "Africa"],
+                         "total_vaccinations": [9, 1, 2, 3]})
+    fixed = continents.fix_owid_df(owid)
+    assert fixed["location"].tolist() == ["Burma", "Congo (Brazzaville)"]
+    assert fixed["total_vaccinations"].tolist() == [1, 2]
+
+def test_fix_census_df():
+    pops0 = schema.read_world_pops(CENSUS_FILE).drop_duplicates(subset="Country")
+    pops = continents.fix_census_df(pops0.drop(columns=["Region"]).set_index("Country").T)
+    assert pops.columns.isin(continents.jhu_countries()).all()
+    assert pops.loc["Population", "South Korea"] == 51835110
+    assert pops.loc["Population", "West Bank and Gaza"] == 1918221 + 2900034
+    assert pops.loc["Population", "Congo (Brazzaville)"] == 5293070
+    assert pops.loc["Population", "Congo (Kinshasa)"] == 101780263
+    assert "US" in pops.columns and "Bahamas" in pops.columns
+
+def test_census_continents():
+    by_cont = continents.census_continents(CENSUS_FILE)
+    assert by_cont["All"] == regions.JHU_COUNTRIES
+    assert "South Korea" in by_cont["Asia"]
+    # In the census, not in JHU
+    assert "North Korea" not in by_cont["Asia"]
+    assert {"Congo (Brazzaville)", "Congo (Kinshasa)"} <= set(by_cont["Africa"])
+    assert "West Bank and Gaza" in by_cont["Asia"]
+    # Every country is listed once, and only JHU countries are
+    listed = np.concatenate([by_cont[cont] for cont in by_cont.index if cont != "All"])
+    assert len(listed) == len(set(listed))
+    assert set(listed) <= set(regions.JHU_COUNTRIES)
@@ -0,0 +1,70 @@
+"""
+Render cache hits, misses and replacement of older entries.
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from covidplots import render_cache
+
+CALLS = []
+
+def plot(data, label, outdir="plots", scale=1):
+    """ Stand-in for a plotting function: writes one file, returns its report. """
+    CALLS.append(label)
+    filename = os.path.join(outdir, f"{label}.txt")
+    with open(filename, "w") as f1:
+        f1.write(f"{scale * data.to_numpy().sum()}\n")
+    return {"filename": filename}
+
+@pytest.fixture
+def data():
+    return pd.DataFrame({"Ohio": [1., 2., 3.], "Texas": [4., 5., 6.]},
+                        index=pd.date_range("2021-01-01", periods=3))
+
+def entries(outdir):
+    return sorted(os.listdir(os.path.join(outdir, render_cache.RENDER_CACHE_SUBDIR)))
+
+def test_hit(data, tmp_path):
+    outdir = str(tmp_path)
+    CALLS.clear()
+    first = render_cache.render(plot, data, "usa", outdir=outdir)
+    stats = render_cache.render_stats()
+    os.remove(first["filename"])
+    second = render_cache.render(plot, data.copy(), "usa", outdir=outdir)
+    assert CALLS == ["usa"]
+    assert second == first
+    assert render_cache.render_stats()["hits"] == stats["hits"] + 1
+    # The output file is linked back from the cache
+    with open(first["filename"]) as f1:
+        assert f1.read() == "21.0\n"
+
+def test_miss_on_new_data_or_kwargs(data, tmp_path):
+    outdir = str(tmp_path)
+    CALLS.clear()
+    render_cache.render(plot, data, "usa", outdir=outdir)
+    changed = data.copy()
+    changed.iloc[-1, 0] = 10.
+    render_cache.render(plot, changed, "usa", outdir=outdir)
+    render_cache.render(plot, changed, "usa", outdir=outdir, scale=2)
+    assert CALLS == ["usa", "usa", "usa"]
+    with open(os.path.join(outdir, "usa.txt")) as f1:
+        assert f1.read() == "56.0\n"
+
+def test_new_data_replaces_entry(data, tmp_path):
+    outdir = str(tmp_path)
+    render_cache.render(plot, data, "usa", outdir=outdir)
+    render_cache.render(plot, data, "world", outdir=outdir)
+    before = entries(outdir)
+    assert len(before) == 2
+    changed = data + 1
+    render_cache.render(plot, changed, "usa", outdir=outdir)
+    after = entries(outdir)
+    # Same figure (slot), new inputs: one entry per figure
+    assert len(after) == 2
+    slot, key = render_cache.figure_keys(plot, (changed, "usa"), {"outdir": outdir})
+    assert f"{slot}.{key}" in after
+    assert [e for e in before if not e.startswith(slot)] == \
+        [e for e in after if not e.startswith(slot)]